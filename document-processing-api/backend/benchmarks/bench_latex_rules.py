@@ -0,0 +1,113 @@
+"""
+Per-rule profile of the LaTeX rewrite rules (doc_processor/latex_rules.py)
+
+Converts every equation of the given documents to LaTeX (bypassing the
+equation memo) with DirectOmmlToLatex(rule_stats=True) and prints, per
+rule: how often it ran, how often its trigger guard skipped it, how often
+it changed the text and the time spent in it. Also reports the time per
+equation with the counters off, with the trigger guards and without them.
+
+    python benchmarks/bench_latex_rules.py [document.docx ...] [--repeat N]
+
+Without documents a synthetic set of equations is used.
+"""
+
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lxml import etree
+
+from doc_processor import latex_rules, ooxml
+from doc_processor.docx_package import DocxPackage
+from doc_processor.omml_2_latex import DirectOmmlToLatex
+
+SYNTHETIC_EQUATIONS = [
+    '<m:r><m:t>x∈ℝ, x≠0, α≤β</m:t></m:r>',
+    '<m:r><m:t>f(x)=sinx+cos θ</m:t></m:r>',
+    '<m:f><m:num><m:r><m:t>∂f</m:t></m:r></m:num><m:den><m:r><m:t>∂x</m:t></m:r></m:den></m:f>',
+    '<m:sSup><m:e><m:r><m:t>e</m:t></m:r></m:e><m:sup><m:r><m:t>γz</m:t></m:r></m:sup></m:sSup>',
+    '<m:nary><m:sub><m:r><m:t>0</m:t></m:r></m:sub><m:sup><m:r><m:t>1</m:t></m:r></m:sup>'
+    '<m:e><m:r><m:t>xⅆx</m:t></m:r></m:e></m:nary>',
+    '<m:r><m:t>∀x∃y: x⋅y≈1</m:t></m:r>',
+    '<m:d><m:e><m:r><m:t>a+b</m:t></m:r></m:e></m:d><m:r><m:t>·c</m:t></m:r>',
+]
+
+
+def load_equations(paths):
+    equations = []
+    for path in paths:
+        with DocxPackage(path) as package:
+            equations.extend(ooxml.FIND_ALL_EQUATIONS(package.xml('word/document.xml')))
+    return equations
+
+
+def synthetic_equations():
+    equations = [
+        etree.fromstring(f'<m:oMath xmlns:m="{ooxml.M_NS}">{content}</m:oMath>', ooxml.XML_PARSER)
+        for content in SYNTHETIC_EQUATIONS
+    ]
+    return equations * 200
+
+
+def measure(parser, equations, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for equation in equations:
+            parser.parse_oMath(equation)
+        best = min(best, time.perf_counter() - started)
+    return best / len(equations) * 1e6
+
+
+def unguarded(stages):
+    """RULES_BY_STAGE with every trigger guard removed"""
+    return {
+        stage: tuple(replace(rule, triggers=()) for rule in rules)
+        for stage, rules in stages.items()
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 5
+    if '--repeat' in args:
+        index = args.index('--repeat')
+        repeat = int(args[index + 1])
+        del args[index:index + 2]
+    if args:
+        equations = load_equations(args)
+        source = ', '.join(Path(path).name for path in args)
+    else:
+        equations = synthetic_equations()
+        source = 'synthetic equations'
+
+    profiled = DirectOmmlToLatex(rule_stats=True)
+    for equation in equations:
+        profiled.parse_oMath(equation)
+
+    print(f"{len(equations)} equations ({source})")
+    print(f"  {'rule':26} {'stage':13} {'calls':>8} {'skipped':>8} {'changed':>8} {'ms':>8}")
+    for rule in latex_rules.LATEX_RULES:
+        counters = profiled.rule_stats.get(rule.name, {'calls': 0, 'skipped': 0, 'changed': 0, 'seconds': 0.0})
+        print(f"  {rule.name:26} {rule.stage:13} {counters['calls']:8} {counters['skipped']:8} "
+              f"{counters['changed']:8} {counters['seconds'] * 1000:8.2f}")
+
+    parser = DirectOmmlToLatex()
+    guarded = measure(parser, equations, repeat)
+    stages = latex_rules.RULES_BY_STAGE
+    latex_rules.RULES_BY_STAGE = unguarded(stages)
+    try:
+        without_guards = measure(parser, equations, repeat)
+    finally:
+        latex_rules.RULES_BY_STAGE = stages
+    print(f"best of {repeat}, counters off:")
+    print(f"  rules without guards   {without_guards:8.2f} us/equation")
+    print(f"  rules with guards      {guarded:8.2f} us/equation  ({without_guards / guarded:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Microbenchmark: symbol and function-name translation in DirectOmmlToLatex
+
+Converts every equation of the given documents to LaTeX (bypassing the
+equation memo, so each one is really converted) twice: with the previous
+smart_symbol_convert / convert_function_names (a MATH_SYMBOLS scan at
+every position, one re.sub per function name) and with the precomputed
+SYMBOL_TABLE / FUNCTION_NAME_PATTERN. Reports the time per equation and
+the equations whose LaTeX differs.
+
+    python benchmarks/bench_latex_symbols.py [document.docx ...] [--repeat N]
+
+Without documents a synthetic set of equations is used.
+"""
+
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lxml import etree
+
+from doc_processor import ooxml
+from doc_processor.docx_package import DocxPackage
+from doc_processor.omml_2_latex import FUNCTION_NAMES, MATH_SYMBOLS, DirectOmmlToLatex
+
+SYNTHETIC_RUNS = [
+    'x∈ℝ, x≠0, α≤β', 'f(x)=sinx+cos θ', '∀x∃y: x·y≈1', '∂f/∂x+∇g', 'lnx+log2', 'lim', 'n→∞',
+    'xⅆx', 'a±b∓c', 'A∪B∩C⊆D', 'arcsin', 'e', 'sin', 'x', '2', '=', '∑', 'maxmin', 'infty', 'sinh',
+]
+
+
+def smart_symbol_convert_previous(text):
+    """smart_symbol_convert before SYMBOL_TABLE"""
+    result = []
+    i = 0
+    while i < len(text):
+        found = False
+        for symbol, latex in MATH_SYMBOLS.items():
+            if text[i:i+len(symbol)] == symbol:
+                result.append(latex)
+                i += len(symbol)
+                found = True
+                break
+        if not found:
+            result.append(text[i])
+            i += 1
+    return ''.join(result)
+
+
+def convert_function_names_previous(text):
+    """convert_function_names before FUNCTION_NAME_PATTERN"""
+    if text.startswith('\\'):
+        return text
+    text = text.replace('\u2061', '')
+    for func, latex_func in sorted(FUNCTION_NAMES.items(), key=lambda x: len(x[0]), reverse=True):
+        text = re.sub(r'\b' + re.escape(func) + r'(?![a-z]{2,})', lambda m, lf=latex_func: lf, text)
+    return text
+
+
+def load_equations(paths):
+    equations = []
+    for path in paths:
+        with DocxPackage(path) as package:
+            equations.extend(ooxml.FIND_ALL_EQUATIONS(package.xml('word/document.xml')))
+    return equations
+
+
+def synthetic_equations():
+    equations = [
+        etree.fromstring(f'<m:oMath xmlns:m="{ooxml.M_NS}"><m:r><m:t>{text}</m:t></m:r></m:oMath>', ooxml.XML_PARSER)
+        for text in SYNTHETIC_RUNS
+    ]
+    return equations * 100
+
+
+def measure(parser, equations, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for equation in equations:
+            parser.parse_oMath(equation)
+        best = min(best, time.perf_counter() - started)
+    return best / len(equations) * 1e6
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 5
+    if '--repeat' in args:
+        index = args.index('--repeat')
+        repeat = int(args[index + 1])
+        del args[index:index + 2]
+    if args:
+        equations = load_equations(args)
+        source = ', '.join(Path(path).name for path in args)
+    else:
+        equations = synthetic_equations()
+        source = 'synthetic equations'
+
+    current = DirectOmmlToLatex()
+    previous = DirectOmmlToLatex()
+    previous.smart_symbol_convert = smart_symbol_convert_previous
+    previous.convert_function_names = convert_function_names_previous
+
+    changed = {(old, new) for old, new in ((previous.parse_oMath(eq), current.parse_oMath(eq)) for eq in equations)
+               if old != new}
+    print(f"{len(equations)} equations ({source}), best of {repeat}, {len(changed)} distinct with different LaTeX")
+    for old, new in sorted(changed)[:5]:
+        print(f"    {old!r} -> {new!r}")
+
+    before = measure(previous, equations, repeat)
+    after = measure(current, equations, repeat)
+    print(f"  per-position scans     {before:8.2f} us/equation")
+    print(f"  translation tables     {after:8.2f} us/equation  ({before / after:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Microbenchmark: OmmlToMathMLConverter._classify_and_wrap tokenizer
+
+Classifies the text of every math run (m:r) of the given documents into
+<mn>/<mo>/<mi> tokens, once with the previous per-character scanner
+(re.match on text[i:] and a sorted FUNCTION_NAMES scan at every
+position) and once with the converter's single-regex tokenizer, checks
+that both produce the same bytes and reports the time per run.
+
+    python benchmarks/bench_mathml_tokens.py [document.docx ...] [--repeat N]
+
+Without documents a synthetic corpus of typical run texts is used.
+"""
+
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from doc_processor import ooxml
+from doc_processor.docx_package import DocxPackage
+from doc_processor.omml_to_mathml import FUNCTION_NAMES, OmmlToMathMLConverter
+
+SYNTHETIC_RUNS = [
+    'x', '2', '+', '=', 'f(x)=3x+5', 'sinx', 'sin', 'arcsin', 'ln', 'log', '3.14159',
+    'α+β≤γ', 'x∈ℝ, x≠0', 'lim', 'n→∞', 'a·b', '∀x∃y: x⋅y≈1', '∂f∇g', '12.5cm', 'max(a,b)',
+    'sinh2x', 'cos θ', '٣٤+٥', 'x²+y²', '½', 'Pr(A)', 'dx', '-', '(', ')', 'abc', 'i=1',
+]
+
+
+def classify_previous(converter, text):
+    """_classify_and_wrap as it was before the tokenizer (reference output)"""
+    if not text:
+        return ''
+    text = text.strip()
+    if not text:
+        return ''
+    parts = []
+    i = 0
+    while i < len(text):
+        num_match = re.match(r'^(\d+\.?\d*)', text[i:])
+        if num_match:
+            parts.append(f'<mn>{converter._escape(num_match.group(1))}</mn>')
+            i += len(num_match.group(1))
+            continue
+        char = text[i]
+        if char in '+-=<>()[]{}|/\\!@#$%&*,;:.?' or char in '≠≤≥±×÷⋅≈≡∼∈∉⊂⊆∪∩∅∧∨¬∀∃→←↔⇒⟹⟸∂∇∞∠⊥∥…∴∵∓⋅∑∏∫':
+            parts.append(f'<mo>{converter._escape(char)}</mo>')
+            i += 1
+            continue
+        func_found = False
+        for func_name in sorted(FUNCTION_NAMES, key=len, reverse=True):
+            if text[i:].startswith(func_name):
+                end_pos = i + len(func_name)
+                if end_pos >= len(text) or not text[end_pos].isalpha():
+                    parts.append(f'<mi mathvariant="normal">{func_name}</mi>')
+                    i = end_pos
+                    func_found = True
+                    break
+        if func_found:
+            continue
+        if char.isalpha() or converter._is_greek(char):
+            parts.append(f'<mi>{converter._escape(char)}</mi>')
+            i += 1
+            continue
+        parts.append(f'<mo>{converter._escape(char)}</mo>')
+        i += 1
+    return ''.join(parts)
+
+
+def load_runs(paths):
+    """Text of every math run, as _parse_r passes it to _classify_and_wrap"""
+    runs = []
+    for path in paths:
+        with DocxPackage(path) as package:
+            for run in package.xml('word/document.xml').iter(f'{{{ooxml.M_NS}}}r'):
+                text = ''.join(t.text or '' for t in run.iterfind(f'{{{ooxml.M_NS}}}t'))
+                if text:
+                    runs.append(text.replace('−', '-'))
+    return runs
+
+
+def measure(func, runs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in runs:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return best / len(runs) * 1e6
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 5
+    if '--repeat' in args:
+        index = args.index('--repeat')
+        repeat = int(args[index + 1])
+        del args[index:index + 2]
+    if args:
+        runs = load_runs(args)
+        source = ', '.join(Path(path).name for path in args)
+    else:
+        runs = SYNTHETIC_RUNS * 100
+        source = 'synthetic runs'
+
+    converter = OmmlToMathMLConverter()
+    mismatches = [text for text in set(runs) if classify_previous(converter, text) != converter._classify_and_wrap(text)]
+    if mismatches:
+        print(f"OUTPUT DIFFERS for {len(mismatches)} run texts, e.g. {mismatches[:5]!r}")
+        sys.exit(1)
+
+    print(f"{len(runs)} math runs ({source}), best of {repeat}, output identical")
+    previous = measure(lambda text: classify_previous(converter, text), runs, repeat)
+    tokenizer = measure(converter._classify_and_wrap, runs, repeat)
+    print(f"  per-character scan     {previous:8.2f} us/run")
+    print(f"  regex tokenizer        {tokenizer:8.2f} us/run  ({previous / tokenizer:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Microbenchmark: precompiled XPath queries (doc_processor/ooxml.py) vs element.xpath()
+
+Runs the queries _convert_paragraph_content / _convert_run make for every
+paragraph of a document, once with element.xpath('...') (compiled on each
+call, as the converters used to do) and once with the shared precompiled
+queries, and reports the time per paragraph.
+
+    python benchmarks/bench_xpath.py [document.docx] [repeat]
+
+Without a document a synthetic paragraph (5 runs, one equation) is used.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lxml import etree
+
+from doc_processor import ooxml
+from doc_processor.docx_package import DocxPackage
+
+PARAGRAPH_QUERIES = (ooxml.FIND_EQUATIONS_OR_PARAS, ooxml.FIND_PARAGRAPH_STYLE)
+# The run formatting queries _convert_run made before RunFormat decoding replaced them
+RUN_QUERIES = tuple(etree.XPath(expression, namespaces=ooxml.NAMESPACES) for expression in (
+    './/w:b[not(@w:val="false")]', './/w:i[not(@w:val="false")]', './/w:strike[not(@w:val="false")]',
+    './/w:dstrike[not(@w:val="false")]', './/w:vertAlign[@w:val="superscript"]',
+    './/w:vertAlign[@w:val="subscript"]', './/w:footnoteReference',
+))
+
+SYNTHETIC_PARAGRAPH = f'''<w:p xmlns:w="{ooxml.W_NS}" xmlns:m="{ooxml.M_NS}">
+  <w:pPr><w:pStyle w:val="Normal"/><w:rPr><w:rtl/></w:rPr></w:pPr>
+  <w:r><w:rPr><w:b/></w:rPr><w:t>one</w:t></w:r>
+  <w:r><w:rPr><w:i/><w:vertAlign w:val="superscript"/></w:rPr><w:t>two</w:t></w:r>
+  <m:oMath><m:r><m:t>x+1</m:t></m:r></m:oMath>
+  <w:r><w:t>three</w:t></w:r>
+  <w:r><w:rPr><w:strike/></w:rPr><w:t>four</w:t></w:r>
+  <w:r><w:t>five</w:t></w:r>
+</w:p>'''
+
+
+def load_paragraphs(docx_path):
+    with DocxPackage(docx_path) as package:
+        return ooxml.FIND_PARAGRAPHS(package.xml('word/document.xml'))
+
+
+def query_strings(paragraph):
+    for query in PARAGRAPH_QUERIES:
+        paragraph.xpath(query.path, namespaces=ooxml.NAMESPACES)
+    for run in paragraph.iterchildren(f'{{{ooxml.W_NS}}}r'):
+        for query in RUN_QUERIES:
+            run.xpath(query.path, namespaces=ooxml.NAMESPACES)
+
+
+def query_compiled(paragraph):
+    for query in PARAGRAPH_QUERIES:
+        query(paragraph)
+    for run in paragraph.iterchildren(f'{{{ooxml.W_NS}}}r'):
+        for query in RUN_QUERIES:
+            query(run)
+
+
+def measure(func, paragraphs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for paragraph in paragraphs:
+            func(paragraph)
+        best = min(best, time.perf_counter() - started)
+    return best / len(paragraphs) * 1e6
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = int(args[1]) if len(args) > 1 else 5
+    if args:
+        paragraphs = load_paragraphs(args[0])
+        source = Path(args[0]).name
+    else:
+        paragraphs = [etree.fromstring(SYNTHETIC_PARAGRAPH, ooxml.XML_PARSER)] * 2000
+        source = 'synthetic paragraph'
+
+    print(f"{len(paragraphs)} paragraphs ({source}), best of {repeat}")
+    strings = measure(query_strings, paragraphs, repeat)
+    compiled = measure(query_compiled, paragraphs, repeat)
+    print(f"  element.xpath('...')   {strings:8.2f} us/paragraph")
+    print(f"  precompiled XPath      {compiled:8.2f} us/paragraph  ({strings / compiled:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,7 @@ class Config:
     TEMP_DIR = BASE_DIR / "temp"
     OUTPUT_DIR = BASE_DIR / "output"
     LOGS_DIR = BASE_DIR / "logs"
+    DATA_DIR = BASE_DIR / "data"
     DOCUMENTS_DIR = ROOT_DIR / "documents"
     INPUT_DIR = DOCUMENTS_DIR / "input"
     PROCESSED_DIR = DOCUMENTS_DIR / "processed"
@@ -25,6 +26,9 @@ class Config:
     MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB
     ALLOWED_EXTENSIONS = ['.docx', '.doc']
     MAX_FILES_PER_REQUEST = 10
+    MAX_REQUEST_SIZE = MAX_FILE_SIZE * MAX_FILES_PER_REQUEST + 1024 * 1024  # Multipart overhead
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB chunks when streaming uploads to disk
+    ZIP_STREAM_CHUNK_SIZE = 64 * 1024  # Read size for members of streamed ZIP downloads
     
     # API settings
     API_HOST = "0.0.0.0"
@@ -33,10 +37,46 @@ class Config:
     API_VERSION = "1.0.0"
     
     # Processing settings
-    BATCH_SIZE = 5  # Process 5 files at a time
+    BATCH_SIZE = int(os.getenv('BATCH_SIZE', 5))  # Files of one job converted concurrently
+    MAX_RUNNING_JOBS = int(os.getenv('MAX_RUNNING_JOBS', 2))  # Jobs converting at the same time
+    MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 20))  # Jobs waiting; more uploads get 429
+    QUEUE_RETRY_AFTER = 30  # Retry-After seconds before any job duration is known
+    SYNC_CONVERT_MAX_BYTES = int(os.getenv('SYNC_CONVERT_MAX_BYTES', 2 * 1024 * 1024))  # Larger uploads to /api/convert become jobs
+    SYNC_CONVERT_TIMEOUT = float(os.getenv('SYNC_CONVERT_TIMEOUT', 10))  # Seconds /api/convert waits before answering 202
+    SYNC_STREAM_POLL_INTERVAL = 0.05  # Seconds between reads of an output file /api/convert sends while it is written
     JOB_TIMEOUT = 600  # 10 minutes timeout
-    CLEANUP_AFTER_HOURS = 24  # Clean temp files after 24 hours
-    
+    CLEANUP_AFTER_HOURS = float(os.getenv('CLEANUP_AFTER_HOURS', 24))  # Clean temp files after 24 hours
+
+    # Janitor settings (removes expired job directories, enforces the disk quota)
+    JANITOR_INTERVAL = int(os.getenv('JANITOR_INTERVAL', 600))  # Seconds between sweeps (0 = disabled)
+    DISK_QUOTA_BYTES = int(os.getenv('DISK_QUOTA_BYTES', 512 * 1024 * 1024))  # temp + output dirs (0 = no quota)
+    EXPIRED_JOB_RETENTION_HOURS = 24 * 7  # Keep "expired" job records this long before deleting them
+
+    # Worker pool settings (conversions run outside the event loop)
+    WORKER_POOL_SIZE = int(os.getenv('WORKER_POOL_SIZE', os.cpu_count() or 1))  # 0 = thread fallback
+    WORKER_MAX_TASKS_PER_CHILD = int(os.getenv('WORKER_MAX_TASKS_PER_CHILD', 50))  # 0 = never recycle
+    WORKER_TASK_TIMEOUT = int(os.getenv('WORKER_TASK_TIMEOUT', 300))  # Seconds per file
+    WORKER_START_METHOD = os.getenv('WORKER_START_METHOD', 'spawn')
+
+    # Job store settings ("sqlite" is shared by all workers; "memory" is per process)
+    JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 'sqlite')
+    JOB_STORE_PATH = Path(os.getenv('JOB_STORE_PATH', DATA_DIR / "jobs.db"))
+
+    # Progress push settings (SSE / WebSocket / long-poll on /api/status)
+    JOB_EVENT_POLL_INTERVAL = float(os.getenv('JOB_EVENT_POLL_INTERVAL', 0.5))  # Cross-worker change check
+    LONG_POLL_MAX_WAIT = 30  # Max seconds /api/status?wait= may block
+    SSE_HEARTBEAT_INTERVAL = 15  # Keep-alive comment when a job is idle
+
+    # Conversion result cache (same document + same options = reuse the previous output)
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_DIR = Path(os.getenv('RESULT_CACHE_DIR', DATA_DIR / "result_cache"))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1GB
+
+    # Equation cache (LaTeX/MathML of equations seen in earlier documents, shared by all workers)
+    EQUATION_CACHE_ENABLED = os.getenv('EQUATION_CACHE_ENABLED', 'true').lower() == 'true'
+    EQUATION_CACHE_PATH = Path(os.getenv('EQUATION_CACHE_PATH', DATA_DIR / "equations.db"))
+    EQUATION_CACHE_MAX_BYTES = int(os.getenv('EQUATION_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64MB
+
     # Excel output settings
     EXCEL_ENGINE = 'openpyxl'
     EXCEL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -44,6 +84,7 @@ class Config:
     # HTML conversion settings
     HTML_ENCODING = 'utf-8'
     HTML_DIR = 'rtl'  # For Arabic documents
+    STREAM_BODY_MIN_BYTES = int(os.getenv('STREAM_BODY_MIN_BYTES', 16 * 1024 * 1024))  # document.xml size from which it is converted/rewritten as a stream
     HTML_LANG = 'ar'
     
     # Logging settings
@@ -75,6 +116,7 @@ class Config:
             cls.TEMP_DIR,
             cls.OUTPUT_DIR,
             cls.LOGS_DIR,
+            cls.DATA_DIR,
             cls.DOCUMENTS_DIR,
             cls.INPUT_DIR,
             cls.PROCESSED_DIR
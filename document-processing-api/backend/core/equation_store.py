@@ -0,0 +1,179 @@
+"""
+Persistent equation cache shared by all worker processes
+
+The same equations recur across the chapters and revisions of a book
+uploaded by different editors. EquationStore keeps the LaTeX and MathML of
+converted equations in a WAL-mode SQLite file, keyed by the canonical
+fingerprint of the OMML (see doc_processor/equation_cache.py), the output
+kind ('latex' or 'mathml') and the display flag. EquationMemo looks an
+equation up here before converting it, so a warm document only pays for
+parsing and fingerprinting.
+
+- Rows carry the equation converter version (a digest of the converter
+  sources): after a deploy that changes equation output the old rows are
+  never read again, and as the least recently used they are evicted first.
+- New results and last-use times are written in one transaction per
+  document (EquationMemo.flush), not one per equation.
+- The file is bounded by Config.EQUATION_CACHE_MAX_BYTES (output sizes plus
+  a fixed per-row overhead); the least recently used rows are evicted first.
+- Errors (locked or unwritable file) are logged and the equation is simply
+  converted again: the cache never fails a conversion.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from .config import Config
+from .result_cache import source_digest
+
+logger = logging.getLogger(__name__)
+
+# Source files whose code determines equation output (and its fingerprint)
+EQUATION_MODULES = (
+    "doc_processor/omml_2_latex.py",
+    "doc_processor/latex_rules.py",
+    "doc_processor/omml_to_mathml.py",
+    "doc_processor/equation_cache.py",
+    "doc_processor/ooxml.py",
+)
+
+ROW_OVERHEAD = 96  # Approximate bytes of a row besides its output (key columns, index entries)
+
+
+@lru_cache(maxsize=1)
+def equation_converter_version() -> str:
+    """Digest of the equation converter sources"""
+    return source_digest(EQUATION_MODULES)
+
+
+class EquationStore:
+    """SQLite (WAL mode) LRU cache of equation conversions"""
+
+    def __init__(self, db_path, max_bytes: int = None, version: str = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = Config.EQUATION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.version = version or equation_converter_version()
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS equations (
+                fingerprint TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                display INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                output TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                used_at REAL NOT NULL,
+                UNIQUE (fingerprint, kind, display, version)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_equations_used ON equations (used_at)")
+
+    def _connect(self):
+        """One connection per thread and process (sqlite3 connections are not thread- or fork-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, fingerprint: str, kind: str, display: bool = False):
+        """Cached output of an equation, or None"""
+        try:
+            row = self._connect().execute(
+                "SELECT output FROM equations WHERE fingerprint = ? AND kind = ? AND display = ? AND version = ?",
+                (fingerprint, kind, int(display), self.version)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Equation cache read failed: {e}")
+            return None
+        return row[0] if row else None
+
+    def save(self, kind: str, results=(), used=()):
+        """
+        Store new results and refresh the last-use time of cached ones, in one transaction
+
+        results: (fingerprint, display, output) tuples converted by this worker
+        used: (fingerprint, display) pairs that were read from the cache
+        """
+        if not results and not used:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO equations (fingerprint, kind, display, version, output, size, used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(fingerprint, kind, int(display), self.version, output, len(output) + ROW_OVERHEAD, now)
+                     for fingerprint, display, output in results]
+                )
+                conn.executemany(
+                    "UPDATE equations SET used_at = ? "
+                    "WHERE fingerprint = ? AND kind = ? AND display = ? AND version = ?",
+                    [(now, fingerprint, kind, int(display), self.version) for fingerprint, display in used]
+                )
+                if results:
+                    self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Equation cache write failed: {e}")
+
+    def _evict(self, conn):
+        """Delete least recently used rows until the cache fits in max_bytes (inside save's transaction)"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM equations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM equations ORDER BY used_at"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((rowid,))
+            total -= size
+        conn.executemany("DELETE FROM equations WHERE rowid = ?", evicted)
+        logger.info(f"Equation cache evicted {len(evicted)} equations")
+
+    def info(self):
+        """Size of the cache for the health endpoint"""
+        try:
+            entries, size, current = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(version = ?), 0) FROM equations",
+                (self.version,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            return {"enabled": True, "error": str(e)}
+        return {
+            "enabled": True,
+            "version": self.version,
+            "entries": entries,
+            "current_entries": current,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+@lru_cache(maxsize=1)
+def shared_equation_store():
+    """The process's EquationStore at Config.EQUATION_CACHE_PATH, or None if disabled or unusable"""
+    if not Config.EQUATION_CACHE_ENABLED:
+        return None
+    try:
+        return EquationStore(Config.EQUATION_CACHE_PATH)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Equation cache disabled: {e}")
+        return None
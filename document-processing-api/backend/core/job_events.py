@@ -0,0 +1,55 @@
+"""
+Job change notifications for push progress (SSE / WebSocket / long-poll)
+
+Every change to a job bumps its version counter in the job store. Waiters
+block until the version moves past the one they last saw:
+
+- Changes made in this process call notify(job_id) and wake waiters at once.
+- Changes made by another uvicorn worker sharing the SQLite store are picked
+  up by re-reading the version every Config.JOB_EVENT_POLL_INTERVAL seconds,
+  which is a single indexed SELECT instead of a full status request.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from .config import Config
+
+
+class JobEventHub:
+    """Wakes coroutines waiting for a job's version to change"""
+
+    def __init__(self, job_store, poll_interval: float = None):
+        self.job_store = job_store
+        self.poll_interval = Config.JOB_EVENT_POLL_INTERVAL if poll_interval is None else poll_interval
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def notify(self, job_id: str):
+        """Wake everything waiting on job_id (call from the event loop thread)"""
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait_for_change(self, job_id: str, since_version: int, timeout: float) -> Optional[int]:
+        """
+        Wait until the job's version is greater than since_version
+
+        Returns the new version, the current version if the timeout expired
+        first, or None if the job does not exist.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self.job_store.get_version(job_id)
+            if version is None or version > since_version:
+                return version
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return version
+
+            event = self._events.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(self.poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,328 @@
+"""
+Job store for the document processing service
+
+Job state (status, progress, results, conversion config) used to live in a
+module-level dict in main.py, so a status poll that reached a different
+uvicorn worker or Cloud Run instance returned 404. JobStore is the shared
+interface; two backends are provided:
+
+- SQLiteJobStore: WAL-mode SQLite file shared by every worker process on the
+  host (or on a shared volume). Progress updates are single UPDATE statements
+  so concurrent workers never lose increments.
+- MemoryJobStore: process-local dict, for tests and single-worker runs.
+
+A job is a plain dict:
+    {
+        "status": "processing" | "completed" | ...,
+        "total": int,
+        "completed": int,
+        "version": int,          # bumped on every change
+        "results": [...],
+        "processor": str,
+        "equation_approach": str,
+        "conversion_config": {...},
+        "created_at": float,
+        "updated_at": float,
+    }
+
+Each job also has an append-only event log (stage progress, finished files,
+completion) that the SSE/WebSocket endpoints stream to clients. An event is
+{"id": int, "type": str, "data": {...}, "created_at": float}; ids increase
+monotonically so a client can resume after the last id it saw.
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .config import Config
+
+
+class JobStore(ABC):
+    """Interface for job state storage"""
+
+    @abstractmethod
+    def create(self, job_id: str, job: dict) -> None:
+        """Store a new job"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return a copy of the job, or None if unknown"""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """Set top-level job fields (status, results, ...)"""
+
+    @abstractmethod
+    def increment_completed(self, job_id: str, amount: int = 1) -> int:
+        """Atomically add to the completed counter and return the new value"""
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        """Remove a job"""
+
+    @abstractmethod
+    def list_jobs(self) -> List[dict]:
+        """Return all jobs, each with its 'job_id'"""
+
+    @abstractmethod
+    def get_version(self, job_id: str) -> Optional[int]:
+        """Return the job's version counter, or None if unknown"""
+
+    @abstractmethod
+    def add_event(self, job_id: str, event_type: str, data: dict = None) -> int:
+        """Append an event to the job's log (bumps the version) and return its id"""
+
+    @abstractmethod
+    def get_events(self, job_id: str, after_id: int = 0) -> List[dict]:
+        """Return the job's events with id > after_id, oldest first"""
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+
+class MemoryJobStore(JobStore):
+    """In-process job store (tests, single worker)"""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._events: Dict[str, List[dict]] = {}
+        self._next_event_id = 1
+        self._lock = threading.Lock()
+
+    def create(self, job_id, job):
+        now = time.time()
+        record = copy.deepcopy(job)
+        record.setdefault("completed", 0)
+        record.setdefault("results", [])
+        record.update({"version": 1, "created_at": now, "updated_at": now})
+        with self._lock:
+            self._jobs[job_id] = record
+            self._events[job_id] = []
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(copy.deepcopy(fields))
+            job["version"] += 1
+            job["updated_at"] = time.time()
+
+    def increment_completed(self, job_id, amount=1):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return 0
+            job["completed"] += amount
+            job["version"] += 1
+            job["updated_at"] = time.time()
+            return job["completed"]
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._events.pop(job_id, None)
+
+    def list_jobs(self):
+        with self._lock:
+            return [dict(copy.deepcopy(job), job_id=job_id) for job_id, job in self._jobs.items()]
+
+    def get_version(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["version"] if job is not None else None
+
+    def add_event(self, job_id, event_type, data=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return 0
+            event_id = self._next_event_id
+            self._next_event_id += 1
+            now = time.time()
+            self._events[job_id].append({
+                "id": event_id, "type": event_type, "data": copy.deepcopy(data or {}), "created_at": now
+            })
+            job["version"] += 1
+            job["updated_at"] = now
+            return event_id
+
+    def get_events(self, job_id, after_id=0):
+        with self._lock:
+            return [copy.deepcopy(e) for e in self._events.get(job_id, []) if e["id"] > after_id]
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite (WAL mode) job store shared by all worker processes"""
+
+    # Fields stored as real columns; everything else lives in the JSON 'data' column
+    COLUMNS = ("status", "total", "completed")
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 1,
+                data TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id)")
+        conn.commit()
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row):
+        job_id, status, total, completed, version, data, created_at, updated_at = row
+        job = json.loads(data)
+        job.update({
+            "status": status,
+            "total": total,
+            "completed": completed,
+            "version": version,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        })
+        return job
+
+    def create(self, job_id, job):
+        now = time.time()
+        data = {k: v for k, v in job.items() if k not in self.COLUMNS}
+        data.setdefault("results", [])
+        self._connect().execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, total, completed, version, data, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?, ?)",
+            (job_id, job.get("status", "processing"), job.get("total", 0), job.get("completed", 0),
+             json.dumps(data, ensure_ascii=False), now, now)
+        )
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT job_id, status, total, completed, version, data, created_at, updated_at "
+            "FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id, **fields):
+        columns = {k: v for k, v in fields.items() if k in self.COLUMNS}
+        data_fields = {k: v for k, v in fields.items() if k not in self.COLUMNS}
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return
+            data = json.loads(row[0])
+            data.update(data_fields)
+
+            assignments = "".join(f"{name} = ?, " for name in columns)
+            conn.execute(
+                f"UPDATE jobs SET {assignments}data = ?, version = version + 1, updated_at = ? WHERE job_id = ?",
+                (*columns.values(), json.dumps(data, ensure_ascii=False), time.time(), job_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def increment_completed(self, job_id, amount=1):
+        row = self._connect().execute(
+            "UPDATE jobs SET completed = completed + ?, version = version + 1, updated_at = ? "
+            "WHERE job_id = ? RETURNING completed",
+            (amount, time.time(), job_id)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def delete(self, job_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+
+    def list_jobs(self):
+        rows = self._connect().execute(
+            "SELECT job_id, status, total, completed, version, data, created_at, updated_at FROM jobs"
+        ).fetchall()
+        return [dict(self._row_to_job(row), job_id=row[0]) for row in rows]
+
+    def get_version(self, job_id):
+        row = self._connect().execute("SELECT version FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def add_event(self, job_id, event_type, data=None):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            bumped = conn.execute(
+                "UPDATE jobs SET version = version + 1, updated_at = ? WHERE job_id = ?", (now, job_id)
+            ).rowcount
+            if not bumped:
+                conn.execute("ROLLBACK")
+                return 0
+            event_id = conn.execute(
+                "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, event_type, json.dumps(data or {}, ensure_ascii=False), now)
+            ).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return event_id
+
+    def get_events(self, job_id, after_id=0):
+        rows = self._connect().execute(
+            "SELECT id, type, data, created_at FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+            (job_id, after_id)
+        ).fetchall()
+        return [{"id": r[0], "type": r[1], "data": json.loads(r[2]), "created_at": r[3]} for r in rows]
+
+
+def create_job_store(backend: str = None, db_path=None) -> JobStore:
+    """Create the job store configured by Config.JOB_STORE_BACKEND"""
+    backend = (backend or Config.JOB_STORE_BACKEND).lower()
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(db_path or Config.JOB_STORE_PATH)
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -0,0 +1,194 @@
+"""
+Content-addressed cache for Word to HTML conversion results
+
+Editors re-upload the same .docx with the same options many times. A result
+is keyed by:
+- SHA-256 of the uploaded bytes
+- the file stem (it becomes the HTML title and the output file names)
+- a canonical hash of every ConversionConfig field (defaults filled in)
+- the converter version: a digest of the converter source files, so a
+  deploy that changes conversion output never serves stale results
+
+Layout on disk (Config.RESULT_CACHE_DIR):
+    <key[:2]>/<key>/manifest.json   files, total size, output/body names
+    <key[:2]>/<key>/<stem>.html, <stem>_body.txt, images/...
+    staging/<random>/               conversions in progress
+
+A hit hard-links the cached files into the job output dir (copying when the
+cache lives on another device). The cache is bounded by
+Config.RESULT_CACHE_MAX_BYTES; the least recently used entries (manifest
+mtime, touched on every hit) are evicted first.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Source files whose code determines the HTML output
+CONVERTER_MODULES = (
+    "word_to_html_full.py",
+    "enhanced_zip_converter.py",
+    "doc_processor/omml_2_latex.py",
+    "doc_processor/latex_rules.py",
+    "doc_processor/omml_to_mathml.py",
+    "doc_processor/docx_package.py",
+    "doc_processor/ooxml.py",
+)
+
+MANIFEST = "manifest.json"
+
+
+def source_digest(names) -> str:
+    """Digest of backend source files (names relative to Config.BASE_DIR)"""
+    digest = hashlib.sha256()
+    for name in names:
+        path = Config.BASE_DIR / name
+        digest.update(name.encode())
+        if path.exists():
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+@lru_cache(maxsize=1)
+def converter_version() -> str:
+    """Digest of the converter sources (changes whenever the converter code does)"""
+    return source_digest(CONVERTER_MODULES)
+
+
+def link_or_copy(src: Path, dest: Path):
+    """Hard-link src to dest (replacing dest), copying if linking is not possible"""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+class ResultCache:
+    """On-disk LRU cache of conversion output directories"""
+
+    def __init__(self, cache_dir=None, max_bytes: int = None, enabled: bool = None):
+        self.cache_dir = Path(cache_dir or Config.RESULT_CACHE_DIR)
+        self.max_bytes = Config.RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.enabled = Config.RESULT_CACHE_ENABLED if enabled is None else enabled
+        self.stats = {"hits": 0, "misses": 0}
+
+    def make_key(self, input_sha256: str, stem: str, conversion_config) -> str:
+        """Cache key for one input file converted with a ConversionConfig"""
+        payload = json.dumps({
+            "input": input_sha256,
+            "stem": stem,
+            "config": asdict(conversion_config),
+            "converter": converter_version(),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def staging_dir(self) -> Path:
+        """Fresh directory to convert into before store()"""
+        staging = self.cache_dir / "staging"
+        staging.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(dir=staging))
+
+    def restore(self, key: str, output_dir: Path) -> Optional[dict]:
+        """
+        Link a cached result into output_dir
+
+        Returns {'output_path', 'body_output_path', 'cached'} like convert_file, or None
+        on a miss (or if the entry was evicted while linking).
+        """
+        entry = self._entry_dir(key)
+        manifest_path = entry / MANIFEST
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            for rel in manifest["files"]:
+                link_or_copy(entry / rel, output_dir / rel)
+            os.utime(manifest_path)  # LRU: mark as recently used
+        except (OSError, ValueError, KeyError):
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        body = manifest.get("body")
+        return {
+            "output_path": str(output_dir / manifest["output"]),
+            "body_output_path": str(output_dir / body) if body else None,
+            "cached": True,
+        }
+
+    def store(self, key: str, staging: Path, output_path: Path, body_output_path: Path = None):
+        """Move a finished conversion from staging into the cache, then enforce the size budget"""
+        staging = Path(staging)
+        files = sorted(p for p in staging.rglob("*") if p.is_file())
+        manifest = {
+            "files": [p.relative_to(staging).as_posix() for p in files],
+            "size": sum(p.stat().st_size for p in files),
+            "output": Path(output_path).name,
+            "body": Path(body_output_path).name if body_output_path else None,
+            "created_at": time.time(),
+        }
+        (staging / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+
+        entry = self._entry_dir(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            staging.rename(entry)
+        except OSError:
+            # Another worker stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) for every cache entry"""
+        entries = []
+        for shard in self.cache_dir.iterdir():
+            if not shard.is_dir() or shard.name == "staging":
+                continue
+            for entry in shard.iterdir():
+                manifest_path = entry / MANIFEST
+                try:
+                    size = json.loads(manifest_path.read_text(encoding="utf-8"))["size"]
+                    entries.append((manifest_path.stat().st_mtime, size, entry))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        if not self.cache_dir.exists():
+            return
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Result cache evicted {entry.name} ({size} bytes)")
+
+    def info(self):
+        """Hit/miss counters of this process for the health endpoint"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self.stats
+        }
@@ -0,0 +1,103 @@
+"""
+Streaming ZIP archives for download responses
+
+Results used to be zipped into the output dir when a job finished, and
+multi-file downloads built another archive on every request. stream_zip()
+instead generates the archive while it is being sent: members are read
+straight from disk in chunks and the compressed bytes are yielded as soon
+as they are produced, so nothing is written to disk and the first byte
+goes out immediately. The total size is not known in advance (zipfile
+writes data descriptors when the output is not seekable).
+
+Already-compressed formats (images, Office files, archives) are STORED;
+everything else is DEFLATED.
+"""
+
+import io
+import os
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+from .config import Config
+
+# Formats that do not shrink further under DEFLATE
+PRECOMPRESSED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.jfif',
+    '.zip', '.gz', '.docx', '.xlsx', '.pptx', '.mp3', '.mp4',
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes into and the generator drains"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def directory_members(root: Path) -> Iterator[Tuple[Path, str]]:
+    """(path, arcname) for every file below root, in a stable order"""
+    root = Path(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            yield path, path.relative_to(root).as_posix()
+
+
+def directory_size(root: Path) -> int:
+    """Total size of the files below root (uncompressed archive size)"""
+    return sum(path.stat().st_size for path, _ in directory_members(root))
+
+
+def stream_zip(members: Iterable[Tuple[Path, str]], chunk_size: int = None) -> Iterator[bytes]:
+    """Yield a ZIP archive of (path, arcname) members chunk by chunk"""
+    chunk_size = chunk_size or Config.ZIP_STREAM_CHUNK_SIZE
+    sink = _ChunkSink()
+
+    with zipfile.ZipFile(sink, "w") as zipf:
+        for path, arcname in members:
+            path = Path(path)
+            if not path.is_file():
+                continue
+
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            if path.suffix.lower() in PRECOMPRESSED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(path, "rb") as src, zipf.open(info, "w") as dest:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Central directory
+    yield sink.drain()
@@ -0,0 +1,200 @@
+# ============= DOCX PACKAGE =============
+"""
+In-memory access to the parts of a .docx file
+
+The converters used to extractall() the whole ZIP into a temp directory and
+then re-read document.xml, styles.xml, the rels files etc. from disk.
+DocxPackage opens the archive once and reads (and parses) each part lazily,
+at most once. Media members are streamed straight from the archive to
+their destination.
+
+One package can be shared by every step that works on the same document
+(equation replacement, track-changes cleanup, HTML conversion, diagnostics):
+they all see the same parsed trees, so a step that modifies document.xml
+hands the modified tree to the next step without a serialise/re-parse.
+Steps that change a tree call mark_modified() so write() re-serialises it;
+every other member is copied into the new archive as its original
+compressed bytes by DocxRewriter. For very large parts a step can instead
+register a per-block transform with stream_rewrite(): write() then parses
+the part incrementally and writes each transformed block straight into
+the new archive.
+
+stats counts what the package actually read and parsed (bytes_read,
+bytes_parsed, parts_parsed, parse_seconds) for reporting per job.
+"""
+
+import io
+import posixpath
+import shutil
+import time
+import zipfile
+from pathlib import Path
+from lxml import etree
+
+from .docx_rewriter import STREAM_TAGS, DocxRewriter, rewrite_xml_blocks
+from .ooxml import PARSER_OPTIONS, XML_PARSER
+
+RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+
+class DocxPackage:
+    """A .docx whose parts are read and parsed at most once, shared by the processing steps"""
+
+    def __init__(self, source):
+        """source: path, bytes-like file object or anything zipfile.ZipFile accepts"""
+        self.path = Path(source) if isinstance(source, (str, Path)) else None
+        self._zip = zipfile.ZipFile(str(source) if self.path else source, 'r')
+        self._names = {info.filename for info in self._zip.infolist()}
+        self._raw = {}
+        self._trees = {}
+        self._rels = {}
+        self._content_types = None
+        self._modified = set()
+        self._removed = set()
+        self._streamed = {}
+        self.stats = {"bytes_read": 0, "bytes_parsed": 0, "parts_parsed": 0, "parse_seconds": 0.0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def has(self, name):
+        return name in self._names and name not in self._removed
+
+    def infolist(self):
+        return self._zip.infolist()
+
+    def names(self, prefix=''):
+        """Member names starting with prefix, in archive order"""
+        return [info.filename for info in self._zip.infolist() if info.filename.startswith(prefix)]
+
+    def read(self, name):
+        """Raw bytes of a part (cached); None if it does not exist"""
+        if name not in self._raw:
+            if name not in self._names:
+                return None
+            self._raw[name] = self._zip.read(name)
+            self.stats["bytes_read"] += len(self._raw[name])
+        return self._raw[name]
+
+    def xml(self, name):
+        """Parsed root element of an XML part (cached); None if it does not exist"""
+        if name not in self._trees:
+            data = self.read(name)
+            if data is None:
+                return None
+            started = time.perf_counter()
+            self._trees[name] = etree.fromstring(data, XML_PARSER)
+            self.stats["parse_seconds"] += time.perf_counter() - started
+            self.stats["bytes_parsed"] += len(data)
+            self.stats["parts_parsed"] += 1
+        return self._trees[name]
+
+    def size(self, name):
+        """Uncompressed size of a member in bytes (0 if it does not exist)"""
+        return self._zip.getinfo(name).file_size if name in self._names else 0
+
+    def iterparse(self, name, **kwargs):
+        """
+        etree.iterparse() over an XML part, read from the archive as it is parsed
+
+        The part is not cached, so memory depends on what the caller keeps of
+        the tree. kwargs go to iterparse (events, tag, ...). Parsing is
+        interleaved with the caller's work, so it is not added to parse_seconds.
+        """
+        if name in self._modified:
+            stream = io.BytesIO(self.serialize(name))
+        else:
+            stream = self._zip.open(name)
+        with stream:
+            yield from etree.iterparse(stream, **PARSER_OPTIONS, **kwargs)
+        self.stats["bytes_read"] += self.size(name)
+        self.stats["bytes_parsed"] += self.size(name)
+        self.stats["parts_parsed"] += 1
+
+    def mark_modified(self, name):
+        """Record that the tree returned by xml(name) was changed in place"""
+        self._modified.add(name)
+
+    def stream_rewrite(self, name, transform):
+        """Have write() rewrite word/document.xml block by block, calling transform(block) on each"""
+        self._streamed[name] = transform
+
+    def remove(self, name):
+        """Leave a part out of write()"""
+        self._removed.add(name)
+
+    def reset(self, name):
+        """Forget changes to a part; the next xml(name) parses the original bytes again"""
+        self._trees.pop(name, None)
+        self._modified.discard(name)
+
+    def rels(self, part='word/document.xml'):
+        """Relationships of a part: {rId: {'target', 'type'}} (cached)"""
+        if part not in self._rels:
+            folder, filename = posixpath.split(part)
+            root = self.xml(posixpath.join(folder, '_rels', f'{filename}.rels'))
+            rels = {}
+            if root is not None:
+                for rel in root.iterfind(f'{{{RELS_NS}}}Relationship'):
+                    rels[rel.get('Id')] = {
+                        'target': rel.get('Target'),
+                        'type': rel.get('Type', '').split('/')[-1]
+                    }
+            self._rels[part] = rels
+        return self._rels[part]
+
+    def content_types(self):
+        """[Content_Types].xml as {'defaults': {extension: type}, 'overrides': {part: type}}"""
+        if self._content_types is None:
+            root = self.xml('[Content_Types].xml')
+            self._content_types = {'defaults': {}, 'overrides': {}}
+            if root is not None:
+                for default in root.iterfind(f'{{{CONTENT_TYPES_NS}}}Default'):
+                    self._content_types['defaults'][default.get('Extension')] = default.get('ContentType')
+                for override in root.iterfind(f'{{{CONTENT_TYPES_NS}}}Override'):
+                    self._content_types['overrides'][override.get('PartName')] = override.get('ContentType')
+        return self._content_types
+
+    def media(self):
+        """Names of the files under word/media/"""
+        return [name for name in self.names('word/media/') if not name.endswith('/')]
+
+    def copy_member(self, name, dest):
+        """Stream a member to dest without loading it into memory"""
+        with self._zip.open(name) as src, open(dest, 'wb') as out:
+            shutil.copyfileobj(src, out)
+
+    def serialize(self, name):
+        """Bytes of a part as they should be written: re-serialised if modified"""
+        if name in self._modified:
+            return etree.tostring(self._trees[name], encoding='UTF-8', xml_declaration=True)
+        return self.read(name) if name in self._raw else self._zip.read(name)
+
+    def write(self, output_path):
+        """
+        Write the package to a new .docx; returns the DocxRewriter stats
+
+        Modified parts are re-serialised, streamed parts rewritten block by
+        block, removed parts left out and all other members copied
+        compressed, with their original method and CRC.
+        """
+        with DocxRewriter(self._zip, output_path) as rewriter:
+            for item in self._zip.infolist():
+                if item.filename in self._removed:
+                    continue
+                if item.filename in self._streamed:
+                    with rewriter.open(item) as out:
+                        events = self.iterparse(item.filename, events=('start', 'end'), tag=STREAM_TAGS)
+                        rewrite_xml_blocks(events, out, self._streamed[item.filename])
+                elif item.filename in self._modified:
+                    rewriter.replace(item, self.serialize(item.filename))
+                else:
+                    rewriter.copy(item)
+            return rewriter.stats
@@ -0,0 +1,243 @@
+# ============= DOCX REWRITER =============
+"""
+Repackaging a .docx without recompressing it
+
+Writing a changed .docx with zipfile means writestr(item, zip_in.read(...))
+for every member: each image, font and XML part is inflated and deflated
+again although usually only word/document.xml (and sometimes settings.xml)
+changed. DocxRewriter copies the compressed bytes of untouched members
+verbatim from the source archive, with their original compression method
+and CRC, and only encodes the parts that were replaced.
+
+Large XML parts can also be rewritten as a stream: rewrite_xml_blocks()
+serialises the top-level blocks of an iterparse()d part one at a time
+straight into the output entry opened with DocxRewriter.open(), so neither
+the whole tree nor the whole serialised part is held in memory.
+
+stats counts the members (and compressed bytes) copied and re-encoded.
+"""
+
+import copy
+import re
+import struct
+import zipfile
+from contextlib import contextmanager
+
+from lxml import etree
+
+from .ooxml import W_NS
+
+# General purpose flag: CRC and sizes follow the data in a data descriptor
+DATA_DESCRIPTOR_FLAG = 0x08
+
+# Same declaration etree.tostring(..., xml_declaration=True, encoding='UTF-8') writes
+XML_DECLARATION = b"<?xml version='1.0' encoding='UTF-8'?>\n"
+
+NAMESPACE_DECLARATION = re.compile(rb' xmlns(?::[^=\s]+)?="[^"]*"')
+
+# Tags iterparse reports to rewrite_xml_blocks() for word/document.xml: the
+# containers and the usual blocks (the rest is found from their siblings)
+STREAM_TAGS = tuple(f'{{{W_NS}}}{tag}' for tag in ('document', 'body', 'p', 'tbl', 'sdt', 'sectPr'))
+
+
+class DocxRewriter:
+    """Writes a new archive from a source ZipFile, copying unchanged members as-is"""
+
+    def __init__(self, source, output_path, compression=zipfile.ZIP_DEFLATED):
+        """source: an open zipfile.ZipFile (read mode) the members come from"""
+        self.source = source
+        self._zip_out = zipfile.ZipFile(output_path, 'w', compression=compression)
+        self.stats = {"members_copied": 0, "bytes_copied": 0, "members_encoded": 0, "bytes_encoded": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip_out.close()
+
+    def copy(self, item):
+        """Append a source member as its stored (compressed) bytes"""
+        data = self._read_raw(item)
+
+        info = copy.copy(item)
+        # Sizes and CRC go into the local header, so no data descriptor follows the data
+        info.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+        zip_out = self._zip_out
+        with zip_out._lock:
+            zip_out.fp.seek(zip_out.start_dir)
+            info.header_offset = zip_out.fp.tell()
+            zip_out._writecheck(info)
+            zip_out._didModify = True
+            zip_out.fp.write(info.FileHeader(info.file_size > zipfile.ZIP64_LIMIT or
+                                             info.compress_size > zipfile.ZIP64_LIMIT))
+            zip_out.fp.write(data)
+            zip_out.filelist.append(info)
+            zip_out.NameToInfo[info.filename] = info
+            zip_out.start_dir = zip_out.fp.tell()
+
+        self.stats["members_copied"] += 1
+        self.stats["bytes_copied"] += len(data)
+
+    def replace(self, item, data):
+        """Append a source member with new content, keeping its name, date and compression method"""
+        # writestr() updates the ZipInfo it is given; keep the source archive's entries intact
+        info = copy.copy(item)
+        self._zip_out.writestr(info, data)
+        self.stats["members_encoded"] += 1
+        self.stats["bytes_encoded"] += info.compress_size
+
+    @contextmanager
+    def open(self, item):
+        """Writable stream for a source member whose new content is produced incrementally"""
+        info = copy.copy(item)
+        with self._zip_out.open(info, 'w') as stream:
+            yield stream
+        self.stats["members_encoded"] += 1
+        self.stats["bytes_encoded"] += info.compress_size
+
+    def _read_raw(self, item):
+        """Compressed bytes of a source member, read past its local header"""
+        with self.source._lock:
+            src = self.source.fp
+            src.seek(item.header_offset)
+            header = src.read(zipfile.sizeFileHeader)
+            if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile(f"Bad local file header for {item.filename}")
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            src.seek(item.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+            data = src.read(item.compress_size)
+        if len(data) != item.compress_size:
+            raise zipfile.BadZipFile(f"Truncated data for {item.filename}")
+        return data
+
+
+def _escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').encode('utf-8')
+
+
+def _is_body(elem):
+    return etree.QName(elem).localname == 'body'
+
+
+def _strip_declarations(data, declarations):
+    """Drop namespace declarations (already made by the root) from the start tag of a serialised element"""
+    end = data.index(b'>')
+    head = data[:end]
+    for declaration in declarations:
+        head = head.replace(declaration, b'', 1)
+    return head + data[end:]
+
+
+def rewrite_xml_blocks(events, out, transform):
+    """
+    Write word/document.xml (or a part shaped like it) to out one block at a time
+
+    events: etree.iterparse() of the part with events=('start', 'end'),
+    reporting at least the root and w:body (STREAM_TAGS). The blocks are the
+    children of the root and of its w:body; blocks whose tag is not reported
+    are picked up from their siblings. Each block is passed to
+    transform(block), which may change it in place, then serialised and
+    cleared. The result is the same XML as etree.tostring() of the
+    transformed tree (libxml2 writes non-ASCII attribute values of a
+    serialised subtree as character references, so the bytes can differ
+    there).
+    """
+    root = body = None
+    declarations = ()
+    written = {}  # container -> its last written block, kept (cleared) as the parser's anchor
+    pending = None  # (element, 'text' or 'tail') still to be written before the next output
+
+    def flush():
+        nonlocal pending
+        if pending is not None:
+            value = getattr(*pending)
+            if value:
+                out.write(_escape_text(value))
+            pending = None
+
+    def write_block(block, parent, with_tail=True):
+        transform(block)
+        if block.getparent() is not parent:  # transform dropped the block
+            return False
+        out.write(_strip_declarations(
+            etree.tostring(block, encoding='UTF-8', xml_declaration=False, with_tail=with_tail),
+            declarations
+        ))
+        return True
+
+    def write_unreported(blocks, parent):
+        for block in blocks:
+            if block is not written.get(parent):
+                write_block(block, parent)
+
+    def drop_written(elem, parent):
+        # Everything before elem is written; keep elem itself as the parser's anchor
+        while elem.getprevious() is not None:
+            del parent[0]
+        written[parent] = elem
+
+    for event, elem in events:
+        parent = elem.getparent()
+        if event == 'start':
+            if parent is None or (parent is root and body is None and _is_body(elem)):
+                # Write the start tag of the root / w:body (their children are not parsed yet)
+                flush()
+                shell = etree.tostring(etree.Element(elem.tag, elem.attrib, nsmap=elem.nsmap),
+                                       encoding='UTF-8', xml_declaration=False)
+                if parent is None:
+                    root = elem
+                    declarations = NAMESPACE_DECLARATION.findall(shell[:shell.index(b'>')])
+                    out.write(XML_DECLARATION)
+                else:
+                    write_unreported(list(elem.itersiblings(preceding=True))[::-1], parent)
+                    drop_written(elem, parent)
+                    body = elem
+                    shell = _strip_declarations(shell, declarations)
+                out.write(shell[:-2] + b'>')
+                pending = (elem, 'text')
+            continue
+
+        if elem is root or elem is body:
+            flush()
+            write_unreported(list(elem), elem)
+            local = etree.QName(elem).localname
+            out.write(f'</{elem.prefix}:{local}>'.encode() if elem.prefix else f'</{local}>'.encode())
+            pending = (elem, 'tail')
+            if elem is body:
+                elem.clear(keep_tail=True)
+                drop_written(elem, parent)
+        elif parent is not None and (parent is root or parent is body):
+            flush()
+            write_unreported(list(elem.itersiblings(preceding=True))[::-1], parent)
+            # Its tail may not be parsed yet: it is written before the next output
+            if write_block(elem, parent, with_tail=False):
+                elem.clear(keep_tail=True)
+                drop_written(elem, parent)
+                pending = (elem, 'tail')
+            else:
+                del parent[:]
+                written.pop(parent, None)
+
+    if root is None:
+        raise ValueError("rewrite_xml_blocks: the root element was not reported")
+
+
+def rewrite_docx(source_path, output_path, replacements, removed=()):
+    """
+    Copy source_path to output_path with some parts replaced
+
+    replacements: {part name: new bytes}; removed: part names to leave out.
+    Every other member is copied without recompression. Returns the stats.
+    """
+    with zipfile.ZipFile(source_path, 'r') as source, DocxRewriter(source, output_path) as rewriter:
+        for item in source.infolist():
+            if item.filename in removed:
+                continue
+            if item.filename in replacements:
+                rewriter.replace(item, replacements[item.filename])
+            else:
+                rewriter.copy(item)
+        return rewriter.stats
@@ -0,0 +1,83 @@
+# ============= EQUATION MEMO =============
+"""
+Memoisation of OMML equation conversions
+
+Math textbooks repeat the same equations (x, f(x), \\mathbb{R}, ...) many
+times, and every equation in a shape is stored twice (mc:Choice and its
+mc:Fallback copy). The converters look each m:oMath up by a canonical
+fingerprint of its subtree first, so a repeated equation costs one
+fingerprint and one dictionary lookup instead of a full conversion.
+
+A conversion only depends on the equation's own subtree (and the display
+flag), so the fingerprint is a hash of its exclusive C14N form: attribute
+order, namespace prefixes declared elsewhere in the document and the
+surrounding text do not change it. The same fingerprint keys the
+persistent cache shared across documents and workers
+(core/equation_store.py): a memo given a store looks a new equation up
+there before converting it, and flush() saves what it converted.
+"""
+
+import hashlib
+
+from lxml import etree
+
+
+def omml_fingerprint(elem):
+    """Canonical fingerprint (hex) of an OMML subtree"""
+    canonical = etree.tostring(elem, method='c14n', exclusive=True, with_comments=False)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+class EquationMemo:
+    """
+    Per-document cache of equation conversions
+
+    kind names the output ('latex' or 'mathml') in the persistent store
+    (an EquationStore, optional). stats counts hits (repeats within the
+    document), store_hits (found in the store) and misses (converted).
+    """
+
+    def __init__(self, kind=None, store=None):
+        self.kind = kind
+        self.store = store
+        self._results = {}
+        self._converted = []  # Keys converted here, saved to the store by flush()
+        self._reused = []     # Keys read from the store, marked as used by flush()
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0}
+
+    def lookup(self, elem, convert, display=False):
+        """Result of convert() for elem, converted only if its fingerprint is in neither cache"""
+        key = (omml_fingerprint(elem), display)
+        try:
+            result = self._results[key]
+        except KeyError:
+            result = self.store.get(key[0], self.kind, display) if self.store else None
+            if result is None:
+                self.stats["misses"] += 1
+                result = convert()
+                self._converted.append(key)
+            else:
+                self.stats["store_hits"] += 1
+                self._reused.append(key)
+            self._results[key] = result
+        else:
+            self.stats["hits"] += 1
+        return result
+
+    def flush(self):
+        """Save the results converted since the last flush to the store (one transaction)"""
+        if self.store is not None:
+            self.store.save(self.kind, [(*key, self._results[key]) for key in self._converted], self._reused)
+        self._converted, self._reused = [], []
+
+    def clear(self):
+        """Flush, then forget results and stats before converting another document"""
+        self.flush()
+        self._results.clear()
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0}
+
+    def summary(self):
+        """stats plus the hit rate (either cache), for conversion results"""
+        lookups = sum(self.stats.values())
+        hits = self.stats["hits"] + self.stats["store_hits"]
+        return {**self.stats, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
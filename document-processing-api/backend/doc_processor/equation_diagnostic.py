@@ -1,16 +1,16 @@
 # ============= QUICK EQUATION DIAGNOSTIC =============
 """Fast diagnostic to identify missing equations without hanging"""
 
-import zipfile
 from pathlib import Path
-from lxml import etree
 import json
+from .docx_package import DocxPackage
+from .ooxml import FIND_ALL_EQUATIONS, FIND_EQUATION_TEXT
 
 class QuickEquationDiagnostic:
     """Fast diagnostic using only ZIP analysis"""
     
-    def diagnose_document(self, docx_path):
-        """Analyze document structure from ZIP only"""
+    def diagnose_document(self, docx_path, package=None):
+        """Analyze document structure from ZIP only (package: shared DocxPackage of docx_path, optional)"""
         
         docx_path = Path(docx_path).absolute()
         print(f"\n{'='*70}")
@@ -20,39 +20,39 @@ class QuickEquationDiagnostic:
         
         equations = []
         
-        with zipfile.ZipFile(docx_path, 'r') as z:
-            with z.open('word/document.xml') as f:
-                content = f.read()
-                root = etree.fromstring(content)
-                
-                ns = {
-                    'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-                    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
-                }
+        owned = package is None
+        if owned:
+            package = DocxPackage(docx_path)
+        
+        try:
+            root = package.xml('word/document.xml')
+            
+            all_omaths = FIND_ALL_EQUATIONS(root)
+            
+            for i, omath in enumerate(all_omaths, 1):
+                # Get equation text
+                texts = FIND_EQUATION_TEXT(omath)
+                text = ''.join(texts)
                 
-                all_omaths = root.xpath('//m:oMath', namespaces=ns)
+                # Check if in table
+                in_table = False
+                current = omath
+                for _ in range(10):  # Check up to 10 levels up
+                    if current is None:
+                        break
+                    if current.tag.endswith('tc'):  # tc = table cell
+                        in_table = True
+                        break
+                    current = current.getparent()
                 
-                for i, omath in enumerate(all_omaths, 1):
-                    # Get equation text
-                    texts = omath.xpath('.//m:t/text()', namespaces=ns)
-                    text = ''.join(texts)
-                    
-                    # Check if in table
-                    in_table = False
-                    current = omath
-                    for _ in range(10):  # Check up to 10 levels up
-                        if current is None:
-                            break
-                        if current.tag.endswith('tc'):  # tc = table cell
-                            in_table = True
-                            break
-                        current = current.getparent()
-                    
-                    equations.append({
-                        'index': i,
-                        'text': text,
-                        'in_table': in_table
-                    })
+                equations.append({
+                    'index': i,
+                    'text': text,
+                    'in_table': in_table
+                })
+        finally:
+            if owned:
+                package.close()
         
         print(f"Total equations found: {len(equations)}")
         
@@ -0,0 +1,147 @@
+# ============= LATEX REWRITE RULES =============
+"""
+Ordered rewrite rules applied to the LaTeX built by DirectOmmlToLatex
+
+Every rule is compiled once at import and tagged with the stage that
+applies it:
+- 'run'          run text, before smart_symbol_convert (parse_r)
+- 'run_symbols'  run text, after smart_symbol_convert (parse_r)
+- 'clean_simple' equations without \\frac, \\left, ... (clean_output)
+- 'clean'        every equation and script base (clean_output)
+- 'equation'     whole equations (apply_post_processing)
+
+Within a stage the rules run in table order. A rule is skipped when none
+of its triggers (substrings every match contains) is in the text, which
+is the common case: most rules are about one LaTeX command.
+
+apply_rules() can count, per rule, how often it ran, was skipped, changed
+the text and how long it took (see benchmarks/bench_latex_rules.py).
+"""
+
+import re
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class LatexRule:
+    """One rewrite: pattern.sub(replacement), or str.replace for literal rules"""
+    name: str
+    stage: str
+    pattern: object  # Compiled regex, or the literal text
+    replacement: object  # Template string or function (regex rules)
+    triggers: tuple = ()  # Substrings required for a match; empty = always run
+    literal: bool = False
+
+    def apply(self, text):
+        if self.literal:
+            return text.replace(self.pattern, self.replacement)
+        return self.pattern.sub(self.replacement, text)
+
+
+def _rule(name, stage, pattern, replacement, *triggers):
+    return LatexRule(name, stage, re.compile(pattern), replacement, triggers)
+
+
+def _literal(name, stage, text, replacement):
+    return LatexRule(name, stage, text, replacement, (text,), literal=True)
+
+
+def _space_after_command(m):
+    return m.group(1) + (' ' if m.group(1)[-1].isalpha() else '') + m.group(2)
+
+
+LATEX_RULES = (
+    # ---- Run text, before symbol conversion ----
+    # LaTeX commands ALREADY in the text (\neq, \in, ...) followed by a letter or digit without a space
+    _rule('command_spacing', 'run', r'(\\[a-zA-Z]+)([a-zA-Z0-9])', _space_after_command, '\\'),
+    # Differential d (ⅆ) with proper spacing: 'rⅆrⅆ' -> 'r \, dr \, d'
+    _rule('double_differential', 'run', r'([a-z])ⅆ([a-z])ⅆ', r'\1 \, d\2 \, d', 'ⅆ'),
+    # Single differential: 'xⅆ' -> 'x \, d'
+    _rule('differential', 'run', r'([a-z])ⅆ', r'\1 \, d', 'ⅆ'),
+    # Regular 'd' used as a differential after a variable
+    _rule('double_differential_d', 'run', r'([a-z])d([a-z])d\b', r'\1 \, d\2 \, d', 'd'),
+    _rule('differential_d_greek', 'run', r'([a-z])d([αβγδεζηθικλμνξοπρστυφχψω])', r'\1 \, d\2', 'd'),
+
+    # ---- Run text, after symbol conversion ----
+    _rule('relation_spacing', 'run_symbols',
+          r'(\\neq|\\in|\\rightarrow|\\leftarrow|\\implies|\\leq|\\geq)(?![a-z])([a-zA-Z])', r'\1 \2', '\\'),
+    # Any other symbol command we might have missed
+    _rule('symbol_spacing', 'run_symbols',
+          r'(\\(?:neq|eq|leq|geq|in|notin|subset|subseteq|rightarrow|leftarrow|implies|Rightarrow|forall|exists|'
+          r'pm|mp|times|div|cdot|approx|equiv|sim|alpha|beta|gamma|delta|epsilon|theta|lambda|mu|pi|sigma|tau|'
+          r'phi|psi|omega|Gamma|Delta|Sigma|Omega))(?![a-z])([a-zA-Z])', r'\1 \2', '\\'),
+    # Greek letters followed by variables: γz -> \gamma z
+    _rule('greek_spacing', 'run_symbols', r'(\\gamma|\\alpha|\\beta|\\delta|\\theta|\\sigma)([a-z])', r'\1 \2', '\\'),
+
+    # ---- clean_output, simple content only ----
+    _rule('double_braces', 'clean_simple', r'\{\{([^}]+)\}\}', r'{\1}', '{{'),
+
+    # ---- clean_output ----
+    _rule('space_before_subscript', 'clean', r'\s+_', '_', '_'),
+    _rule('space_before_superscript', 'clean', r'\s+\^', '^', '^'),
+    # Partial derivatives
+    _rule('partial_spacing', 'clean', r'(\\partial)([a-zA-Z])', r'\1 \2', '\\partial'),
+    # Missing braces in fractions
+    _rule('frac_braces', 'clean', r'\\frac([a-zA-Z0-9])\{', r'\\frac{\1}{', '\\frac'),
+
+    # ---- apply_post_processing ----
+    # Invisible Unicode characters inserted by Word
+    _literal('function_application', 'equation', '\u2061', ''),
+    _literal('invisible_times', 'equation', '\u2062', ''),
+    _literal('invisible_separator', 'equation', '\u2063', ''),
+    _rule('binom_braces', 'equation', r'\\binom([a-zA-Z])([a-zA-Z])', r'\\binom{\1}{\2}', '\\binom'),
+    _rule('repeated_exponential', 'equation', r'(e\^{[^}]+}[a-z]+)(.*?)\1', r'\1\2', 'e^{'),
+    _rule('repeated_function_call', 'equation',
+          r'([a-zA-Z]+)\\left\(([^)]+)\\right\)\1', r'\1\\left(\2\\right)', '\\left('),
+    _rule('partial_command_spacing', 'equation', r'\\partial([a-zA-Z])', r'\\partial \1', '\\partial'),
+    _rule('upsilon_spacing', 'equation', r'\\upsilon([a-zA-Z])', r'\\upsilon \1', '\\upsilon'),
+    _rule('gamma_spacing', 'equation', r'\\gamma([a-zA-Z])', r'\\gamma \1', '\\gamma'),
+    _rule('rightarrow_spacing', 'equation', r'\\rightarrow([A-Z][a-z])', r'\\rightarrow \1', '\\rightarrow'),
+    _literal('dot_operator', 'equation', '⋅', r'\cdot'),
+    _rule('repeated_lim', 'equation', r'(\\lim[^}]*})\s*\\lim\s', r'\1 ', '\\lim'),
+    _rule('quantifier_spacing', 'equation', r'(\\exists|\\forall)([a-zA-Z])', r'\1 \2', '\\exists', '\\forall'),
+    _rule('binom_parentheses', 'equation',
+          r'\\left\(\\binom\{([^}]+)\}\{([^}]+)\}\\right\)', r'\\binom{\1}{\2}', '\\left(\\binom'),
+    # Leaves no '\cdot' before a letter, so it runs once
+    _rule('cdot_spacing', 'equation', r'\\cdot([A-Za-z])', r'\\cdot \1', '\\cdot'),
+    _rule('relation_digit_spacing', 'equation', r'(\\approx|\\equiv|\\sim)(\d)', r'\1 \2',
+          '\\approx', '\\equiv', '\\sim'),
+)
+
+RULES_BY_STAGE = {
+    stage: tuple(rule for rule in LATEX_RULES if rule.stage == stage)
+    for stage in dict.fromkeys(rule.stage for rule in LATEX_RULES)
+}
+
+
+def apply_rules(stage, text, stats=None):
+    """
+    Apply the rules of a stage to text, in order
+
+    stats: dict to count into (optional), per rule name
+    {'calls', 'skipped', 'changed', 'seconds'}
+    """
+    for rule in RULES_BY_STAGE[stage]:
+        if rule.triggers and not any(trigger in text for trigger in rule.triggers):
+            if stats is not None:
+                _counters(stats, rule)['skipped'] += 1
+            continue
+        if stats is None:
+            text = rule.apply(text)
+            continue
+        counters = _counters(stats, rule)
+        started = time.perf_counter()
+        result = rule.apply(text)
+        counters['seconds'] += time.perf_counter() - started
+        counters['calls'] += 1
+        counters['changed'] += result != text
+        text = result
+    return text
+
+
+def _counters(stats, rule):
+    counters = stats.get(rule.name)
+    if counters is None:
+        counters = stats[rule.name] = {'calls': 0, 'skipped': 0, 'changed': 0, 'seconds': 0.0}
+    return counters
@@ -14,6 +14,7 @@ from lxml import etree
 import traceback
 import time
 from .omml_2_latex import DirectOmmlToLatex
+from .ooxml import XML_PARSER, FIND_ALL_EQUATIONS, FIND_EQUATION_TEXT
 
 class WordCOMEquationReplacer:
     """Word COM equation replacer with VML awareness"""
@@ -40,22 +41,15 @@ class WordCOMEquationReplacer:
             with zipfile.ZipFile(docx_path, 'r') as z:
                 with z.open('word/document.xml') as f:
                     content = f.read()
-                    root = etree.fromstring(content)
+                    root = etree.fromstring(content, XML_PARSER)
                     
-                    ns = {
-                        'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-                        'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-                        'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006',
-                        'v': 'urn:schemas-microsoft-com:vml'
-                    }
-                    
-                    equations = root.xpath('//m:oMath', namespaces=ns)
+                    equations = FIND_ALL_EQUATIONS(root)
                     
                     print(f"Found {len(equations)} equations in XML\n")
                     
                     for i, eq in enumerate(equations, 1):
                         # Get equation content
-                        texts = eq.xpath('.//m:t/text()', namespaces=ns)
+                        texts = FIND_EQUATION_TEXT(eq)
                         text = ''.join(texts)
                         latex = self.omml_parser.parse(eq)
                         
@@ -8,6 +8,11 @@ import zipfile
 import re
 from lxml import etree
 
+from core.equation_store import shared_equation_store
+from .equation_cache import EquationMemo
+from .latex_rules import apply_rules
+from .ooxml import NAMESPACES, FIND_EQUATION_TEXT
+
 # Wingdings / Symbol font → Unicode characters
 # Returns Unicode so smart_symbol_convert handles LaTeX conversion
 WSYM_UNICODE_MAP = {
@@ -209,30 +214,29 @@ FUNCTION_NAMES = {
     'min': r'\min ', 'max': r'\max ', 'det': r'\det ', 'dim': r'\dim ',
 }
 
+# MATH_SYMBOLS as a str.translate table: every symbol is a single character
+# (maketrans refuses anything else), so a run is converted in one pass
+SYMBOL_TABLE = str.maketrans(MATH_SYMBOLS)
+
+# Every function name in one pattern, longest first so 'arcsin'/'sinh' win
+# over 'sin'. Matched at a word boundary, NOT followed by more lowercase
+# letters that form a longer word (e.g. 'inf' should not match inside
+# 'infty'), but DO match 'sin' before a variable like 'sinx' → '\sin x'
+FUNCTION_NAME_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(name) for name in sorted(FUNCTION_NAMES, key=len, reverse=True))
+    + r')(?![a-z]{2,})'
+)
+
 class DirectOmmlToLatex:
-    def __init__(self):
-        self.ns = {
-            'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
-        }
+    def __init__(self, rule_stats=False):
+        self.ns = NAMESPACES
+        self.memo = EquationMemo('latex', shared_equation_store())  # Repeated equations are looked up
+        self.rule_stats = {} if rule_stats else None  # Per-rule counters of apply_rules (latex_rules.py)
 
 
     def smart_symbol_convert(self, text):
         """Convert symbols - spacing already handled in mapping"""
-        result = []
-        i = 0
-        while i < len(text):
-            found = False
-            for symbol, latex in MATH_SYMBOLS.items():
-                if text[i:i+len(symbol)] == symbol:
-                    result.append(latex)
-                    i += len(symbol)
-                    found = True
-                    break
-            if not found:
-                result.append(text[i])
-                i += 1
-        return ''.join(result)
+        return text.translate(SYMBOL_TABLE)
 
 
     def smart_symbol_convert_old(self, text):
@@ -268,41 +272,17 @@ class DirectOmmlToLatex:
             return text
         # Strip U+2061 FUNCTION APPLICATION (invisible char inserted by Word)
         text = text.replace('\u2061', '')
-        # Sort by length (longest first) so 'arcsin' matches before 'sin', etc.
-        sorted_funcs = sorted(FUNCTION_NAMES.items(), key=lambda x: len(x[0]), reverse=True)
-        for func, latex_func in sorted_funcs:
-            # Match function name at word boundary, NOT followed by more lowercase letters
-            # that form a longer known word (e.g. 'inf' should not match inside 'infty')
-            # But DO match 'sin' before variable like 'sinx' → '\sin x'
-            text = re.sub(r'\b' + re.escape(func) + r'(?![a-z]{2,})',
-                         lambda m, lf=latex_func: lf, text)
-        return text
+        # One pass, so a converted name is never matched again (the 'sin' of '\sinh ')
+        return FUNCTION_NAME_PATTERN.sub(lambda m: FUNCTION_NAMES[m.group()], text)
 
 
     def clean_output(self, latex):
         """Clean LaTeX output carefully"""
-        # Skip cleaning for certain patterns INCLUDING mathbb, sqrt, frac
-        if any(cmd in latex for cmd in ['\\binom', '\\left', '\\right', '\\begin', '\\mathbb', '\\sqrt', '\\frac']):
-            # Only do minimal cleaning for complex structures
-            latex = re.sub(r'\s+_', '_', latex)
-            latex = re.sub(r'\s+\^', '^', latex)
-            # Fix partial derivatives
-            latex = re.sub(r'(\\partial)([a-zA-Z])', r'\1 \2', latex)
-            # Fix missing braces in fractions
-            latex = re.sub(r'\\frac([a-zA-Z0-9])\{', r'\\frac{\1}{', latex)
-            return latex
-            
-        # Regular cleaning for simple content
-        # GOOD - you commented out the problematic line!
-        #latex = re.sub(r'(?<!\\[a-zA-Z])\{([a-zA-Z0-9])\}', r'\1', latex)
-        latex = re.sub(r'\{\{([^}]+)\}\}', r'{\1}', latex)
-        latex = re.sub(r'\s+_', '_', latex)
-        latex = re.sub(r'\s+\^', '^', latex)
-        # Fix partial derivatives
-        latex = re.sub(r'(\\partial)([a-zA-Z])', r'\1 \2', latex)
-        # Fix missing braces in fractions
-        latex = re.sub(r'\\frac([a-zA-Z0-9])\{', r'\\frac{\1}{', latex)
-        return latex
+        # Complex structures INCLUDING mathbb, sqrt, frac only get the minimal cleaning
+        if not any(cmd in latex for cmd in ['\\binom', '\\left', '\\right', '\\begin', '\\mathbb', '\\sqrt', '\\frac']):
+            # Regular cleaning for simple content
+            latex = apply_rules('clean_simple', latex, self.rule_stats)
+        return apply_rules('clean', latex, self.rule_stats)
 
     def clean_output_old(self, latex):
         """Clean LaTeX output carefully"""
@@ -336,6 +316,8 @@ class DirectOmmlToLatex:
         
         tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
         handler = getattr(self, f'parse_{tag}', self.parse_default)
+        if tag == 'oMath':
+            return self.memo.lookup(elem, lambda: handler(elem))
         return handler(elem)
     
     def parse_oMath(self, elem):
@@ -354,7 +336,7 @@ class DirectOmmlToLatex:
         scr_elem = elem.find('.//m:scr', self.ns)
         if scr_elem is not None and scr_elem.get(f'{{{self.ns["m"]}}}val') == 'double-struck':
             # Get the text
-            texts = elem.xpath('.//m:t/text()', namespaces=self.ns)
+            texts = FIND_EQUATION_TEXT(elem)
             text = ''.join(texts)
             
             # Convert to \mathbb{} format
@@ -396,43 +378,15 @@ class DirectOmmlToLatex:
 
         # Handle minus sign first
         text = text.replace('−', '-')
-        
 
-        # ADD THIS: Fix spacing for LaTeX commands that are ALREADY in the text
-        # This handles cases where \neq, \in etc are already present without spaces
-        text = re.sub(r'(\\[a-zA-Z]+)([a-zA-Z0-9])', lambda m: m.group(1) + (' ' if m.group(1)[-1].isalpha() else '') + m.group(2), text)
+        # Spacing and differentials in the run text (latex_rules.py)
+        text = apply_rules('run', text, self.rule_stats)
 
-        # FIX: Handle differential d (ⅆ) with proper LaTeX spacing
-        # Pattern 'rⅆrⅆ' should become 'r \, dr \, d'
-        text = re.sub(r'([a-z])ⅆ([a-z])ⅆ', r'\1 \, d\2 \, d', text)
-
-        
-        # Handle single differential like 'xⅆ' -> 'x \, d'
-        text = re.sub(r'([a-z])ⅆ', r'\1 \, d', text)
-        
-        # Also handle regular 'd' as differential when it follows a variable
-        # This catches cases where 'd' is already regular 'd' not 'ⅆ'
-        text = re.sub(r'([a-z])d([a-z])d\b', r'\1 \, d\2 \, d', text)
-        text = re.sub(r'([a-z])d([αβγδεζηθικλμνξοπρστυφχψω])', r'\1 \, d\2', text)
-        
         # Convert symbols with smart spacing
         text = self.smart_symbol_convert(text)
-        
-        # FIX: Add space after Greek letters when followed by variables
-        # This fixes γz → \gamma z in superscripts
-        #text = re.sub(r'(\\gamma|\\alpha|\\beta|\\delta|\\theta|\\sigma)([a-z])', r'\1 \2', text)
-        #text = re.sub(r'(\\neq|\\in|\\rightarrow|\\leftarrow|\\implies|\\leq|\\geq)([a-zA-Z])', r'\1 \2', text)
-        text = re.sub(r'(\\neq|\\in|\\rightarrow|\\leftarrow|\\implies|\\leq|\\geq)(?![a-z])([a-zA-Z])', r'\1 \2', text)
-
-        # ADD THIS: Final spacing fix for any LaTeX commands we might have missed
-        # This is more comprehensive than your current pattern
-        #text = re.sub(r'(\\(?:neq|eq|leq|geq|in|notin|subset|subseteq|rightarrow|leftarrow|implies|Rightarrow|forall|exists|pm|mp|times|div|cdot|approx|equiv|sim|alpha|beta|gamma|delta|epsilon|theta|lambda|mu|pi|sigma|tau|phi|psi|omega|Gamma|Delta|Sigma|Omega))([a-zA-Z])', r'\1 \2', text)
-        text = re.sub(r'(\\(?:neq|eq|leq|geq|in|notin|subset|subseteq|rightarrow|leftarrow|implies|Rightarrow|forall|exists|pm|mp|times|div|cdot|approx|equiv|sim|alpha|beta|gamma|delta|epsilon|theta|lambda|mu|pi|sigma|tau|phi|psi|omega|Gamma|Delta|Sigma|Omega))(?![a-z])([a-zA-Z])', r'\1 \2', text)
-        
-        # Your existing Greek letter spacing (keep this)
-        text = re.sub(r'(\\gamma|\\alpha|\\beta|\\delta|\\theta|\\sigma)([a-z])', r'\1 \2', text)
-        
 
+        # Spacing after the converted symbols
+        text = apply_rules('run_symbols', text, self.rule_stats)
 
         # Convert function names
         text = self.convert_function_names(text)
@@ -916,23 +870,5 @@ class DirectOmmlToLatex:
 
     def apply_post_processing(self, latex):
         """Apply all post-processing fixes"""
-        # Strip invisible Unicode characters inserted by Word
-        latex = latex.replace('\u2061', '')  # FUNCTION APPLICATION
-        latex = latex.replace('\u2062', '')  # INVISIBLE TIMES
-        latex = latex.replace('\u2063', '')  # INVISIBLE SEPARATOR
-        # All the fixes from process_word_document
-        latex = re.sub(r'\\binom([a-zA-Z])([a-zA-Z])', r'\\binom{\1}{\2}', latex)
-        latex = re.sub(r'(e\^{[^}]+}[a-z]+)(.*?)\1', r'\1\2', latex)
-        latex = re.sub(r'([a-zA-Z]+)\\left\(([^)]+)\\right\)\1', r'\1\\left(\2\\right)', latex)
-        latex = re.sub(r'\\partial([a-zA-Z])', r'\\partial \1', latex)
-        latex = re.sub(r'\\upsilon([a-zA-Z])', r'\\upsilon \1', latex)
-        latex = re.sub(r'\\gamma([a-zA-Z])', r'\\gamma \1', latex)
-        latex = re.sub(r'\\rightarrow([A-Z][a-z])', r'\\rightarrow \1', latex)
-        latex = latex.replace('⋅', r'\cdot')
-        latex = re.sub(r'(\\lim[^}]*})\s*\\lim\s', r'\1 ', latex)
-        latex = re.sub(r'(\\exists|\\forall)([a-zA-Z])', r'\1 \2', latex)
-        latex = re.sub(r'\\left\(\\binom\{([^}]+)\}\{([^}]+)\}\\right\)', r'\\binom{\1}{\2}', latex)
-        latex = re.sub(r'\\cdot([A-Za-z])', r'\\cdot \1', latex)
-        latex = re.sub(r'(\\approx|\\equiv|\\sim)(\d)', r'\1 \2', latex)
-        latex = re.sub(r'\\cdot([A-Za-z])', r'\\cdot \1', latex)
-        return latex
+        # All the fixes from process_word_document, see latex_rules.py
+        return apply_rules('equation', latex, self.rule_stats)
@@ -12,6 +12,10 @@ Same recursive parsing approach, different output format.
 import re
 from lxml import etree
 
+from core.equation_store import shared_equation_store
+from .equation_cache import EquationMemo
+from .ooxml import NAMESPACES, FIND_EQUATION_TEXT, FIND_TEXT
+
 
 # Unicode accent characters mapped to MathML combining characters
 ACCENT_MAP = {
@@ -66,15 +70,33 @@ FUNCTION_NAMES = {
     'arg', 'deg', 'hom', 'ker', 'Pr',
 }
 
+# Characters of a math run rendered as <mo> (besides anything that is
+# neither a letter nor Greek)
+OPERATOR_CHARS = frozenset(
+    '+-=<>()[]{}|/\\!@#$%&*,;:.?'
+    '\u2260\u2264\u2265\u00b1\u00d7\u00f7\u22c5\u2248\u2261\u223c\u2208\u2209\u2282\u2286\u222a\u2229'
+    '\u2205\u2227\u2228\u00ac\u2200\u2203\u2192\u2190\u2194\u21d2\u27f9\u27f8\u2202\u2207\u221e\u2220'
+    '\u22a5\u2225\u2026\u2234\u2235\u2213\u22c5\u2211\u220f\u222b'
+)
+
+# Multi-character tokens of a math run, matched at a position: a number or a
+# function name (longest first; it only counts if no letter follows, which
+# _classify_and_wrap checks). Everything else is classified one character
+# at a time.
+MATH_TOKEN = re.compile(
+    r'(?P<number>\d+\.?\d*)|(?P<function>'
+    + '|'.join(re.escape(name) for name in sorted(FUNCTION_NAMES, key=len, reverse=True))
+    + ')'
+)
+
 
 class OmmlToMathMLConverter:
     """Converts OMML XML elements to MathML HTML strings."""
 
     def __init__(self):
-        self.ns = {
-            'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
-        }
+        self.ns = NAMESPACES
+        self.memo = EquationMemo('mathml', shared_equation_store())  # Repeated equations are looked up
+        self.char_elements = {}  # Run characters already classified by _char_element
 
     def convert(self, omml_element, is_display=False):
         """Convert an m:oMath or m:oMathPara element to MathML HTML string.
@@ -88,7 +110,9 @@ class OmmlToMathMLConverter:
         """
         if omml_element is None:
             return ''
+        return self.memo.lookup(omml_element, lambda: self._convert(omml_element, is_display), is_display)
 
+    def _convert(self, omml_element, is_display):
         tag = self._tag_name(omml_element)
 
         # If it's an oMathPara, it's always display mode
@@ -245,54 +269,42 @@ class OmmlToMathMLConverter:
 
         parts = []
         i = 0
-        while i < len(text):
-            # Try to match a number (possibly with decimal point)
-            num_match = re.match(r'^(\d+\.?\d*)', text[i:])
-            if num_match:
-                parts.append(f'<mn>{self._escape(num_match.group(1))}</mn>')
-                i += len(num_match.group(1))
-                continue
-
-            char = text[i]
-
-            # Operators and punctuation
-            if char in '+-=<>()[]{}|/\\!@#$%&*,;:.?' or char in '\u2260\u2264\u2265\u00b1\u00d7\u00f7\u22c5\u2248\u2261\u223c\u2208\u2209\u2282\u2286\u222a\u2229\u2205\u2227\u2228\u00ac\u2200\u2203\u2192\u2190\u2194\u21d2\u27f9\u27f8\u2202\u2207\u221e\u2220\u22a5\u2225\u2026\u2234\u2235\u2213\u22c5\u2211\u220f\u222b':
-                parts.append(f'<mo>{self._escape(char)}</mo>')
-                i += 1
-                continue
-
-            # Check for function names at this position
-            func_found = False
-            for func_name in sorted(FUNCTION_NAMES, key=len, reverse=True):
-                if text[i:].startswith(func_name):
-                    # Make sure it's a whole word
-                    end_pos = i + len(func_name)
-                    if end_pos >= len(text) or not text[end_pos].isalpha():
-                        parts.append(f'<mi mathvariant="normal">{func_name}</mi>')
-                        i = end_pos
-                        func_found = True
-                        break
-            if func_found:
-                continue
-
-            # Single letter = identifier (italic by default)
-            if char.isalpha():
-                parts.append(f'<mi>{self._escape(char)}</mi>')
-                i += 1
-                continue
-
-            # Greek and other Unicode math characters -> mi or mo
-            if self._is_greek(char):
-                parts.append(f'<mi>{self._escape(char)}</mi>')
-                i += 1
-                continue
-
-            # Default: treat as operator
-            parts.append(f'<mo>{self._escape(char)}</mo>')
+        end = len(text)
+        while i < end:
+            token = MATH_TOKEN.match(text, i)
+            if token is not None:
+                # Number (possibly with decimal point)
+                if token.lastgroup == 'number':
+                    parts.append(f'<mn>{self._escape(token.group())}</mn>')
+                    i = token.end()
+                    continue
+                # Function name, if it is a whole word (a shorter name would be followed by a letter too)
+                if token.end() >= end or not text[token.end()].isalpha():
+                    parts.append(f'<mi mathvariant="normal">{token.group()}</mi>')
+                    i = token.end()
+                    continue
+
+            parts.append(self._char_element(text[i]))
             i += 1
 
         return ''.join(parts)
 
+    def _char_element(self, char):
+        """<mo>/<mi> for a single character, memoised per character"""
+        element = self.char_elements.get(char)
+        if element is None:
+            if char in OPERATOR_CHARS:
+                # Operators and punctuation
+                element = f'<mo>{self._escape(char)}</mo>'
+            elif char.isalpha() or self._is_greek(char):
+                # Single letter = identifier (italic by default); Greek and math alphanumerics too
+                element = f'<mi>{self._escape(char)}</mi>'
+            else:
+                # Default: treat as operator
+                element = f'<mo>{self._escape(char)}</mo>'
+            self.char_elements[char] = element
+        return element
+
     def _is_greek(self, char):
         """Check if a character is a Greek letter."""
         cp = ord(char)
@@ -735,9 +747,9 @@ class OmmlToMathMLConverter:
 
     def _extract_text(self, elem):
         """Extract all text content from an element."""
-        texts = elem.xpath('.//m:t/text()', namespaces=self.ns)
+        texts = FIND_EQUATION_TEXT(elem)
         if not texts:
-            texts = elem.xpath('.//w:t/text()', namespaces=self.ns)
+            texts = FIND_TEXT(elem)
         return ''.join(texts)
 
     def _escape(self, text):
@@ -0,0 +1,120 @@
+# ============= OOXML QUERIES =============
+"""
+Shared OOXML namespaces, precompiled XPath queries and XML parser
+
+element.xpath('...') compiles its expression on every call, which adds up
+in per-run and per-paragraph code. The queries here are compiled once at
+import with the shared NAMESPACES and called as QUERY(element); the
+converters in word_to_html_full.py, enhanced_zip_converter.py and
+doc_processor/ use them instead of their own namespace dicts and
+xpath() strings.
+
+XML_PARSER is the parser every part is parsed with (see DocxPackage);
+PARSER_OPTIONS are its settings, for iterparse().
+"""
+
+from lxml import etree
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+M_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/math'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+MC_NS = 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+WP_NS = 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing'
+PIC_NS = 'http://schemas.openxmlformats.org/drawingml/2006/picture'
+WPS_NS = 'http://schemas.microsoft.com/office/word/2010/wordprocessingShape'
+WPG_NS = 'http://schemas.microsoft.com/office/word/2010/wordprocessingGroup'
+V_NS = 'urn:schemas-microsoft-com:vml'
+
+NAMESPACES = {
+    'w': W_NS,
+    'm': M_NS,
+    'r': R_NS,
+    'mc': MC_NS,
+    'a': A_NS,
+    'wp': WP_NS,
+    'pic': PIC_NS,
+    'wps': WPS_NS,
+    'wpg': WPG_NS,
+    'v': V_NS,
+}
+
+# Parts come from uploaded files: no entities or network access. huge_tree
+# lifts libxml2's limits on very large text nodes and deep documents;
+# collect_ids=False skips the xml:id table nobody looks up.
+PARSER_OPTIONS = {'resolve_entities': False, 'no_network': True, 'huge_tree': True, 'collect_ids': False}
+XML_PARSER = etree.XMLParser(**PARSER_OPTIONS)
+
+
+def _xpath(expression):
+    return etree.XPath(expression, namespaces=NAMESPACES)
+
+
+# ---- Equations ----
+FIND_EQUATIONS = _xpath('descendant-or-self::m:oMath')
+FIND_NESTED_EQUATIONS = _xpath('.//m:oMath')
+FIND_EQUATIONS_OR_PARAS = _xpath('.//m:oMath | .//m:oMathPara')
+FIND_EQUATION_TEXT = _xpath('.//m:t/text()')
+FIND_EQUATION_TEXT_ELEMENTS = _xpath('.//m:t')
+FIND_ALL_EQUATIONS = _xpath('//m:oMath')
+FIND_EQUATION_PARA = _xpath('ancestor::m:oMathPara')
+
+# Where an equation sits (EnhancedZipConverter._get_equation_location)
+IN_MC_CHOICE = _xpath('ancestor::mc:Choice')
+IN_MC_FALLBACK = _xpath('ancestor::mc:Fallback')
+IN_VML_TEXTBOX = _xpath('ancestor::v:textbox')
+IN_WPS_TEXTBOX = _xpath('ancestor::wps:txbx')
+IN_TEXTBOX_CONTENT = _xpath('ancestor::w:txbxContent')
+
+# ---- Tracked changes and revision marks (relative, so they also work per body block) ----
+FIND_DELETIONS = _xpath('descendant-or-self::w:del')
+FIND_INSERTIONS = _xpath('descendant-or-self::w:ins')
+FIND_MOVES_FROM = _xpath('descendant-or-self::w:moveFrom')
+FIND_MOVES_TO = _xpath('descendant-or-self::w:moveTo')
+FIND_RSID_ELEMENTS = _xpath('descendant-or-self::*[@w:rsidR or @w:rsidDel or @w:rsidRPr or @w:rsidTr]')
+FIND_PROPERTY_CHANGES = _xpath('descendant-or-self::w:pPrChange | descendant-or-self::w:rPrChange')
+
+# ---- Document structure ----
+FIND_BODY = _xpath('//w:body')
+FIND_PARAGRAPHS = _xpath('.//w:p')
+FIND_RUNS = _xpath('.//w:r')
+FIND_TEXT_ELEMENTS = _xpath('.//w:t')
+FIND_TEXT = _xpath('.//w:t/text()')
+FIND_ROWS = _xpath('./w:tr')
+FIND_CELLS = _xpath('./w:tc')
+FIND_CELL_PARAGRAPHS = _xpath('./w:p')
+FIND_PARAGRAPH_STYLE = _xpath('.//w:pStyle/@w:val')
+FIND_NUM_PR = _xpath('.//w:numPr')
+FIND_NUM_ID = _xpath('.//w:numId/@w:val')
+FIND_ILVL = _xpath('.//w:ilvl/@w:val')
+FIND_FOOTNOTE_REF = _xpath('.//w:footnoteRef')
+
+# ---- styles.xml, numbering.xml, footnotes.xml ----
+FIND_STYLES = _xpath('//w:style')
+FIND_STYLE_NAME = _xpath('w:name/@w:val')
+FIND_ABSTRACT_NUMS = _xpath('//w:abstractNum')
+FIND_LEVELS = _xpath('.//w:lvl')
+FIND_NUM_FORMAT = _xpath('.//w:numFmt/@w:val')
+FIND_NUMS = _xpath('//w:num')
+FIND_ABSTRACT_NUM_ID = _xpath('.//w:abstractNumId/@w:val')
+FIND_FOOTNOTES = _xpath('//w:footnote')
+
+# ---- Drawings, shapes and VML ----
+FIND_DRAWINGS = _xpath('.//w:drawing')
+FIND_PICTS = _xpath('.//w:pict')
+FIND_IMAGE_EMBED = _xpath('.//a:blip/@r:embed')
+FIND_EXTENT = _xpath('.//wp:extent')
+FIND_SHAPE_GROUPS = _xpath('.//wpg:wgp')
+FIND_SHAPES = _xpath('.//wps:wsp')
+FIND_CONNECTORS = _xpath('.//wps:cxnSp')
+FIND_OFFSET = _xpath('.//a:off')
+FIND_SIZE = _xpath('.//a:ext')
+FIND_PRESET_GEOMETRY = _xpath('.//a:prstGeom/@prst')
+FIND_FILL_COLOR = _xpath('.//a:solidFill/a:srgbClr/@val')
+FIND_LINE_COLOR = _xpath('.//a:ln/a:solidFill/a:srgbClr/@val')
+FIND_CONNECTION_START = _xpath('.//a:stCxn')
+FIND_CONNECTION_END = _xpath('.//a:endCxn')
+FIND_SHAPE_TEXT = _xpath('.//w:t/text() | .//a:t/text()')
+FIND_VML_OVALS = _xpath('.//v:oval')
+FIND_VML_RECTS = _xpath('.//v:rect')
+FIND_VML_LINES = _xpath('.//v:line')
@@ -3,13 +3,24 @@
 ZIP-based equation replacer that handles Track Changes
 No Word COM needed - cleans tracked changes directly in XML
 """
-import zipfile
 import os
 import shutil
 from pathlib import Path
 from lxml import etree
+import time
 import traceback
+from contextlib import contextmanager
 from .omml_2_latex import DirectOmmlToLatex
+from .docx_package import DocxPackage
+from .docx_rewriter import rewrite_docx
+
+from .ooxml import (
+    NAMESPACES, W_NS, FIND_ALL_EQUATIONS, FIND_DELETIONS, FIND_EQUATION_TEXT, FIND_EQUATIONS, FIND_INSERTIONS,
+    FIND_MOVES_FROM, FIND_MOVES_TO, FIND_PROPERTY_CHANGES, FIND_RSID_ELEMENTS,
+)
+
+# Tracked-change counters reported by _accept_tracked_changes
+TRACKED_CHANGE_COUNTERS = ('insertions', 'deletions', 'format_changes', 'moves')
 
 class ZipEquationReplacer:
     """ZIP-based equation replacer - handles Track Changes without Word COM"""
@@ -17,9 +28,23 @@ class ZipEquationReplacer:
     def __init__(self):
         self.omml_parser = DirectOmmlToLatex()
         self.equations_found = []
+        self.timings = {}
+        self.ns = NAMESPACES
     
-    def process_document(self, docx_path, output_path=None):
-        """Process document using ZIP approach - handles Track Changes automatically"""
+    def process_document(self, docx_path, output_path=None, package=None, stream=False):
+        """
+        Process document using ZIP approach - handles Track Changes automatically
+
+        One pass: the package is read once, tracked changes are accepted and the
+        equations replaced in the same in-memory document.xml/settings.xml, and
+        the result is written once. Nothing is written next to docx_path.
+        Per-stage timings (seconds) are left in self.timings, equation memo
+        hits/misses in self.omml_parser.memo.
+
+        package: DocxPackage of docx_path already opened by the caller (optional)
+        stream: clean and replace document.xml block by block while it is
+            written (bounded memory for very large documents)
+        """
         
         docx_path = Path(docx_path).absolute()
         
@@ -38,27 +63,34 @@ class ZipEquationReplacer:
         print(f"📁 Output: {output_path}")
         print(f"{'='*60}\n")
         
+        self.timings = {}
+        self.omml_parser.memo.clear()
+        owned = package is None
         try:
-            # STEP 1: Create clean version without Track Changes
-            temp_clean = docx_path.parent / f"{docx_path.stem}_clean_temp.docx"
-            self.accept_all_changes_and_disable_tracking(docx_path, temp_clean)
+            if owned:
+                package = DocxPackage(docx_path)
+            
+            if stream:
+                return self._process_streamed(package, output_path)
+            
+            # STEP 1: Accept Track Changes in memory
+            with self._timed('accept_changes'):
+                self.accept_all_changes_and_disable_tracking(docx_path, package=package)
             
-            # STEP 2: Process equations on the CLEAN document
-            equations = self._extract_and_convert_equations_from_zip(temp_clean)
+            # STEP 2: Process equations on the CLEAN document (the cleaned tree is still in the package)
+            with self._timed('convert_equations'):
+                equations = self._extract_and_convert_equations_from_zip(package)
             
             if not equations:
-                print("⚠ No equations found, copying clean document")
-                shutil.copy2(temp_clean, output_path)
-                temp_clean.unlink()  # Clean up
+                print("⚠ No equations found, writing clean document")
+                with self._timed('write'):
+                    package.write(output_path)
                 return output_path
             
             print(f"✓ Found {len(equations)} equations")
             
-            # STEP 3: Replace equations in the clean document
-            self._replace_equations_in_zip(temp_clean, output_path, equations)
-            
-            # Clean up temp file
-            temp_clean.unlink()
+            # STEP 3: Replace equations in the clean document and write it
+            self._replace_equations_in_zip(package, output_path, equations)
             
             print(f"\n✅ SUCCESS! ZIP processing complete")
             print(f"📄 Output: {output_path}")
@@ -69,93 +101,155 @@ class ZipEquationReplacer:
         except Exception as e:
             print(f"❌ ERROR: {e}")
             traceback.print_exc()
-            # Clean up temp file if it exists
-            temp_clean = docx_path.parent / f"{docx_path.stem}_clean_temp.docx"
-            if temp_clean.exists():
-                temp_clean.unlink()
             shutil.copy2(docx_path, output_path)
             return output_path
+        
+        finally:
+            self.omml_parser.memo.flush()  # Equations converted here join the persistent cache
+            if owned and package is not None:
+                package.close()
     
-    def accept_all_changes_and_disable_tracking(self, docx_path, output_path):
+    def _process_streamed(self, package, output_path):
+        """Streaming variant of process_document: each body block is cleaned and its equations replaced as it is written"""
+        
+        print("Processing Track Changes and equations block by block (streaming)")
+        changes_count = dict.fromkeys(TRACKED_CHANGE_COUNTERS, 0)
+        self.equations_found = []
+        
+        def process_block(block):
+            with self._timed('accept_changes'):
+                self._accept_tracked_changes(block, changes_count)
+            
+            # Convert all equations of the block before replacing any (same as the tree path)
+            with self._timed('convert_equations'):
+                nodes = FIND_EQUATIONS(block)
+                try:
+                    latex = [self.omml_parser.parse(eq) for eq in nodes]
+                except Exception as e:
+                    print(f"❌ Error converting equations: {e}")
+                    return
+            
+            with self._timed('replace_equations'):
+                first = len(self.equations_found)
+                self.equations_found.extend(latex)
+                for offset in range(len(nodes) - 1, -1, -1):
+                    self._replace_equation_node(nodes[offset], latex[offset], first + offset)
+        
+        with self._timed('accept_changes'):
+            self._disable_tracking(package)
+        
+        package.stream_rewrite('word/document.xml', process_block)
+        stages = ('accept_changes', 'convert_equations', 'replace_equations')
+        before = sum(self.timings.get(stage, 0.0) for stage in stages)
+        started = time.perf_counter()
+        package.write(output_path)
+        # write() ran the per-block stages timed above; report the rest as 'write'
+        block_seconds = sum(self.timings.get(stage, 0.0) for stage in stages) - before
+        self.timings['write'] = time.perf_counter() - started - block_seconds
+        
+        self._print_changes(changes_count)
+        print(f"\n✅ SUCCESS! ZIP processing complete")
+        print(f"📄 Output: {output_path}")
+        print(f"📊 Equations processed: {len(self.equations_found)}")
+        
+        return output_path
+    
+    @contextmanager
+    def _timed(self, stage):
+        """Add the time spent in the block to self.timings[stage]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - started
+    
+    def accept_all_changes_and_disable_tracking(self, docx_path, output_path=None, package=None):
         """
         Complete solution: Accept ALL tracked changes and disable tracking
+
+        The cleaned trees stay in package (if given), so later steps sharing it see them.
+        The cleaned document is only written when output_path is given.
         """
         
         print("\n" + "="*60)
         print("Processing Track Changes in ZIP")
         print("="*60)
         
-        with zipfile.ZipFile(docx_path, 'r') as zip_in:
-            with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_out:
-                
-                for item in zip_in.infolist():
-                    
-                    # STEP 1: Clean document.xml - Accept all changes
-                    if item.filename == 'word/document.xml':
-                        content = zip_in.read(item.filename)
-                        root = etree.fromstring(content)
-                        
-                        cleaned_root = self._accept_all_tracked_changes(root)
-                        
-                        modified_content = etree.tostring(
-                            cleaned_root, 
-                            encoding='UTF-8', 
-                            xml_declaration=True,
-                            pretty_print=False
-                        )
-                        zip_out.writestr(item, modified_content)
-                        
-                    # STEP 2: Modify settings.xml - Turn OFF tracking
-                    elif item.filename == 'word/settings.xml':
-                        content = zip_in.read(item.filename)
-                        root = etree.fromstring(content)
-                        
-                        ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-                        
-                        # Remove trackRevisions element (turns OFF tracking)
-                        track_elem = root.find('.//w:trackRevisions', namespaces=ns)
-                        if track_elem is not None:
-                            parent = track_elem.getparent()
-                            parent.remove(track_elem)
-                            print("  ✓ Track Changes disabled")
-                        
-                        modified_content = etree.tostring(root, encoding='UTF-8', xml_declaration=True)
-                        zip_out.writestr(item, modified_content)
-                        
-                    # STEP 3: Skip people.xml and revisionsView.xml (no longer needed)
-                    elif item.filename in ['word/people.xml', 'word/revisionsView.xml']:
-                        print(f"  Skipping {item.filename} (no longer needed)")
-                        continue
-                        
-                    else:
-                        # Copy all other files
-                        zip_out.writestr(item, zip_in.read(item.filename))
+        owned = package is None
+        if owned:
+            package = DocxPackage(docx_path)
+        
+        try:
+            # STEP 1: Clean document.xml - Accept all changes
+            root = package.xml('word/document.xml')
+            if root is not None:
+                self._accept_all_tracked_changes(root)
+                package.mark_modified('word/document.xml')
+            
+            # STEP 2 + 3: Turn OFF tracking, drop the revision parts
+            self._disable_tracking(package)
+            
+            # Copy all other files
+            if output_path:
+                package.write(output_path)
+        finally:
+            if owned:
+                package.close()
         
         print("✓ All changes accepted, tracking disabled")
     
+    def _disable_tracking(self, package):
+        """Turn OFF tracking in settings.xml and leave out people.xml / revisionsView.xml"""
+        
+        # Modify settings.xml - Turn OFF tracking
+        root = package.xml('word/settings.xml')
+        if root is not None:
+            # Remove trackRevisions element (turns OFF tracking)
+            track_elem = root.find('.//w:trackRevisions', namespaces=self.ns)
+            if track_elem is not None:
+                parent = track_elem.getparent()
+                parent.remove(track_elem)
+                package.mark_modified('word/settings.xml')
+                print("  ✓ Track Changes disabled")
+        
+        # Skip people.xml and revisionsView.xml (no longer needed)
+        for name in ['word/people.xml', 'word/revisionsView.xml']:
+            if package.has(name):
+                package.remove(name)
+                print(f"  Skipping {name} (no longer needed)")
+    
     def _accept_all_tracked_changes(self, root):
         """
         Accept all tracked changes in document.xml - COMPLETE IMPLEMENTATION
         """
         
-        ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+        changes_count = dict.fromkeys(TRACKED_CHANGE_COUNTERS, 0)
+        self._accept_tracked_changes(root, changes_count)
+        self._print_changes(changes_count)
+        
+        return root
+    
+    def _print_changes(self, changes_count):
+        print(f"\n  Changes accepted:")
+        print(f"    Deletions removed: {changes_count['deletions']}")
+        print(f"    Insertions accepted: {changes_count['insertions']}")
+        print(f"    Moves processed: {changes_count['moves']}")
+        print(f"    Format changes: {changes_count['format_changes']}")
+    
+    def _accept_tracked_changes(self, root, changes_count):
+        """Accept the tracked changes in root and below (the whole document or one body block)"""
         
-        changes_count = {
-            'insertions': 0,
-            'deletions': 0,
-            'format_changes': 0,
-            'moves': 0
-        }
+        ns = self.ns
         
         # 1. Process DELETIONS first (remove them)
-        for del_elem in root.xpath('//w:del', namespaces=ns):
+        for del_elem in FIND_DELETIONS(root):
             parent = del_elem.getparent()
             if parent is not None:
                 parent.remove(del_elem)
                 changes_count['deletions'] += 1
         
         # 2. Process INSERTIONS (keep content, remove wrapper)
-        for ins_elem in root.xpath('//w:ins', namespaces=ns):
+        for ins_elem in FIND_INSERTIONS(root):
             parent = ins_elem.getparent()
             if parent is not None:
                 # Move all children out of w:ins wrapper
@@ -166,14 +260,14 @@ class ZipEquationReplacer:
         
         # 3. Process MOVES (moveFrom/moveTo)
         # Remove moveFrom (source of move)
-        for move_from in root.xpath('//w:moveFrom', namespaces=ns):
+        for move_from in FIND_MOVES_FROM(root):
             parent = move_from.getparent()
             if parent is not None:
                 parent.remove(move_from)
                 changes_count['moves'] += 1
         
         # Keep moveTo content (destination of move)
-        for move_to in root.xpath('//w:moveTo', namespaces=ns):
+        for move_to in FIND_MOVES_TO(root):
             parent = move_to.getparent()
             if parent is not None:
                 for child in list(move_to):
@@ -181,29 +275,21 @@ class ZipEquationReplacer:
                 parent.remove(move_to)
         
         # 4. Process FORMAT CHANGES (remove change tracking attributes)
-        for elem in root.xpath('//*[@w:rsidR or @w:rsidDel or @w:rsidRPr or @w:rsidTr]', namespaces=ns):
+        for elem in FIND_RSID_ELEMENTS(root):
             # Remove all revision tracking attributes
             attrs_to_remove = ['rsidR', 'rsidDel', 'rsidRPr', 'rsidTr', 'rsidP', 'rsidRDefault']
             for attr in attrs_to_remove:
                 elem.attrib.pop(f'{{{ns["w"]}}}{attr}', None)
         
         # 5. Remove property changes
-        for prop_change in root.xpath('//w:pPrChange | //w:rPrChange', namespaces=ns):
+        for prop_change in FIND_PROPERTY_CHANGES(root):
             parent = prop_change.getparent()
             if parent is not None:
                 parent.remove(prop_change)
                 changes_count['format_changes'] += 1
-        
-        print(f"\n  Changes accepted:")
-        print(f"    Deletions removed: {changes_count['deletions']}")
-        print(f"    Insertions accepted: {changes_count['insertions']}")
-        print(f"    Moves processed: {changes_count['moves']}")
-        print(f"    Format changes: {changes_count['format_changes']}")
-        
-        return root
     
-    def _extract_and_convert_equations_from_zip(self, docx_path):
-        """Extract equations from ZIP file"""
+    def _extract_and_convert_equations_from_zip(self, package):
+        """Extract equations from the package's document.xml"""
         
         print(f"\n{'='*40}")
         print("Extracting equations from ZIP")
@@ -212,31 +298,27 @@ class ZipEquationReplacer:
         results = []
         
         try:
-            with zipfile.ZipFile(docx_path, 'r') as z:
-                with z.open('word/document.xml') as f:
-                    content = f.read()
-                    root = etree.fromstring(content)
-                    
-                    ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math'}
-                    equations = root.xpath('//m:oMath', namespaces=ns)
-                    
-                    print(f"Found {len(equations)} equations in XML\n")
-                    
-                    for i, eq in enumerate(equations, 1):
-                        # Extract text for reference
-                        texts = eq.xpath('.//m:t/text()', namespaces=ns)
-                        text = ''.join(texts)
-                        
-                        # Convert to LaTeX using your parser
-                        latex = self.omml_parser.parse(eq)
-                        
-                        results.append({
-                            'index': i,
-                            'text': text,
-                            'latex': latex
-                        })
-                        
-                        print(f"  Equation {i}: {latex[:50]}..." if len(latex) > 50 else f"  Equation {i}: {latex}")
+            root = package.xml('word/document.xml')
+            
+            equations = FIND_ALL_EQUATIONS(root)
+            
+            print(f"Found {len(equations)} equations in XML\n")
+            
+            for i, eq in enumerate(equations, 1):
+                # Extract text for reference
+                texts = FIND_EQUATION_TEXT(eq)
+                text = ''.join(texts)
+                
+                # Convert to LaTeX using your parser
+                latex = self.omml_parser.parse(eq)
+                
+                results.append({
+                    'index': i,
+                    'text': text,
+                    'latex': latex
+                })
+                
+                print(f"  Equation {i}: {latex[:50]}..." if len(latex) > 50 else f"  Equation {i}: {latex}")
             
             print(f"\n✓ Successfully converted {len(results)} equations")
             return results
@@ -246,35 +328,23 @@ class ZipEquationReplacer:
             traceback.print_exc()
             return []
     
-    def _replace_equations_in_zip(self, input_path, output_path, equations):
-        """Replace equations in ZIP file"""
+    def _replace_equations_in_zip(self, package, output_path, equations):
+        """Replace equations in the package's document.xml and write it to output_path"""
         
         print(f"\n{'='*40}")
         print("Replacing equations in ZIP")
         print(f"{'='*40}")
         
         try:
-            # Read the document.xml from the input ZIP
-            with zipfile.ZipFile(input_path, 'r') as z:
-                with z.open('word/document.xml') as f:
-                    content = f.read()
-                    root = etree.fromstring(content)
-            
-            # Replace equations in the XML
-            self._replace_equations_in_xml(root, equations)
-            
-            # Create a NEW ZIP file (not append mode!)
-            with zipfile.ZipFile(input_path, 'r') as zip_in:
-                with zipfile.ZipFile(output_path, 'w') as zip_out:
-                    # Copy all files from input ZIP
-                    for item in zip_in.infolist():
-                        if item.filename == 'word/document.xml':
-                            # Replace document.xml with our modified version
-                            modified_content = etree.tostring(root, encoding='unicode')
-                            zip_out.writestr(item, modified_content.encode('utf-8'))
-                        else:
-                            # Copy all other files as-is
-                            zip_out.writestr(item, zip_in.read(item.filename))
+            # Replace equations in the (already parsed) XML
+            with self._timed('replace_equations'):
+                root = package.xml('word/document.xml')
+                self._replace_equations_in_xml(root, equations)
+                package.mark_modified('word/document.xml')
+            
+            # Create a NEW ZIP file (not append mode!) with all other files copied as-is
+            with self._timed('write'):
+                package.write(output_path)
                 
             print(f"✓ Equations replaced in ZIP successfully")
             
@@ -287,13 +357,7 @@ class ZipEquationReplacer:
     def _replace_equations_in_xml(self, root, equations):
         """FIXED: Properly create elements with namespaces"""
         
-        ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-        
-        # IMPORTANT: Define full namespace strings for element creation
-        W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
-        
-        all_equations = root.xpath('//m:oMath', namespaces=ns)
+        all_equations = FIND_ALL_EQUATIONS(root)
         
         print(f"Found {len(all_equations)} equations to replace")
         
@@ -304,68 +368,75 @@ class ZipEquationReplacer:
             if i >= len(equations):
                 continue
                 
-            eq_node = all_equations[i]
+            if self._replace_equation_node(all_equations[i], equations[i]['latex'], i):
+                equations_replaced += 1
+        
+        print(f"✓ Replaced {equations_replaced} equations")
+        return root
+    
+    def _replace_equation_node(self, eq_node, latex, i):
+        """Replace one m:oMath (equation number i + 1) with a run holding its marked LaTeX"""
+        
+        # IMPORTANT: Define full namespace strings for element creation
+        w = f'{{{W_NS}}}'
+        
+        try:
+            latex = latex.strip() or f"[EQUATION_{i + 1}_EMPTY]"
             
-            try:
-                latex = equations[i]['latex'].strip() or f"[EQUATION_{i + 1}_EMPTY]"
-                
-                # Create marked text
-                is_inline = len(latex) < 30
-                if is_inline:
-                    marked_text = f' MATHSTARTINLINE\\({latex}\\)MATHENDINLINE '
-                else:
-                    marked_text = f' MATHSTARTDISPLAY\\[{latex}\\]MATHENDDISPLAY '
+            # Create marked text
+            is_inline = len(latex) < 30
+            if is_inline:
+                marked_text = f' MATHSTARTINLINE\\({latex}\\)MATHENDINLINE '
+            else:
+                marked_text = f' MATHSTARTDISPLAY\\[{latex}\\]MATHENDDISPLAY '
+            
+            parent = eq_node.getparent()
+            
+            if parent is not None:
+                parent_tag = parent.tag.split('}')[-1] if '}' in parent.tag else parent.tag
                 
-                parent = eq_node.getparent()
+                # Get index before removal
+                eq_index = list(parent).index(eq_node)
                 
-                if parent is not None:
-                    parent_tag = parent.tag.split('}')[-1] if '}' in parent.tag else parent.tag
+                if parent_tag == 'r':
+                    # In a run - create text element properly
+                    # DON'T use fromstring, use Element
+                    t = etree.Element(w + 't')
+                    t.set(w + 'space', 'preserve')
+                    t.text = marked_text
                     
-                    # Get index before removal
-                    eq_index = list(parent).index(eq_node)
-                    
-                    if parent_tag == 'r':
-                        # In a run - create text element properly
-                        # DON'T use fromstring, use Element
-                        t = etree.Element(W_NS + 't')
-                        t.set(W_NS + 'space', 'preserve')
-                        t.text = marked_text
-                        
-                        # Insert and remove
-                        parent.insert(eq_index, t)
-                        parent.remove(eq_node)
-                        
-                    else:
-                        # In paragraph - create run with text
-                        # DON'T use fromstring, use Element
-                        r = etree.Element(W_NS + 'r')
-                        t = etree.SubElement(r, W_NS + 't')
-                        t.set(W_NS + 'space', 'preserve')
-                        t.text = marked_text
-                        
-                        # Insert and remove
-                        parent.insert(eq_index, r)
-                        parent.remove(eq_node)
+                    # Insert and remove
+                    parent.insert(eq_index, t)
+                    parent.remove(eq_node)
                     
-                    equations_replaced += 1
-                    print(f"  Replaced equation {i+1}: {latex[:30]}...")
+                else:
+                    # In paragraph - create run with text
+                    # DON'T use fromstring, use Element
+                    r = etree.Element(w + 'r')
+                    t = etree.SubElement(r, w + 't')
+                    t.set(w + 'space', 'preserve')
+                    t.text = marked_text
                     
-            except Exception as e:
-                print(f"Error replacing equation {i+1}: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        print(f"✓ Replaced {equations_replaced} equations")
-        return root
+                    # Insert and remove
+                    parent.insert(eq_index, r)
+                    parent.remove(eq_node)
+                
+                print(f"  Replaced equation {i+1}: {latex[:30]}...")
+                return True
+                
+        except Exception as e:
+            print(f"Error replacing equation {i+1}: {e}")
+            import traceback
+            traceback.print_exc()
+        return False
 
     # ALTERNATIVE: If above doesn't work, try this even simpler version
     def _replace_equations_in_xml_simplest(self, root, equations):
         """Simplest possible approach - just clear oMath content and add text"""
         
-        ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+        ns = NAMESPACES
         
-        all_equations = root.xpath('//m:oMath', namespaces=ns)
+        all_equations = FIND_ALL_EQUATIONS(root)
         print(f"Found {len(all_equations)} equations to replace")
         
         for i, eq_node in enumerate(all_equations):
@@ -397,11 +468,10 @@ class ZipEquationReplacer:
     def _replace_equations_in_xml_old(self, root, equations):
         """Replace equations in XML - handles all equation types"""
         
-        ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-              'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+        ns = NAMESPACES
         
         # Get all equations at once (they won't change as we process)
-        all_equations = root.xpath('//m:oMath', namespaces=ns)
+        all_equations = FIND_ALL_EQUATIONS(root)
         
         if len(all_equations) != len(equations):
             print(f"⚠ WARNING: Found {len(all_equations)} equations but have {len(equations)} replacements")
@@ -489,14 +559,13 @@ class ZipEquationReplacer:
         results = []
         
         try:
-            ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math'}
-            equations = xml_root.xpath('//m:oMath', namespaces=ns)
+            equations = FIND_ALL_EQUATIONS(xml_root)
             
             print(f"Found {len(equations)} equations in cleaned XML\n")
             
             for i, eq in enumerate(equations, 1):
                 # Extract text for reference
-                texts = eq.xpath('.//m:t/text()', namespaces=ns)
+                texts = FIND_EQUATION_TEXT(eq)
                 text = ''.join(texts)
                 
                 # Convert to LaTeX using your parser
@@ -525,11 +594,10 @@ class ZipEquationReplacer:
         print("Replacing equations in cleaned XML")
         print(f"{'='*40}\n")
         
-        ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-              'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+        ns = NAMESPACES
         
         # Get all equations at once (they won't change as we process)
-        all_equations = xml_root.xpath('//m:oMath', namespaces=ns)
+        all_equations = FIND_ALL_EQUATIONS(xml_root)
         
         if len(all_equations) != len(equations):
             print(f"⚠ WARNING: Found {len(all_equations)} equations but have {len(equations)} replacements")
@@ -612,23 +680,14 @@ class ZipEquationReplacer:
         
         print(f"\nCreating output document...")
         
-        # Create a new ZIP file with modified document.xml
-        with zipfile.ZipFile(input_path, 'r') as zip_in:
-            with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_out:
-                # Copy all files from input ZIP
-                for item in zip_in.infolist():
-                    if item.filename == 'word/document.xml':
-                        # Write our modified XML
-                        modified_content = etree.tostring(
-                            modified_xml, 
-                            encoding='UTF-8', 
-                            xml_declaration=True,
-                            pretty_print=False
-                        )
-                        zip_out.writestr(item, modified_content)
-                    else:
-                        # Copy all other files as-is
-                        zip_out.writestr(item, zip_in.read(item.filename))
+        # Create a new ZIP file with modified document.xml, other parts copied without recompression
+        modified_content = etree.tostring(
+            modified_xml, 
+            encoding='UTF-8', 
+            xml_declaration=True,
+            pretty_print=False
+        )
+        rewrite_docx(input_path, output_path, {'word/document.xml': modified_content})
         
         print(f"✓ Output document created")
 
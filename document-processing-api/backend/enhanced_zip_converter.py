@@ -17,10 +17,14 @@ This achieves 100% conversion like Word COM, but without requiring Word!
 import sys
 import io
 import zipfile
-import shutil
 from pathlib import Path
 from lxml import etree
 from datetime import datetime
+from doc_processor.docx_package import DocxPackage
+from doc_processor.ooxml import (
+    NAMESPACES, XML_PARSER, FIND_ALL_EQUATIONS, FIND_EQUATION_PARA, FIND_EQUATION_TEXT_ELEMENTS, FIND_EQUATIONS,
+    IN_MC_CHOICE, IN_MC_FALLBACK, IN_TEXTBOX_CONTENT, IN_VML_TEXTBOX, IN_WPS_TEXTBOX,
+)
 
 # Set UTF-8 encoding for stdout only if not already wrapped
 if not isinstance(sys.stdout, io.TextIOWrapper) or sys.stdout.encoding != 'utf-8':
@@ -30,6 +34,10 @@ if not isinstance(sys.stdout, io.TextIOWrapper) or sys.stdout.encoding != 'utf-8
         pass
 
 
+# Equation locations, in the order they are replaced
+EQUATION_CATEGORIES = ('main_body', 'mc_choice', 'mc_fallback', 'vml', 'textbox')
+
+
 class EnhancedZipConverter:
     """Enhanced ZIP converter that handles ALL equation types"""
 
@@ -41,16 +49,7 @@ class EnhancedZipConverter:
         self.display_prefix = display_prefix
         self.display_suffix = display_suffix
 
-        self.namespaces = {
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-            'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-            'v': 'urn:schemas-microsoft-com:vml',
-            'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006',
-            'wps': 'http://schemas.microsoft.com/office/word/2010/wordprocessingShape',
-            'wpg': 'http://schemas.microsoft.com/office/word/2010/wordprocessingGroup',
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-        }
+        self.namespaces = NAMESPACES
 
         # Import LaTeX converter
         try:
@@ -68,11 +67,18 @@ class EnhancedZipConverter:
     def _extract_equation_text(self, omml_element):
         """Extract text content from OMML equation"""
         texts = []
-        for text_elem in omml_element.xpath('.//m:t', namespaces=self.namespaces):
+        for text_elem in FIND_EQUATION_TEXT_ELEMENTS(omml_element):
             if text_elem.text:
                 texts.append(text_elem.text)
         return ''.join(texts)
 
+    def flush_equation_cache(self):
+        """Save new equations to the persistent cache; returns the memo hits/misses (None without a converter)"""
+        if not self.latex_converter:
+            return None
+        self.latex_converter.memo.flush()
+        return self.latex_converter.memo.summary()
+
     def _convert_to_latex(self, omml_element):
         """Convert OMML element to LaTeX"""
         if self.latex_converter:
@@ -118,11 +124,11 @@ class EnhancedZipConverter:
         """Determine where an equation is located"""
 
         # Check ancestors
-        is_in_choice = bool(eq.xpath('ancestor::mc:Choice', namespaces=self.namespaces))
-        is_in_fallback = bool(eq.xpath('ancestor::mc:Fallback', namespaces=self.namespaces))
-        is_in_vml = bool(eq.xpath('ancestor::v:textbox', namespaces=self.namespaces))
-        is_in_wps = bool(eq.xpath('ancestor::wps:txbx', namespaces=self.namespaces))
-        is_in_txbx = bool(eq.xpath('ancestor::w:txbxContent', namespaces=self.namespaces))
+        is_in_choice = bool(IN_MC_CHOICE(eq))
+        is_in_fallback = bool(IN_MC_FALLBACK(eq))
+        is_in_vml = bool(IN_VML_TEXTBOX(eq))
+        is_in_wps = bool(IN_WPS_TEXTBOX(eq))
+        is_in_txbx = bool(IN_TEXTBOX_CONTENT(eq))
 
         if is_in_choice:
             return 'mc_choice'
@@ -135,6 +141,39 @@ class EnhancedZipConverter:
         else:
             return 'main_body'
 
+    def _categorize(self, equations):
+        """Group equations by location, in document order within each group"""
+        categories = {category: [] for category in EQUATION_CATEGORIES}
+        for eq in equations:
+            categories[self._get_equation_location(eq)].append(eq)
+        return categories
+
+    def convert_element(self, element):
+        """
+        Convert the equations inside one element in place
+
+        Used by the streaming HTML conversion, which sees document.xml one
+        body element at a time. Same order as convert_package, without the
+        report. Returns (replaced, failed).
+        """
+        equations = FIND_EQUATIONS(element)
+        if not equations:
+            return 0, 0
+
+        replaced = failed = 0
+        categories = self._categorize(equations)
+        for category in EQUATION_CATEGORIES:
+            for eq in reversed(categories[category]):
+                try:
+                    if self._replace_equation(eq, self._convert_to_latex(eq)):
+                        replaced += 1
+                    else:
+                        failed += 1
+                except Exception as e:
+                    print(f"      Error: {e}")
+                    failed += 1
+        return replaced, failed
+
     def _replace_equation(self, eq, latex_text):
         """Replace a single equation with LaTeX text run"""
 
@@ -147,7 +186,7 @@ class EnhancedZipConverter:
         # Determine if display or inline based on DOCUMENT STRUCTURE (not length!)
         # Display equation: m:oMath is wrapped in m:oMathPara (block-level math)
         # Inline equation: m:oMath is directly in w:r or w:p (inline math)
-        omath_para = eq.xpath('ancestor::m:oMathPara', namespaces=self.namespaces)
+        omath_para = FIND_EQUATION_PARA(eq)
         is_display = len(omath_para) > 0
 
         # Create replacement
@@ -169,13 +208,16 @@ class EnhancedZipConverter:
             print(f"    Error replacing: {e}")
             return False
 
-    def process_document(self, input_path, output_path=None):
+    def process_document(self, input_path, output_path=None, package=None, stream=False):
         """
         Process document and convert ALL equations
 
         Args:
             input_path: Path to input .docx file
             output_path: Path for output file (optional)
+            package: DocxPackage of input_path already opened by the caller (optional)
+            stream: rewrite document.xml block by block while writing the output
+                (bounded memory for very large documents)
 
         Returns:
             dict with conversion results
@@ -196,39 +238,79 @@ class EnhancedZipConverter:
         print(f"Output: {output_path}")
         print("="*70)
 
-        # Create temp directory
-        temp_dir = Path(f"temp_zip_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-
+        owned = package is None
         try:
-            # Extract docx
-            print("\n[1] Extracting document...")
-            with zipfile.ZipFile(input_path, 'r') as z:
-                z.extractall(temp_dir)
+            if owned:
+                package = DocxPackage(input_path)
+
+            if stream:
+                counts = {'replaced': 0, 'failed': 0}
+
+                def convert_block(block):
+                    replaced, failed = self.convert_element(block)
+                    counts['replaced'] += replaced
+                    counts['failed'] += failed
+
+                # Equations are converted while document.xml is written
+                print("\n[1] Converting equations and saving (streaming)...")
+                package.stream_rewrite('word/document.xml', convert_block)
+                package.write(output_path)
+                result = {
+                    'success': True,
+                    'total_equations': counts['replaced'] + counts['failed'],
+                    **counts,
+                    'equation_cache': self.flush_equation_cache()
+                }
+            else:
+                result = self.convert_package(package)
+                if not result['success']:
+                    return result
 
-            # Read document.xml
-            doc_xml_path = temp_dir / "word" / "document.xml"
-            with open(doc_xml_path, 'rb') as f:
-                content = f.read()
+                # Repackage docx
+                print("\n[4] Saving modified document...")
+                package.write(output_path)
+
+            print(f"\nOutput: {output_path}")
+
+            result['output_path'] = str(output_path)
+            return result
+
+        except Exception as e:
+            print(f"\nERROR: {e}")
+            import traceback
+            traceback.print_exc()
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+        finally:
+            if owned and package is not None:
+                package.close()
+
+    def convert_package(self, package):
+        """
+        Convert ALL equations in the package's document.xml tree in place
+
+        The modified tree stays in the package, so a following step using the
+        same package (e.g. HTML conversion) works on it without re-parsing.
+
+        Returns:
+            dict with conversion results (no output_path)
+        """
 
-            root = etree.fromstring(content)
+        try:
+            # Read document.xml
+            print("\n[1] Reading document...")
+            root = package.xml('word/document.xml')
 
             # Find ALL equations
             print("\n[2] Analyzing equations...")
-            all_equations = root.xpath('//m:oMath', namespaces=self.namespaces)
+            all_equations = FIND_ALL_EQUATIONS(root)
             print(f"    Total m:oMath elements: {len(all_equations)}")
 
             # Categorize equations
-            categories = {
-                'main_body': [],
-                'mc_choice': [],
-                'mc_fallback': [],
-                'vml': [],
-                'textbox': []
-            }
-
-            for eq in all_equations:
-                location = self._get_equation_location(eq)
-                categories[location].append(eq)
+            categories = self._categorize(all_equations)
 
             print(f"\n    Equation locations:")
             print(f"      Main body:     {len(categories['main_body'])}")
@@ -253,7 +335,7 @@ class EnhancedZipConverter:
             # Process in order: main_body, mc_choice, mc_fallback, vml, textbox
             # Process in REVERSE order within each category to maintain positions
 
-            for category in ['main_body', 'mc_choice', 'mc_fallback', 'vml', 'textbox']:
+            for category in EQUATION_CATEGORIES:
                 equations = categories[category]
                 if not equations:
                     continue
@@ -276,17 +358,7 @@ class EnhancedZipConverter:
                         print(f"      Error: {e}")
                         failed_count += 1
 
-            # Save modified XML
-            print("\n[4] Saving modified document...")
-            with open(doc_xml_path, 'wb') as f:
-                f.write(etree.tostring(root, encoding='UTF-8', xml_declaration=True))
-
-            # Repackage docx
-            with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as z:
-                for file_path in temp_dir.rglob('*'):
-                    if file_path.is_file():
-                        arcname = str(file_path.relative_to(temp_dir))
-                        z.write(file_path, arcname)
+            package.mark_modified('word/document.xml')
 
             # Results
             print("\n" + "="*70)
@@ -298,31 +370,27 @@ class EnhancedZipConverter:
             print(f"Successfully replaced:  {replaced_count}")
             print(f"Failed:                 {failed_count}")
             print(f"Success rate:           {replaced_count/len(all_equations)*100:.1f}%")
-            print(f"\nOutput: {output_path}")
 
             return {
                 'success': True,
-                'output_path': str(output_path),
                 'total_equations': len(all_equations),
                 'unique_equations': unique_count,
                 'replaced': replaced_count,
-                'failed': failed_count
+                'failed': failed_count,
+                'equation_cache': self.flush_equation_cache()
             }
 
         except Exception as e:
             print(f"\nERROR: {e}")
             import traceback
             traceback.print_exc()
+            # Leave the package as it was for the caller's fallback
+            package.reset('word/document.xml')
             return {
                 'success': False,
                 'error': str(e)
             }
 
-        finally:
-            # Cleanup
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir)
-
 
 def verify_conversion(converted_path):
     """Verify conversion by counting remaining OMML and markers"""
@@ -334,12 +402,10 @@ def verify_conversion(converted_path):
     with zipfile.ZipFile(converted_path, 'r') as z:
         with z.open('word/document.xml') as f:
             content = f.read()
-            root = etree.fromstring(content)
-
-            ns = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math'}
+            root = etree.fromstring(content, XML_PARSER)
 
             # Count remaining OMML
-            remaining = root.xpath('//m:oMath', namespaces=ns)
+            remaining = FIND_ALL_EQUATIONS(root)
 
             # Get all text content
             text_content = etree.tostring(root, encoding='unicode')
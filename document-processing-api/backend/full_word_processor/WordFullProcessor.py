@@ -50,20 +50,24 @@ class WordFullProcessor():
         print(f"Output dir: {context.output_dir}")
         print(f"{'='*60}\n")
         
-        # Step 1: Extract document structure
-        context = self.document_extractor.extract(context)
-        
-        # Step 2: Process footnotes
-        context = self.footnote_handler.process(context)
-        
-        # Step 3: Setup image extraction
-        context = self.image_extractor.setup(context)
-        
-        # Step 4: Convert with mammoth
-        context = self.mammoth_handler.convert(context)
-        
-        # Step 5: Generate final HTML
-        output_file = self.html_generator.generate(context)
+        try:
+            # Step 1: Extract document structure (opens the shared DocxPackage)
+            context = self.document_extractor.extract(context)
+            
+            # Step 2: Process footnotes
+            context = self.footnote_handler.process(context)
+            
+            # Step 3: Setup image extraction
+            context = self.image_extractor.setup(context)
+            
+            # Step 4: Convert with mammoth
+            context = self.mammoth_handler.convert(context)
+            
+            # Step 5: Generate final HTML
+            output_file = self.html_generator.generate(context)
+        finally:
+            if context.package is not None:
+                context.package.close()
         
         print(f"\n{'='*60}")
         print(f"✅ HTML PROCESSING COMPLETE")
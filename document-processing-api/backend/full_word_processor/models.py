@@ -29,4 +29,5 @@ class ProcessingContext:
     footnotes: List[Footnote] = field(default_factory=list)
     images: List[ImageInfo] = field(default_factory=list)
     html_content: str = ""
-    metadata: Dict = field(default_factory=dict)
\ No newline at end of file
+    metadata: Dict = field(default_factory=dict)
+    package: Optional[object] = None  # DocxPackage of working_doc shared by the steps
\ No newline at end of file
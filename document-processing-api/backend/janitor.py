@@ -0,0 +1,174 @@
+"""
+Background cleanup of job directories
+=====================================
+
+Every job creates TEMP_DIR/<job_id> (uploads) and OUTPUT_DIR/<job_id>
+(results), and nothing removed them, so the container disk filled up over
+time. The janitor runs every JANITOR_INTERVAL seconds and:
+
+1. expires jobs not updated for CLEANUP_AFTER_HOURS (reason "ttl")
+2. removes directories that belong to no known job once they are older than
+   the TTL (crashed uploads, jobs from a previous in-memory store) and
+   abandoned result-cache staging dirs
+3. if the job directories together exceed DISK_QUOTA_BYTES, expires the
+   oldest finished jobs first until they fit (reason "quota")
+
+An expired job keeps a small record in the job store (status "expired" and
+an "eviction" entry with the reason and time) so /api/status can say so
+instead of returning 404. The record itself is deleted after
+EXPIRED_JOB_RETENTION_HOURS.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Jobs the quota may evict (queued/processing jobs are never touched by the quota)
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def dir_size(path: Path) -> int:
+    """Total size of the files below path (0 if it does not exist)"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class Janitor:
+    """Periodically expires old jobs and keeps job directories under a disk quota"""
+
+    def __init__(self, job_store, temp_dir=None, output_dir=None, on_expired=None,
+                 ttl_hours=None, quota_bytes=None, interval=None):
+        self.job_store = job_store
+        self.temp_dir = Path(temp_dir or Config.TEMP_DIR)
+        self.output_dir = Path(output_dir or Config.OUTPUT_DIR)
+        self.on_expired = on_expired  # on_expired(job_id, reason), called on the event loop
+        self.ttl = (Config.CLEANUP_AFTER_HOURS if ttl_hours is None else ttl_hours) * 3600
+        self.quota_bytes = Config.DISK_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.interval = Config.JANITOR_INTERVAL if interval is None else interval
+        self._task = None
+        self.stats = {"runs": 0, "expired_ttl": 0, "expired_quota": 0, "orphans_removed": 0,
+                      "records_deleted": 0, "last_run": None}
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                expired = await asyncio.to_thread(self.sweep)
+                if self.on_expired:
+                    for job_id, reason in expired:
+                        self.on_expired(job_id, reason)
+            except Exception as e:
+                logger.exception(f"Janitor sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _job_dirs(self, job_id):
+        return self.temp_dir / job_id, self.output_dir / job_id
+
+    def expire(self, job_id: str, reason: str):
+        """Delete a job's directories and leave an 'expired' record behind"""
+        for path in self._job_dirs(job_id):
+            shutil.rmtree(path, ignore_errors=True)
+        self.job_store.update(
+            job_id,
+            status="expired",
+            results=[],
+            eviction={"reason": reason, "evicted_at": time.time()}
+        )
+        self.stats[f"expired_{reason}"] += 1
+        logger.info(f"Janitor expired job {job_id} ({reason})")
+
+    def sweep(self):
+        """One cleanup pass; returns [(job_id, reason)] for the jobs expired"""
+        now = time.time()
+        expired = []
+        live = {}
+
+        # 1. TTL, and removal of old expired records
+        for job in self.job_store.list_jobs():
+            job_id = job["job_id"]
+            if job["status"] == "expired":
+                evicted_at = job.get("eviction", {}).get("evicted_at", job["updated_at"])
+                if now - evicted_at > Config.EXPIRED_JOB_RETENTION_HOURS * 3600:
+                    self.job_store.delete(job_id)
+                    self.stats["records_deleted"] += 1
+                continue
+            if now - job["updated_at"] > self.ttl:
+                self.expire(job_id, "ttl")
+                expired.append((job_id, "ttl"))
+                continue
+            live[job_id] = job
+
+        # 2. Orphaned directories (no job record) older than the TTL
+        for root in (self.temp_dir, self.output_dir):
+            if not root.exists():
+                continue
+            for path in root.iterdir():
+                if path.name in live or not path.is_dir():
+                    continue
+                try:
+                    if now - path.stat().st_mtime > self.ttl:
+                        shutil.rmtree(path, ignore_errors=True)
+                        self.stats["orphans_removed"] += 1
+                except OSError:
+                    pass
+
+        staging = Config.RESULT_CACHE_DIR / "staging"
+        if staging.exists():
+            for path in staging.iterdir():
+                try:
+                    if now - path.stat().st_mtime > self.ttl:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+
+        # 3. Disk quota: oldest finished jobs go first
+        if self.quota_bytes > 0:
+            total = dir_size(self.temp_dir) + dir_size(self.output_dir)
+            if total > self.quota_bytes:
+                finished = sorted(
+                    (job for job in live.values() if job["status"] in FINISHED_STATUSES),
+                    key=lambda job: job["updated_at"]
+                )
+                for job in finished:
+                    if total <= self.quota_bytes:
+                        break
+                    size = sum(dir_size(path) for path in self._job_dirs(job["job_id"]))
+                    self.expire(job["job_id"], "quota")
+                    expired.append((job["job_id"], "quota"))
+                    total -= size
+                if total > self.quota_bytes:
+                    logger.warning(f"Job directories use {total} bytes, over the {self.quota_bytes} byte quota")
+
+        self.stats["runs"] += 1
+        self.stats["last_run"] = now
+        return expired
+
+    def info(self):
+        """Janitor summary for the health endpoint"""
+        return {
+            "ttl_hours": self.ttl / 3600,
+            "quota_bytes": self.quota_bytes,
+            "interval": self.interval,
+            **self.stats
+        }
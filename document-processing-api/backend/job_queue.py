@@ -0,0 +1,113 @@
+"""
+Bounded job queue with admission control
+=========================================
+
+/api/process used to start every upload immediately as a BackgroundTask, so
+a burst of uploads ran all jobs at once and the 1 GiB Cloud Run instance was
+OOM-killed. JobQueue runs at most MAX_RUNNING_JOBS jobs at a time and keeps
+up to MAX_QUEUED_JOBS waiting in FIFO order. When the queue is full, submit()
+raises QueueFull with a Retry-After estimate and the API answers 429.
+
+The queue is per process (each uvicorn worker admits its own jobs).
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when no more jobs can be admitted"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """FIFO queue that runs a bounded number of job coroutines concurrently"""
+
+    def __init__(self, max_queued=None, max_running=None, on_start=None, on_position=None):
+        self.max_queued = Config.MAX_QUEUED_JOBS if max_queued is None else max_queued
+        self.max_running = max(1, Config.MAX_RUNNING_JOBS if max_running is None else max_running)
+        self.on_start = on_start          # on_start(job_id) when a job leaves the queue
+        self.on_position = on_position    # on_position(job_id, position) when a waiting job moves up
+        self._waiting = deque()           # (job_id, func, args)
+        self._running = {}                # job_id -> asyncio.Task
+        self._avg_duration = None         # Moving average of job run time (seconds)
+        self.stats = {"admitted": 0, "rejected": 0, "finished": 0}
+
+    def is_full(self) -> bool:
+        return len(self._waiting) >= self.max_queued and len(self._running) >= self.max_running
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up"""
+        if self._avg_duration is None:
+            return Config.QUEUE_RETRY_AFTER
+        waves = (len(self._waiting) + 1) / self.max_running
+        return min(300, max(1, math.ceil(self._avg_duration * waves)))
+
+    def submit(self, job_id: str, func, *args) -> int:
+        """
+        Queue func(*args) (a coroutine function) for job_id
+
+        Returns the queue position (0 = started immediately). Raises QueueFull.
+        """
+        if self.is_full():
+            self.stats["rejected"] += 1
+            raise QueueFull(self.retry_after())
+
+        self.stats["admitted"] += 1
+        self._waiting.append((job_id, func, args))
+        self._dispatch()
+        return self.position(job_id) or 0
+
+    def position(self, job_id: str):
+        """1-based position of a waiting job, or None if it is not waiting here"""
+        for index, (waiting_id, _, _) in enumerate(self._waiting):
+            if waiting_id == job_id:
+                return index + 1
+        return None
+
+    def _dispatch(self):
+        started = False
+        while self._waiting and len(self._running) < self.max_running:
+            job_id, func, args = self._waiting.popleft()
+            self._running[job_id] = asyncio.create_task(self._run(job_id, func, args))
+            started = True
+            if self.on_start:
+                self.on_start(job_id)
+
+        if started and self.on_position:
+            for index, (job_id, _, _) in enumerate(self._waiting):
+                self.on_position(job_id, index + 1)
+
+    async def _run(self, job_id, func, args):
+        started = time.monotonic()
+        try:
+            await func(*args)
+        except Exception as e:
+            logger.exception(f"Queued job {job_id} raised: {e}")
+        finally:
+            duration = time.monotonic() - started
+            self._avg_duration = (duration if self._avg_duration is None
+                                  else 0.8 * self._avg_duration + 0.2 * duration)
+            self._running.pop(job_id, None)
+            self.stats["finished"] += 1
+            self._dispatch()
+
+    def info(self):
+        """Queue summary for the health endpoint"""
+        return {
+            "queued": len(self._waiting),
+            "running": len(self._running),
+            "max_queued": self.max_queued,
+            "max_running": self.max_running,
+            **self.stats
+        }
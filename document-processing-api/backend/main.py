@@ -2,17 +2,30 @@
 FIXED main.py - Works with your existing WordCOMEquationReplacer
 """
 
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+import aiofiles
+import asyncio
+import hashlib
+import json
+import shutil
 import uuid
 from pathlib import Path
 from typing import List
-import zipfile
 import logging
 import sys
 import os
+from core.config import Config
+from core.job_events import JobEventHub
+from core.job_store import create_job_store
+from core.result_cache import ResultCache
+from core.equation_store import shared_equation_store
+from core.zip_stream import directory_members, directory_size, stream_zip
+from janitor import Janitor
+from job_queue import JobQueue, QueueFull
+from worker_pool import HTML_PROCESSORS, ConversionPool, build_conversion_config, convert_file
 #from doc_processor.main_word_com_equation_replacer import WordCOMEquationReplacer
 
 # Global flag to switch between Word COM and ZIP approaches
@@ -42,14 +55,6 @@ logger.info(f"========================================")
 
 app = FastAPI(title="Document Processing API")
 
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Fix paths - use absolute paths to avoid confusion
 BASE_DIR = Path(__file__).parent.absolute()
 TEMP_DIR = BASE_DIR / "temp"
@@ -63,45 +68,141 @@ logger.info(f"Base directory: {BASE_DIR}")
 logger.info(f"Temp directory: {TEMP_DIR}")
 logger.info(f"Output directory: {OUTPUT_DIR}")
 
-# In-memory job tracking
-jobs = {}
+# Job tracking - shared store so any worker/instance can answer status and download calls
+job_store = create_job_store()
+logger.info(f"Job store: {type(job_store).__name__}")
 
-@app.post("/api/process")
-async def process_documents(
-    background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(...),
-    processor_type: str = Form("word_to_html"),
-    conversion_config: str = Form(None)  # JSON string with conversion settings
-):
-    """Process documents with specified processor"""
-    job_id = str(uuid.uuid4())
+# Wakes SSE/WebSocket/long-poll clients when a job changes
+job_events = JobEventHub(job_store)
+
+# Process pool for CPU-bound conversions (keeps the event loop free for API calls)
+conversion_pool = ConversionPool()
+
+# Previously converted documents (same bytes + same options) are served from here
+result_cache = ResultCache()
+equation_store = shared_equation_store()
+
+def record_event(job_id: str, event_type: str, data: dict = None):
+    """Append a progress event to the job log and wake its listeners"""
+    job_store.add_event(job_id, event_type, data)
+    job_events.notify(job_id)
+
+def mark_job_started(job_id: str):
+    job_store.update(job_id, status="processing")
+    record_event(job_id, "started", {"status": "processing"})
 
-    # Parse conversion config if provided
+# Admission control: bounded number of running and waiting jobs (429 when full)
+job_queue = JobQueue(
+    on_start=mark_job_started,
+    on_position=lambda job_id, position: record_event(job_id, "queued", {"status": "queued", "queue_position": position})
+)
+
+# Expires old jobs and keeps the temp/output dirs under the disk quota
+janitor = Janitor(
+    job_store,
+    temp_dir=TEMP_DIR,
+    output_dir=OUTPUT_DIR,
+    on_expired=lambda job_id, reason: record_event(job_id, "expired", {"status": "expired", "reason": reason})
+)
+
+def queue_full_exception() -> HTTPException:
+    retry_after = job_queue.retry_after()
+    return HTTPException(
+        status_code=429,
+        detail=f"Server is busy, retry in {retry_after} seconds",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+@app.on_event("startup")
+async def start_worker_pool():
+    loop = asyncio.get_running_loop()
+    # Stage events arrive on the pool's listener thread; record them on the event loop
+    conversion_pool.on_progress = lambda job_id, index, stage: loop.call_soon_threadsafe(
+        record_event, job_id, "stage", {"file": index, "stage": stage}
+    )
+    conversion_pool.start()
+    janitor.start()
+
+@app.on_event("shutdown")
+async def stop_worker_pool():
+    janitor.stop()
+    conversion_pool.shutdown()
+
+class UploadTooLarge(Exception):
+    pass
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Fail fast (before the body is read) on oversized uploads and when the job queue is full"""
+    if request.method == "POST" and request.url.path in ("/api/process", "/api/convert"):
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > Config.MAX_REQUEST_SIZE:
+            logger.warning(f"Rejected upload: Content-Length {content_length} > {Config.MAX_REQUEST_SIZE}")
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+        if job_queue.is_full():
+            logger.warning("Rejected upload: job queue is full")
+            exc = queue_full_exception()
+            return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
+    return await call_next(request)
+
+# Enable CORS (added last so it also wraps the responses of the middleware above)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Job-Id"],
+)
+
+async def save_upload(upload: UploadFile, dest: Path):
+    """
+    Copy an upload to dest in fixed-size chunks with non-blocking writes
+
+    Returns (size, sha256 hex). Raises HTTPException 413 as soon as the file
+    exceeds Config.MAX_FILE_SIZE; the partial file is removed.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(dest, "wb") as out:
+            while True:
+                chunk = await upload.read(Config.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > Config.MAX_FILE_SIZE:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                await out.write(chunk)
+    except UploadTooLarge:
+        dest.unlink(missing_ok=True)
+        logger.warning(f"Rejected {upload.filename}: larger than {Config.MAX_FILE_SIZE} bytes")
+        raise HTTPException(
+            status_code=413,
+            detail=f"{upload.filename} exceeds the {Config.get_file_size_mb(Config.MAX_FILE_SIZE):.0f} MB limit"
+        )
+    finally:
+        await upload.close()
+    return size, digest.hexdigest()
+
+def parse_conversion_config(conversion_config: str) -> dict:
+    """Parse the conversion_config form field (JSON); invalid input means defaults"""
     config_dict = {}
     if conversion_config:
         try:
-            import json
             config_dict = json.loads(conversion_config)
             logger.info(f"Conversion config received: {config_dict}")
         except Exception as e:
             logger.warning(f"Failed to parse conversion_config: {e}")
+    return config_dict
 
-    logger.info(f"=== NEW JOB {job_id} ===")
-    logger.info(f"Processing {len(files)} files with {processor_type}")
-    logger.info(f"Using {'ZIP' if USE_ZIP_APPROACH else 'Word COM'} approach for equations")
-
-    # Initialize job
-    jobs[job_id] = {
-        "status": "processing",
-        "total": len(files),
-        "completed": 0,
-        "results": [],
-        "processor": processor_type,
-        "equation_approach": "ZIP" if USE_ZIP_APPROACH else "Word COM",
-        "conversion_config": config_dict  # Store config for background task
-    }
+async def save_job_uploads(job_id: str, files: List[UploadFile]):
+    """
+    Create the job directories and stream the uploads into the temp dir
 
-    # Create job directories
+    Returns (job_temp_dir, job_output_dir, file_paths, file_infos). On a
+    rejected upload both directories are removed and the HTTPException re-raised.
+    """
     job_temp_dir = TEMP_DIR / job_id
     job_output_dir = OUTPUT_DIR / job_id
     job_temp_dir.mkdir(parents=True, exist_ok=True)
@@ -110,59 +211,334 @@ async def process_documents(
     logger.info(f"Job temp dir: {job_temp_dir}")
     logger.info(f"Job output dir: {job_output_dir}")
 
-    # Save uploaded files
+    # Stream uploaded files to disk (bounded memory, size limit enforced per chunk)
     file_paths = []
-    for file in files:
-        file_path = job_temp_dir / file.filename
-        content = await file.read()
-        file_path.write_bytes(content)
-        file_paths.append(file_path)
-        logger.info(f"Saved uploaded file: {file_path}")
-
-    # Process in background
-    background_tasks.add_task(
-        process_job,
-        job_id,
-        file_paths,
-        processor_type,
-        job_output_dir,
-        config_dict  # Pass config to background task
-    )
+    file_infos = []
+    try:
+        for file in files:
+            file_path = job_temp_dir / Path(file.filename).name
+            size, sha256 = await save_upload(file, file_path)
+            file_paths.append(file_path)
+            file_infos.append({"filename": file_path.name, "size": size, "sha256": sha256})
+            logger.info(f"Saved uploaded file: {file_path} ({size} bytes, sha256={sha256[:12]})")
+    except HTTPException:
+        shutil.rmtree(job_temp_dir, ignore_errors=True)
+        shutil.rmtree(job_output_dir, ignore_errors=True)
+        raise
+
+    return job_temp_dir, job_output_dir, file_paths, file_infos
+
+def create_job_record(job_id: str, status: str, file_infos: list, processor_type: str, config_dict: dict):
+    job_store.create(job_id, {
+        "status": status,
+        "total": len(file_infos),
+        "completed": 0,
+        "results": [],
+        "files": file_infos,
+        "processor": processor_type,
+        "equation_approach": "ZIP" if USE_ZIP_APPROACH else "Word COM",
+        "conversion_config": config_dict  # Store config for background task
+    })
+
+def enqueue_job(job_id: str, file_paths: List[Path], processor_type: str, output_dir: Path, config_dict: dict) -> int:
+    """Hand a created job to the job queue; returns its queue position (0 = started)"""
+    try:
+        return job_queue.submit(
+            job_id,
+            process_job,
+            job_id,
+            file_paths,
+            processor_type,
+            output_dir,
+            config_dict  # Pass config to background task
+        )
+    except QueueFull:
+        job_store.delete(job_id)
+        shutil.rmtree(TEMP_DIR / job_id, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise queue_full_exception()
+
+@app.post("/api/process")
+async def process_documents(
+    files: List[UploadFile] = File(...),
+    processor_type: str = Form("word_to_html"),
+    conversion_config: str = Form(None)  # JSON string with conversion settings
+):
+    """Process documents with specified processor"""
+    job_id = str(uuid.uuid4())
+    config_dict = parse_conversion_config(conversion_config)
+
+    logger.info(f"=== NEW JOB {job_id} ===")
+    logger.info(f"Processing {len(files)} files with {processor_type}")
+    logger.info(f"Using {'ZIP' if USE_ZIP_APPROACH else 'Word COM'} approach for equations")
+
+    if len(files) > Config.MAX_FILES_PER_REQUEST:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files ({len(files)}), maximum is {Config.MAX_FILES_PER_REQUEST}"
+        )
+    if job_queue.is_full():
+        raise queue_full_exception()
+
+    _, job_output_dir, file_paths, file_infos = await save_job_uploads(job_id, files)
+
+    # Initialize job (queued until the job queue starts it), then process in background once a running slot is free
+    create_job_record(job_id, "queued", file_infos, processor_type, config_dict)
+    position = enqueue_job(job_id, file_paths, processor_type, job_output_dir, config_dict)
 
     return {
         "job_id": job_id,
-        "status": "processing",
+        "status": "queued" if position else "processing",
+        "queue_position": position or None,
         "message": f"Processing {len(files)} documents",
         "equation_approach": "ZIP" if USE_ZIP_APPROACH else "Word COM"
     }
 
-@app.get("/api/status/{job_id}")
-async def get_status(job_id: str):
-    """Check processing status"""
-    if job_id not in jobs:
-        logger.error(f"Job {job_id} not found")
-        return JSONResponse(status_code=404, content={"error": "Job not found"})
-    
-    job = jobs[job_id]
+def job_accepted_response(job_id: str, reason: str, position: int = 0) -> JSONResponse:
+    """202 for /api/convert requests that continue in the job flow"""
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id,
+        "status": "queued" if position else "processing",
+        "queue_position": position or None,
+        "mode": "job",
+        "reason": reason,
+        "status_url": f"/api/status/{job_id}",
+        "events_url": f"/api/events/{job_id}"
+    })
+
+@app.post("/api/convert")
+async def convert_document(
+    file: UploadFile = File(...),
+    conversion_config: str = Form(None),  # JSON string with conversion settings
+    output: str = Form("body")  # "body" (SharePoint fragment) or "html" (full page)
+):
+    """
+    Convert one small document (word_to_html) and stream the HTML back
+
+    The conversion is admitted by the job queue like any other job and runs
+    in the worker pool. Its body is converted as a stream, and the output
+    file is sent while it is being written; X-Job-Id names the job, so
+    images stay downloadable through /api/download. Documents larger than
+    SYNC_CONVERT_MAX_BYTES, or conversions with no output after
+    SYNC_CONVERT_TIMEOUT seconds, continue as a normal job and the response
+    is 202 with the job id.
+    """
+    if output not in ("body", "html"):
+        raise HTTPException(status_code=400, detail="output must be 'body' or 'html'")
+    if job_queue.is_full():
+        raise queue_full_exception()
+
+    job_id = str(uuid.uuid4())
+    config_dict = parse_conversion_config(conversion_config)
+    logger.info(f"=== SYNC CONVERT {job_id} ===")
+
+    _, job_output_dir, file_paths, file_infos = await save_job_uploads(job_id, [file])
+    file_path = file_paths[0]
+
+    if file_infos[0]["size"] > Config.SYNC_CONVERT_MAX_BYTES:
+        logger.info(f"{file_path.name} is {file_infos[0]['size']} bytes - falling back to the job flow")
+        create_job_record(job_id, "queued", file_infos, "word_to_html", config_dict)
+        position = enqueue_job(job_id, file_paths, "word_to_html", job_output_dir, config_dict)
+        return job_accepted_response(job_id, "size", position)
+
+    config_dict["stream_body"] = True  # Written block by block straight into the job output dir
+    create_job_record(job_id, "queued", file_infos, "word_to_html", config_dict)
+    enqueue_job(job_id, file_paths, "word_to_html", job_output_dir, config_dict)
+
+    name = f"{file_path.stem}_body.txt" if output == "body" else f"{file_path.stem}.html"
+    output_path = job_output_dir / name
+    job = await wait_for_output(job_id, output_path, Config.SYNC_CONVERT_TIMEOUT)
+    if job["status"] not in TERMINAL_EVENTS and not output_path.exists():
+        logger.info(f"Sync conversion {job_id} has no output after {Config.SYNC_CONVERT_TIMEOUT}s - continuing as a job")
+        return job_accepted_response(job_id, "timeout", job_queue.position(job_id) or 0)
+
+    error = job_error(job)
+    if error:
+        raise HTTPException(status_code=422, detail=f"Conversion failed: {error}")
+
+    return StreamingResponse(
+        stream_job_output(job_id, output_path),
+        media_type="text/html",
+        headers={"X-Job-Id": job_id}
+    )
+
+def job_error(job: dict):
+    """First error of a finished job, or None while it runs or if it succeeded"""
+    if job["status"] not in TERMINAL_EVENTS:
+        return None
+    errors = [r["error"] for r in job.get("results", []) if "error" in r]
+    if job["status"] != "completed" or errors:
+        return errors[0] if errors else job.get("error", "Conversion failed")
+    return None
+
+async def wait_for_output(job_id: str, output_path: Path, timeout: float) -> dict:
+    """Wait until the job has written output_path or finished (up to timeout); returns the job record"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        job = job_store.get(job_id)
+        if job["status"] in TERMINAL_EVENTS or output_path.exists():
+            return job
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return job
+        # Stage events wake this early; the file itself is polled
+        await job_events.wait_for_change(job_id, job["version"], min(remaining, Config.SYNC_STREAM_POLL_INTERVAL))
+
+async def stream_job_output(job_id: str, output_path: Path):
+    """
+    Yield an output file while the job is writing it, until the job finished and it is read to the end
+
+    A job that fails after the response started aborts the stream, so the
+    client sees a broken response rather than truncated HTML.
+    """
+    finished = None
+    async with aiofiles.open(output_path, "rb") as f:
+        while True:
+            chunk = await f.read(Config.ZIP_STREAM_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            if finished is not None:
+                break
+
+            job = job_store.get(job_id)
+            if job["status"] in TERMINAL_EVENTS:
+                finished = job  # The file is complete: send what was written since the last read
+            else:
+                await job_events.wait_for_change(job_id, job["version"], Config.SYNC_STREAM_POLL_INTERVAL)
+
+    error = job_error(finished)
+    if error:
+        logger.error(f"Sync conversion {job_id} failed while streaming: {error}")
+        raise RuntimeError(f"Conversion failed: {error}")
+
+def job_status_payload(job_id: str, job: dict) -> dict:
+    """Status response body shared by /api/status and the push channels"""
     return {
         "job_id": job_id,
         "status": job["status"],
         "progress": f"{job['completed']}/{job['total']}",
         "processor": job["processor"],
         "equation_approach": job.get("equation_approach", "unknown"),
-        "results": job.get("results", [])
+        "results": job.get("results", []),
+        "version": job["version"],
+        "queue_position": job_queue.position(job_id) if job["status"] == "queued" else None,
+        "eviction": job.get("eviction"),
+        "package_stats": job.get("package_stats")
     }
 
+def raise_if_expired(job: dict):
+    """410 for jobs whose files were removed by the janitor"""
+    if job["status"] == "expired":
+        reason = job.get("eviction", {}).get("reason", "ttl")
+        raise HTTPException(status_code=410, detail=f"Job results expired ({reason})")
+
+@app.get("/api/status/{job_id}")
+async def get_status(job_id: str, version: int = None, wait: float = 0):
+    """
+    Check processing status
+
+    Long-poll: with ?version=N&wait=S the request blocks (up to S seconds,
+    capped at LONG_POLL_MAX_WAIT) until the job's version differs from N.
+    """
+    if version is not None and wait > 0:
+        await job_events.wait_for_change(job_id, version, min(wait, Config.LONG_POLL_MAX_WAIT))
+
+    job = job_store.get(job_id)
+    if job is None:
+        logger.error(f"Job {job_id} not found")
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    
+    return job_status_payload(job_id, job)
+
+TERMINAL_EVENTS = ("completed", "failed", "expired")
+
+async def iter_job_events(job_id: str, after_id: int = 0):
+    """
+    Yield the job's events after after_id as they happen, then stop after the
+    terminal event. Yields None as a heartbeat when nothing happened for
+    SSE_HEARTBEAT_INTERVAL seconds.
+    """
+    while True:
+        version = job_store.get_version(job_id)
+        if version is None:
+            return
+
+        for event in job_store.get_events(job_id, after_id):
+            after_id = event["id"]
+            yield event
+            if event["type"] in TERMINAL_EVENTS:
+                return
+
+        new_version = await job_events.wait_for_change(job_id, version, Config.SSE_HEARTBEAT_INTERVAL)
+        if new_version == version:
+            yield None
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event.get("id"):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.get("/api/events/{job_id}")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-sent events for a job: a 'status' snapshot, then 'stage'
+    (extract/equations/body/html/zip), 'file' and finally 'completed' or
+    'failed'. Reconnecting clients resume from Last-Event-ID.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    last_event_id = request.headers.get("last-event-id", "")
+    after_id = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def event_stream():
+        yield format_sse({"type": "status", "data": job_status_payload(job_id, job)})
+        if job["status"] in TERMINAL_EVENTS:
+            return
+        async for event in iter_job_events(job_id, after_id):
+            yield format_sse(event) if event else ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/ws/{job_id}")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket variant of /api/events: one JSON message per event"""
+    await websocket.accept()
+    job = job_store.get(job_id)
+    if job is None:
+        await websocket.close(code=4404, reason="Job not found")
+        return
+
+    try:
+        await websocket.send_json({"type": "status", "data": job_status_payload(job_id, job)})
+        if job["status"] not in TERMINAL_EVENTS:
+            async for event in iter_job_events(job_id):
+                await websocket.send_json(event or {"type": "heartbeat"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket client for job {job_id} disconnected")
+
 @app.get("/api/download/{job_id}")
 async def download_all_results(job_id: str):
     """Download all processed results as ZIP or single file"""
     logger.info(f"Download all request for job {job_id}")
     
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         logger.error(f"Job {job_id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
+    raise_if_expired(job)
     
-    job = jobs[job_id]
     if job["status"] != "completed":
         logger.error(f"Job {job_id} not completed yet")
         raise HTTPException(status_code=400, detail="Job not completed")
@@ -175,14 +551,8 @@ async def download_all_results(job_id: str):
         raise HTTPException(status_code=404, detail="No successful results")
     
     if len(results) == 1 and results[0].get("type") == "application/zip":
-        # Direct ZIP download
-        file_path = Path(results[0]["path"])
-        logger.info(f"Serving ZIP file: {file_path}")
-        return FileResponse(
-            path=str(file_path),
-            filename=results[0]["output_filename"],
-            media_type="application/zip"
-        )
+        # Whole output directory, zipped while streaming
+        return archive_response(results[0])
 
     if len(successful_results) == 1:
         # Single file - return directly
@@ -198,33 +568,24 @@ async def download_all_results(job_id: str):
             filename=successful_results[0].get("output_filename", successful_results[0]["filename"])
         )
     else:
-        # Multiple files - create ZIP
-        zip_path = OUTPUT_DIR / job_id / f"results_{job_id}.zip"
-        logger.info(f"Creating ZIP: {zip_path}")
-        
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for result in successful_results:
-                file_path = Path(result["path"])
-                if file_path.exists():
-                    output_name = result.get("output_filename", result["filename"])
-                    zipf.write(file_path, output_name)
-                    logger.info(f"Added to ZIP: {output_name}")
-        
-        return FileResponse(
-            path=str(zip_path),
-            filename=f"results_{job_id}.zip"
-        )
+        # Multiple files - stream a ZIP of the result files
+        logger.info(f"Streaming ZIP of {len(successful_results)} results for job {job_id}")
+        members = [
+            (Path(result["path"]), result.get("output_filename", result["filename"]))
+            for result in successful_results
+        ]
+        return zip_response(stream_zip(members), f"results_{job_id}.zip")
 
 @app.get("/api/download/{job_id}/{index}")
 async def download_single_result(job_id: str, index: int):
     """Download a single result file by index"""
     logger.info(f"Download single file request: job={job_id}, index={index}")
     
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         logger.error(f"Job {job_id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    job = jobs[job_id]
+    raise_if_expired(job)
     
     # Filter successful results only
     successful_results = [r for r in job["results"] if "error" not in r]
@@ -239,6 +600,9 @@ async def download_single_result(job_id: str, index: int):
     if not file_path.exists():
         logger.error(f"File not found: {file_path}")
         raise HTTPException(status_code=404, detail=f"File not found")
+
+    if result.get("type") == "application/zip":
+        return archive_response(result)
     
     logger.info(f"Serving file: {file_path}")
 
@@ -253,10 +617,11 @@ async def download_single_result(job_id: str, index: int):
 @app.get("/api/body/{job_id}/{index}")
 async def get_body_content(job_id: str, index: int):
     """Return _body.txt content as plain text for copy-paste"""
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
+    raise_if_expired(job)
 
-    job = jobs[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Job not completed")
 
@@ -276,6 +641,24 @@ async def get_body_content(job_id: str, index: int):
     content = body_file.read_text(encoding="utf-8")
     return PlainTextResponse(content)
 
+def zip_response(chunks, filename: str) -> StreamingResponse:
+    """Send a ZIP generated on the fly (no Content-Length; sync generator runs in the threadpool)"""
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def archive_response(result: dict):
+    """Download response for an archive result (the job output directory)"""
+    path = Path(result["path"])
+    if path.is_file():
+        # Jobs finished before archives were streamed point at a ZIP on disk
+        return FileResponse(path=str(path), filename=result["output_filename"], media_type="application/zip")
+
+    logger.info(f"Streaming ZIP of output dir: {path}")
+    return zip_response(stream_zip(directory_members(path)), result["output_filename"])
+
 def should_zip_output(output_dir):
     """
     Determine if output should be zipped
@@ -294,37 +677,18 @@ def should_zip_output(output_dir):
     print(f"is_zipp_output = {is_zipp_output}")
     return is_zipp_output
 
-def create_zip_output(output_dir, job_id):
-    """
-    Create a zip file of the output directory
-    """
-    output_path = Path(output_dir)
-    zip_filename = f"{job_id}_output.zip"
-    zip_path = output_path / zip_filename
-    
-    print(f"\n📦 Creating zip file: {zip_filename}")
-    
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Add all files and folders
-        for item in output_path.iterdir():
-            if item.name != zip_filename:  # Don't include the zip itself
-                if item.is_file():
-                    zipf.write(item, item.name)
-                    print(f"  Added file: {item.name}")
-                elif item.is_dir():
-                    # Add directory and its contents
-                    for root, dirs, files in os.walk(item):
-                        root_path = Path(root)
-                        for file in files:
-                            file_path = root_path / file
-                            arcname = file_path.relative_to(output_path)
-                            zipf.write(file_path, arcname)
-                            print(f"  Added: {arcname}")
-    
-    print(f"✅ Zip created: {zip_path}")
-    return zip_path
-
 async def process_job(job_id: str, file_paths: List[Path], processor_type: str, output_dir: Path, config_dict: dict = None):
+    """Run a job; an unexpected error marks it failed so push clients are not left waiting"""
+    try:
+        await run_job(job_id, file_paths, processor_type, output_dir, config_dict)
+        # Uploads are not needed once the job has completed
+        await asyncio.to_thread(shutil.rmtree, TEMP_DIR / job_id, True)
+    except Exception as e:
+        logger.exception(f"Job {job_id} failed: {e}")
+        job_store.update(job_id, status="failed", error=str(e))
+        record_event(job_id, "failed", {"status": "failed", "error": str(e)})
+
+async def run_job(job_id: str, file_paths: List[Path], processor_type: str, output_dir: Path, config_dict: dict = None):
     """Background job processor with fixed ZIP handling"""
     logger.info(f"Starting background processing for job {job_id}")
     logger.info(f"Output directory: {output_dir}")
@@ -332,123 +696,93 @@ async def process_job(job_id: str, file_paths: List[Path], processor_type: str,
     logger.info(f"Conversion config: {config_dict}")
     logger.info(f"DEBUG output_format in config: {config_dict.get('output_format', 'NOT FOUND') if config_dict else 'NO CONFIG'}")
 
-    if USE_ZIP_APPROACH:
-        from doc_processor.zip_equation_replacer import ZipEquationReplacer
-    else:
-        from doc_processor.main_word_com_equation_replacer import WordCOMEquationReplacer
-
-    # Temporary list for results
-    temp_results = []
-
-    for i, file_path in enumerate(file_paths):
-        try:
-            logger.info(f"Processing file {i+1}/{len(file_paths)}: {file_path.name}")
-            body_output_path = None
-
-            if processor_type == "word_to_html":
-                # Use new full converter with config
-                from word_to_html_full import FullWordToHTMLConverter, ConversionConfig
-
-                # Create config from dict (defaults: shapes OFF, MathML mode)
-                conv_config = ConversionConfig(
-                    convert_shapes_to_svg=config_dict.get('convert_shapes_to_svg', False) if config_dict else False,
-                    include_images=config_dict.get('include_images', True) if config_dict else True,
-                    inline_prefix=config_dict.get('inline_prefix', '') if config_dict else '',
-                    inline_suffix=config_dict.get('inline_suffix', '') if config_dict else '',
-                    display_prefix=config_dict.get('display_prefix', '') if config_dict else '',
-                    display_suffix=config_dict.get('display_suffix', '') if config_dict else '',
-                    include_mathjax=config_dict.get('include_mathjax', True) if config_dict else True,
-                    rtl_direction=config_dict.get('rtl_direction', True) if config_dict else True,
-                    output_format=config_dict.get('output_format', 'mathml_html') if config_dict else 'mathml_html'
-                )
-
-                converter = FullWordToHTMLConverter(conv_config)
-                result = converter.convert(file_path, output_dir=output_dir)
-
-                if result.get('success'):
-                    output_file = Path(result['output_path'])
-                    body_output_path = result.get('body_output_path')
-                else:
-                    raise Exception(result.get('error', 'Conversion failed'))
-
-            elif processor_type == "latex_equations":
-                logger.info(f"  Using {'ZIP' if USE_ZIP_APPROACH else 'Word COM'} for equation processing")
-
-                if USE_ZIP_APPROACH:
-                    replacer = ZipEquationReplacer()
-                    output_filename = f"{Path(file_path).stem}_latex_equations.docx"
-                    output_path = os.path.join(output_dir, output_filename)
-                    output_file = replacer.process_document(file_path, output_path)
-                else:
-                    replacer = WordCOMEquationReplacer()
-                    output_filename = f"{Path(file_path).stem}_latex_equations.docx"
-                    output_path = os.path.join(output_dir, output_filename)
-                    result = replacer.process_document(file_path, output_path)
-
-                    # For latex_equations, we want WORD ONLY
-                    if isinstance(result, dict):
-                        output_file = result.get('word_path')  # Get WORD path only
-                    else:
-                        output_file = result
-
-                if output_file:
-                    output_file = Path(output_file)
-
-            elif processor_type == "word_complete":
-                logger.info("Processing Word complete conversion with config")
-
-                # Use new full converter with config
-                from word_to_html_full import FullWordToHTMLConverter, ConversionConfig
-
-                # Create config from dict (defaults: shapes OFF, MathML mode)
-                conv_config = ConversionConfig(
-                    convert_shapes_to_svg=config_dict.get('convert_shapes_to_svg', False) if config_dict else False,
-                    include_images=config_dict.get('include_images', True) if config_dict else True,
-                    inline_prefix=config_dict.get('inline_prefix', '') if config_dict else '',
-                    inline_suffix=config_dict.get('inline_suffix', '') if config_dict else '',
-                    display_prefix=config_dict.get('display_prefix', '') if config_dict else '',
-                    display_suffix=config_dict.get('display_suffix', '') if config_dict else '',
-                    include_mathjax=config_dict.get('include_mathjax', True) if config_dict else True,
-                    rtl_direction=config_dict.get('rtl_direction', True) if config_dict else True,
-                    output_format=config_dict.get('output_format', 'mathml_html') if config_dict else 'mathml_html'
-                )
-
-                converter = FullWordToHTMLConverter(conv_config)
-                result = converter.convert(file_path, output_dir=output_dir)
-
-                if result.get('success'):
-                    output_file = Path(result['output_path'])
-                    body_output_path = result.get('body_output_path')
-                else:
-                    raise Exception(result.get('error', 'Conversion failed'))
-
-            else:  # scan_verify
-                output_file = await scan_and_verify(file_path, output_dir)
-            
-            result = {
+    # Results kept in input order; files of one job convert concurrently up to BATCH_SIZE
+    temp_results = [None] * len(file_paths)
+    semaphore = asyncio.Semaphore(max(1, Config.BATCH_SIZE))
+
+    # DOCX bytes read/parsed and parse time over all files of the job (cache hits parse nothing)
+    package_stats = {"bytes_read": 0, "bytes_parsed": 0, "parts_parsed": 0, "parse_seconds": 0.0}
+
+    # Upload hashes for the result cache (HTML conversions only)
+    use_cache = result_cache.enabled and processor_type in HTML_PROCESSORS
+    if use_cache:
+        conversion_config = build_conversion_config(config_dict)
+        job = job_store.get(job_id) or {}
+        file_hashes = {f["filename"]: f["sha256"] for f in job.get("files", [])}
+
+    async def process_file(i: int, file_path: Path):
+        async with semaphore:
+            try:
+                logger.info(f"Processing file {i+1}/{len(file_paths)}: {file_path.name}")
+
+                converted = None
+                cache_key = None
+                if use_cache and file_path.name in file_hashes:
+                    cache_key = result_cache.make_key(file_hashes[file_path.name], file_path.stem, conversion_config)
+                    converted = await asyncio.to_thread(result_cache.restore, cache_key, output_dir)
+                    if converted:
+                        logger.info(f"Result cache hit for {file_path.name} ({cache_key[:12]})")
+                        record_event(job_id, "stage", {"file": i, "stage": "cached"})
+
+                if converted is None:
+                    # CPU-bound conversion runs in the worker pool so the event loop stays responsive
+                    converted = await conversion_pool.run(
+                        convert_file,
+                        processor_type,
+                        file_path,
+                        output_dir,
+                        config_dict,
+                        USE_ZIP_APPROACH,
+                        (job_id, i),
+                        cache_key
+                    )
+                output_file = Path(converted["output_path"])
+                body_output_path = converted.get("body_output_path")
+                for counter, value in (converted.get("package_stats") or {}).items():
+                    package_stats[counter] += value
+
+                result = {
+                    "filename": file_path.name,
+                    "output_filename": output_file.name,
+                    "path": str(output_file),
+                    "index": i,
+                    "success": True
+                }
+                if body_output_path:
+                    result["body_path"] = str(body_output_path)
+                if converted.get("cached"):
+                    result["cached"] = True
+                if converted.get("equation_cache"):
+                    result["equation_cache"] = converted["equation_cache"]
+                if converted.get("stage_timings"):
+                    result["stage_timings"] = {
+                        stage: round(seconds, 4) for stage, seconds in converted["stage_timings"].items()
+                    }
+
+                temp_results[i] = result
+
+                logger.info(f"Successfully processed: {file_path.name}")
+                logger.info(f"  Output: {output_file}")
+
+            except Exception as e:
+                logger.error(f"Failed to process {file_path.name}: {str(e)}")
+                temp_results[i] = {
+                    "filename": file_path.name,
+                    "error": str(e),
+                    "index": i
+                }
+
+            completed = job_store.increment_completed(job_id)
+            record_event(job_id, "file", {
+                "file": i,
                 "filename": file_path.name,
-                "output_filename": output_file.name,
-                "path": str(output_file),
-                "index": i,
-                "success": True
-            }
-            if body_output_path:
-                result["body_path"] = str(body_output_path)
-            
-            temp_results.append(result)
-            jobs[job_id]["completed"] += 1
-            
-            logger.info(f"Successfully processed: {file_path.name}")
-            logger.info(f"  Output: {output_file}")
-            
-        except Exception as e:
-            logger.error(f"Failed to process {file_path.name}: {str(e)}")
-            temp_results.append({
-                "filename": file_path.name,
-                "error": str(e),
-                "index": i
+                "success": "error" not in temp_results[i],
+                "error": temp_results[i].get("error"),
+                "completed": completed,
+                "total": len(file_paths)
             })
-            jobs[job_id]["completed"] += 1
+
+    await asyncio.gather(*(process_file(i, file_path) for i, file_path in enumerate(file_paths)))
     
     # Check if we should zip the output
     logger.info(f"DEBUG: Processing complete, checking if should zip...")
@@ -473,18 +807,18 @@ async def process_job(job_id: str, file_paths: List[Path], processor_type: str,
         logger.info(f"DEBUG: should_zip={should_zip}")
         
         if should_zip:
-            logger.info(f"DEBUG: Creating ZIP file")
-            zip_file = create_zip_output(output_dir, job_id)
-            
-            logger.info(f"DEBUG: ZIP created at {zip_file}")
-            
+            # The archive is streamed from the output dir at download time
+            logger.info(f"DEBUG: Packaging output dir as ZIP result")
+            record_event(job_id, "stage", {"file": None, "stage": "zip"})
+            zip_name = f"{job_id}_output.zip"
+
             zip_result = {
-                "filename": zip_file.name,
-                "output_filename": zip_file.name,
-                "path": str(zip_file),
+                "filename": zip_name,
+                "output_filename": zip_name,
+                "path": str(output_dir),
                 "index": 0,
                 "success": True,
-                "size": zip_file.stat().st_size,
+                "size": directory_size(output_dir),
                 "type": "application/zip"
             }
 
@@ -495,17 +829,20 @@ async def process_job(job_id: str, file_paths: List[Path], processor_type: str,
                     break
 
             # Replace results with just the ZIP
-            jobs[job_id]["results"] = [zip_result]
-            logger.info(f"✅ ZIP REPLACEMENT DONE: {jobs[job_id]['results']}")
+            final_results = [zip_result]
+            logger.info(f"✅ ZIP REPLACEMENT DONE: {final_results}")
         else:
             logger.info(f"DEBUG: Not zipping, using individual files")
-            jobs[job_id]["results"] = temp_results
+            final_results = temp_results
     else:
-        jobs[job_id]["results"] = temp_results
+        final_results = temp_results
     
-    jobs[job_id]["status"] = "completed"
+    package_stats["parse_seconds"] = round(package_stats["parse_seconds"], 4)
+    job_store.update(job_id, results=final_results, status="completed", package_stats=package_stats)
+    record_event(job_id, "completed", job_status_payload(job_id, job_store.get(job_id)))
     logger.info(f"=== JOB {job_id} COMPLETED ===")
-    logger.info(f"=== FINAL RESULTS: {len(jobs[job_id]['results'])} items ===")
+    logger.info(f"DOCX parsing: {package_stats['bytes_parsed']} bytes in {package_stats['parse_seconds']}s")
+    logger.info(f"=== FINAL RESULTS: {len(final_results)} items ===")
 
 async def convert_to_html(input_file: Path, output_dir: Path) -> Path:
     """Simple HTML conversion using mammoth"""
@@ -557,31 +894,6 @@ async def convert_to_html(input_file: Path, output_dir: Path) -> Path:
     logger.info(f"HTML saved to: {output_file}")
     return output_file
 
-async def scan_and_verify(input_file: Path, output_dir: Path) -> Path:
-    """Simple document analysis"""
-    from docx import Document
-    import pandas as pd
-    
-    logger.info(f"Scanning document: {input_file.name}")
-    
-    doc = Document(input_file)
-    
-    # Basic analysis
-    analysis = {
-        "Filename": input_file.name,
-        "Paragraphs": len(doc.paragraphs),
-        "Tables": len(doc.tables),
-        "Word Count": sum(len(p.text.split()) for p in doc.paragraphs if p.text)
-    }
-    
-    # Save to Excel
-    output_file = output_dir / f"{input_file.stem}_analysis.xlsx"
-    df = pd.DataFrame([analysis])
-    df.to_excel(output_file, index=False)
-    
-    logger.info(f"Analysis saved to: {output_file}")
-    return output_file
-
 @app.get("/api/health")
 async def health():
     """Health check endpoint"""
@@ -590,16 +902,21 @@ async def health():
         "message": "Document Processing API",
         "equation_approach": "ZIP" if USE_ZIP_APPROACH else "Word COM",
         "temp_dir": str(TEMP_DIR),
-        "output_dir": str(OUTPUT_DIR)
+        "output_dir": str(OUTPUT_DIR),
+        "worker_pool": conversion_pool.info(),
+        "job_queue": job_queue.info(),
+        "janitor": janitor.info(),
+        "result_cache": result_cache.info(),
+        "equation_cache": equation_store.info() if equation_store else {"enabled": False}
     }
 
 @app.get("/api/debug/{job_id}")
 async def debug_job(job_id: str):
     """Debug endpoint to check job details"""
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         return {"error": "Job not found"}
     
-    job = jobs[job_id]
     job_output_dir = OUTPUT_DIR / job_id
     
     # List files in output directory
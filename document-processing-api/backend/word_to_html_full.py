@@ -18,16 +18,18 @@ Configuration Options:
 
 import sys
 import io
-import zipfile
-import shutil
 import base64
 import re
 import json
 from pathlib import Path
-from lxml import etree
-from datetime import datetime
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Optional, List, Dict
+from doc_processor import ooxml
+from doc_processor.docx_package import DocxPackage
+
+# Footnotes go before this heading (<h2>المراجع</h2>, possibly with attributes)
+REFERENCES_HEADING = re.compile(r'(<h2[^>]*>المراجع</h2>)')
 
 # Set UTF-8 encoding
 if not isinstance(sys.stdout, io.TextIOWrapper) or sys.stdout.encoding != 'utf-8':
@@ -50,7 +52,8 @@ class ConversionConfig:
     # Image settings
     include_images: bool = True  # Include images in output (always extracted to subfolder)
 
-    # Equation markers (empty = no markers, just \(...\) and \[...\] delimiters)
+    # Legacy equation markers. The HTML always used bare \(...\) and \[...\] delimiters
+    # (markers were inserted and stripped again), so these no longer affect the output.
     inline_prefix: str = ''
     inline_suffix: str = ''
     display_prefix: str = ''
@@ -68,25 +71,122 @@ class ConversionConfig:
     # Output format: "mathml_html" (MathML, no JS) or "latex_html" (LaTeX + MathJax)
     output_format: str = "mathml_html"
 
+    # Parse document.xml incrementally and write the HTML as it is converted (very large documents)
+    stream_body: bool = False
+
+
+@dataclass(frozen=True)
+class RunFormat:
+    """Direct character formatting of a run (or paragraph mark), decoded from its w:rPr"""
+    bold: bool = False
+    italic: bool = False
+    strike: bool = False
+    dstrike: bool = False
+    superscript: bool = False
+    subscript: bool = False
+
+
+PLAIN_RUN = RunFormat()
+
+W_RPR = f'{{{ooxml.W_NS}}}rPr'
+W_VAL = f'{{{ooxml.W_NS}}}val'
+W_VERT_ALIGN = f'{{{ooxml.W_NS}}}vertAlign'
+W_FOOTNOTE_REFERENCE = f'{{{ooxml.W_NS}}}footnoteReference'
+# On/off properties: on unless w:val="false"
+RUN_TOGGLES = {f'{{{ooxml.W_NS}}}{tag}': name for tag, name in
+               (('b', 'bold'), ('i', 'italic'), ('strike', 'strike'), ('dstrike', 'dstrike'))}
+
+
+def decode_run_properties(rpr):
+    """RunFormat of a w:rPr element, from its own children only"""
+    values = {}
+    for prop in rpr:
+        if prop.tag in RUN_TOGGLES:
+            if prop.get(W_VAL) != 'false':
+                values[RUN_TOGGLES[prop.tag]] = True
+        elif prop.tag == W_VERT_ALIGN:
+            align = prop.get(W_VAL)
+            if align in ('superscript', 'subscript'):
+                values[align] = True
+    return RunFormat(**values)
+
+
+# Inline elements a run is wrapped in, outermost first
+DSTRIKE_START = '<s style="text-decoration-style:double">'
+
+
+@lru_cache(maxsize=None)
+def inline_elements(fmt, skip_italic=False, skip_bold=False):
+    """(name, start tag) pairs a run with RunFormat fmt is wrapped in, outermost first"""
+    elements = []
+    if fmt.subscript:
+        elements.append(('sub', '<sub>'))
+    if fmt.superscript:
+        elements.append(('sup', '<sup>'))
+    if fmt.dstrike:
+        elements.append(('s', DSTRIKE_START))
+    elif fmt.strike:
+        elements.append(('s', '<s>'))
+    if fmt.bold and not skip_bold:
+        elements.append(('b', '<b>'))
+    if fmt.italic and not skip_italic:
+        elements.append(('i', '<i>'))
+    return tuple(elements)
+
+
+class InlineBuilder:
+    """
+    HTML of a paragraph's inline content, with adjacent runs of the same formatting merged
+
+    Word splits runs at arbitrary points (e.g. at ڤ in Arabic), so neighbouring
+    runs often share formatting. add() keeps an element open while the next
+    segment is wrapped in it too, so <b>X</b><b>Y</b> comes out as <b>XY</b>;
+    elements holding only whitespace are dropped when they close.
+    """
+
+    def __init__(self):
+        self._open = []  # [name, start tag, content parts] per open element, outermost first
+        self._parts = []
+
+    def add(self, content, elements=()):
+        """Append content wrapped in elements ((name, start tag) pairs, outermost first)"""
+        if not content and not elements:
+            return
+        open_elements = self._open
+        depth = 0
+        for (name, start), element in zip(elements, open_elements):
+            if element[1] != start:
+                break
+            depth += 1
+        while len(open_elements) > depth:
+            self._close()
+        for name, start in elements[depth:]:
+            open_elements.append([name, start, []])
+        (open_elements[-1][2] if open_elements else self._parts).append(content)
+
+    def _close(self):
+        name, start, parts = self._open.pop()
+        content = ''.join(parts)
+        if content.strip():
+            (self._open[-1][2] if self._open else self._parts).append(f'{start}{content}</{name}>')
+
+    def getvalue(self):
+        while self._open:
+            self._close()
+        return ''.join(self._parts)
+
 
 class ShapeToSVGConverter:
     """Converts Word shapes to SVG"""
 
     def __init__(self):
-        self.ns = {
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'wps': 'http://schemas.microsoft.com/office/word/2010/wordprocessingShape',
-            'wpg': 'http://schemas.microsoft.com/office/word/2010/wordprocessingGroup',
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-            'v': 'urn:schemas-microsoft-com:vml',
-            'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing'
-        }
+        self.ns = ooxml.NAMESPACES
 
     def convert_drawing_to_svg(self, drawing_elem, equations_map=None):
         """Convert a drawing element to SVG"""
 
         # Get dimensions
-        extent = drawing_elem.xpath('.//wp:extent', namespaces=self.ns)
+        extent = ooxml.FIND_EXTENT(drawing_elem)
         if extent:
             # EMUs to pixels (914400 EMUs = 1 inch = 96 pixels)
             cx = int(extent[0].get('cx', '914400')) / 914400 * 96
@@ -97,12 +197,12 @@ class ShapeToSVGConverter:
         svg_parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{cx}" height="{cy}" viewBox="0 0 {cx} {cy}">']
 
         # Check for group of shapes
-        grp_sp = drawing_elem.xpath('.//wpg:wgp', namespaces=self.ns)
+        grp_sp = ooxml.FIND_SHAPE_GROUPS(drawing_elem)
         if grp_sp:
             svg_parts.append(self._convert_group(grp_sp[0], cx, cy))
         else:
             # Single shape
-            wsp = drawing_elem.xpath('.//wps:wsp', namespaces=self.ns)
+            wsp = ooxml.FIND_SHAPES(drawing_elem)
             if wsp:
                 svg_parts.append(self._convert_shape(wsp[0], 0, 0, cx, cy))
 
@@ -114,12 +214,12 @@ class ShapeToSVGConverter:
         parts = []
 
         # Get all shapes in group
-        shapes = grp_elem.xpath('.//wps:wsp', namespaces=self.ns)
+        shapes = ooxml.FIND_SHAPES(grp_elem)
 
         for i, shape in enumerate(shapes):
             # Get shape position within group
-            off = shape.xpath('.//a:off', namespaces=self.ns)
-            ext = shape.xpath('.//a:ext', namespaces=self.ns)
+            off = ooxml.FIND_OFFSET(shape)
+            ext = ooxml.FIND_SIZE(shape)
 
             x = int(off[0].get('x', '0')) / 914400 * 96 if off else i * 50
             y = int(off[0].get('y', '0')) / 914400 * 96 if off else 0
@@ -129,7 +229,7 @@ class ShapeToSVGConverter:
             parts.append(self._convert_shape(shape, x, y, w, h))
 
         # Get connectors/lines
-        cxn_sps = grp_elem.xpath('.//wps:cxnSp', namespaces=self.ns)
+        cxn_sps = ooxml.FIND_CONNECTORS(grp_elem)
         for cxn in cxn_sps:
             parts.append(self._convert_connector(cxn))
 
@@ -139,15 +239,15 @@ class ShapeToSVGConverter:
         """Convert a single shape to SVG element"""
 
         # Get shape type
-        prst_geom = shape_elem.xpath('.//a:prstGeom/@prst', namespaces=self.ns)
+        prst_geom = ooxml.FIND_PRESET_GEOMETRY(shape_elem)
         shape_type = prst_geom[0] if prst_geom else 'rect'
 
         # Get fill color
-        solid_fill = shape_elem.xpath('.//a:solidFill/a:srgbClr/@val', namespaces=self.ns)
+        solid_fill = ooxml.FIND_FILL_COLOR(shape_elem)
         fill_color = f'#{solid_fill[0]}' if solid_fill else '#f0f0f0'
 
         # Get outline color
-        ln_fill = shape_elem.xpath('.//a:ln/a:solidFill/a:srgbClr/@val', namespaces=self.ns)
+        ln_fill = ooxml.FIND_LINE_COLOR(shape_elem)
         stroke_color = f'#{ln_fill[0]}' if ln_fill else '#333333'
 
         # Get text content
@@ -207,8 +307,8 @@ class ShapeToSVGConverter:
     def _convert_connector(self, cxn_elem):
         """Convert connector/line to SVG"""
         # Get start and end points
-        stCxn = cxn_elem.xpath('.//a:stCxn', namespaces=self.ns)
-        endCxn = cxn_elem.xpath('.//a:endCxn', namespaces=self.ns)
+        stCxn = ooxml.FIND_CONNECTION_START(cxn_elem)
+        endCxn = ooxml.FIND_CONNECTION_END(cxn_elem)
 
         # Simplified - just draw a line
         return '<line x1="50" y1="50" x2="150" y2="50" stroke="#333" stroke-width="2" marker-end="url(#arrow)"/>'
@@ -216,7 +316,7 @@ class ShapeToSVGConverter:
     def _extract_shape_text(self, shape_elem):
         """Extract text content from shape, including LaTeX equations"""
         texts = []
-        for t in shape_elem.xpath('.//w:t/text() | .//a:t/text()', namespaces=self.ns):
+        for t in ooxml.FIND_SHAPE_TEXT(shape_elem):
             if t and t.strip():
                 texts.append(t.strip())
 
@@ -231,12 +331,10 @@ class ShapeToSVGConverter:
 
     def convert_vml_to_svg(self, pict_elem):
         """Convert VML pict element to SVG"""
-        ns = self.ns
-
         # Get oval
-        ovals = pict_elem.xpath('.//v:oval', namespaces=ns)
-        rects = pict_elem.xpath('.//v:rect', namespaces=ns)
-        lines = pict_elem.xpath('.//v:line', namespaces=ns)
+        ovals = ooxml.FIND_VML_OVALS(pict_elem)
+        rects = ooxml.FIND_VML_RECTS(pict_elem)
+        lines = ooxml.FIND_VML_LINES(pict_elem)
 
         # Default dimensions
         width, height = 100, 100
@@ -291,7 +389,7 @@ class ShapeToSVGConverter:
     def _extract_vml_text(self, elem):
         """Extract text from VML element"""
         texts = []
-        for t in elem.xpath('.//w:t/text()', namespaces=self.ns):
+        for t in ooxml.FIND_TEXT(elem):
             if t.strip():
                 texts.append(t.strip())
         return ' '.join(texts) if texts else ''
@@ -300,8 +398,9 @@ class ShapeToSVGConverter:
 class FullWordToHTMLConverter:
     """Full-featured Word to HTML converter with configuration"""
 
-    def __init__(self, config: ConversionConfig = None):
+    def __init__(self, config: ConversionConfig = None, progress_callback=None):
         self.config = config or ConversionConfig()
+        self.progress_callback = progress_callback  # Called with stage name: extract/equations/body/html
         self.svg_converter = ShapeToSVGConverter()
 
         # Strategy: select equation converter based on output_format
@@ -311,29 +410,24 @@ class FullWordToHTMLConverter:
         else:
             self.equation_converter = None  # LaTeX mode uses pre-processed DOCX
 
-        self.namespaces = {
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-            'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-            'v': 'urn:schemas-microsoft-com:vml',
-            'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006',
-            'wps': 'http://schemas.microsoft.com/office/word/2010/wordprocessingShape',
-            'wpg': 'http://schemas.microsoft.com/office/word/2010/wordprocessingGroup',
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
-            'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
-            'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture'
-        }
+        self.namespaces = ooxml.NAMESPACES
 
         self.relationships = {}
         self.images = {}
         self.footnotes = {}
         self.styles = {}
         self.numbering = {}
+        self.run_formats = {}  # w:rPr properties -> RunFormat (documents reuse a few property sets)
         self.output_dir = None  # Set during conversion
         self.svg_counter = 0  # Counter for generated SVG files
 
-    def convert(self, input_path, output_path=None, output_dir=None):
-        """Main conversion method - branches based on output_format"""
+    def convert(self, input_path, output_path=None, output_dir=None, package=None):
+        """
+        Main conversion method - branches based on output_format
+
+        package: DocxPackage of input_path shared with other processing steps
+        (optional; opened and closed here if not given)
+        """
 
         input_path = Path(input_path).absolute()
 
@@ -360,73 +454,91 @@ class FullWordToHTMLConverter:
         print(f"DEBUG: output_format == 'mathml_html': {self.config.output_format == 'mathml_html'}")
         print(f"DEBUG: output_format == 'latex_html': {self.config.output_format == 'latex_html'}")
 
-        if self.config.output_format == "mathml_html":
-            print("DEBUG: Using MathML mode")
-            return self._convert_mathml_mode(input_path, output_path, output_dir)
-        else:
-            print("DEBUG: Using LaTeX mode")
-            return self._convert_latex_mode(input_path, output_path, output_dir)
+        owned = package is None
+        try:
+            if owned:
+                package = DocxPackage(input_path)
+        except Exception as e:
+            print(f"ERROR: {e}")
+            return {'success': False, 'error': str(e)}
+
+        try:
+            if self.config.output_format == "mathml_html":
+                print("DEBUG: Using MathML mode")
+                return self._convert_mathml_mode(input_path, output_path, output_dir, package)
+            else:
+                print("DEBUG: Using LaTeX mode")
+                return self._convert_latex_mode(input_path, output_path, output_dir, package)
+        finally:
+            if owned:
+                package.close()
 
-    def _convert_latex_mode(self, input_path, output_path, output_dir):
-        """Existing two-step conversion: equation pre-processing + HTML generation"""
+    def _report(self, stage):
+        """Notify the progress callback (if any) that a conversion stage started"""
+        if self.progress_callback:
+            self.progress_callback(stage)
 
-        temp_dir = Path(f"temp_full_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    def _convert_latex_mode(self, input_path, output_path, output_dir, package):
+        """
+        LaTeX + MathJax conversion
+
+        Every m:oMath in the package's document tree is replaced by a run
+        holding its LaTeX (\\(...\\) or \\[...\\]), then the same tree is
+        converted to HTML. No intermediate .docx and no marker text.
+        """
 
         try:
-            # Step 1: Convert equations first
+            # Step 1: Substitute LaTeX for the equations in the in-memory tree
             print("\n[1] Converting equations...")
-            print(f"    Markers: inline={self.config.inline_prefix}/{self.config.inline_suffix}, display={self.config.display_prefix}/{self.config.display_suffix}")
+            self._report("equations")
             from enhanced_zip_converter import EnhancedZipConverter
             eq_converter = EnhancedZipConverter(
-                inline_prefix=self.config.inline_prefix,
-                inline_suffix=self.config.inline_suffix,
-                display_prefix=self.config.display_prefix,
-                display_suffix=self.config.display_suffix
+                inline_prefix='', inline_suffix='', display_prefix='', display_suffix=''
             )
 
-            eq_converted = temp_dir / "eq_converted.docx"
-            temp_dir.mkdir(exist_ok=True)
-
-            eq_result = eq_converter.process_document(input_path, eq_converted)
+            # On failure the tree is left unchanged and the equations are dropped as before.
+            # When streaming, each body element's equations are replaced as it is parsed.
+            if not self.config.stream_body:
+                eq_converter.convert_package(package)
 
-            if not (eq_result.get('success') and eq_converted.exists()):
-                eq_converted = input_path
-
-            # Step 2: Extract document
-            print("\n[2] Extracting document...")
-            extract_dir = temp_dir / "extracted"
-            with zipfile.ZipFile(eq_converted, 'r') as z:
-                z.extractall(extract_dir)
+            # Step 2: Read document parts
+            print("\n[2] Reading document parts...")
+            self._report("extract")
 
             # Step 3: Load resources
             print("\n[3] Loading resources...")
             self.output_dir = output_dir  # Store for SVG saving
-            self._load_relationships(extract_dir)
-            self._load_styles(extract_dir)
-            self._load_numbering(extract_dir)
-            self._load_footnotes(extract_dir)
-            self._extract_images(extract_dir, output_dir)  # Always extract images to subfolder
-
-            # Step 4: Convert document
-            print("\n[4] Converting document...")
-            doc_xml = extract_dir / "word" / "document.xml"
-            with open(doc_xml, 'rb') as f:
-                doc_root = etree.fromstring(f.read())
+            self._load_relationships(package)
+            self._load_styles(package)
+            self._load_numbering(package)
+            self._load_footnotes(package)
+            self._extract_images(package, output_dir)  # Always extract images to subfolder
 
-            html_content = self._convert_body(doc_root)
+            body_output_path = output_dir / f"{input_path.stem}_body.txt"
+            if self.config.stream_body:
+                # Steps 4 + 5: Convert and write block by block
+                print("\n[4] Converting document (streaming)...")
+                self._report("body")
+                blocks = self._iter_body_blocks(self._iter_streamed_body(package, eq_converter))
+                self._write_streamed(blocks, self._html_page(input_path.stem), output_path, body_output_path)
+            else:
+                # Step 4: Convert document
+                print("\n[4] Converting document...")
+                self._report("body")
+                html_content = self._convert_body(package.xml('word/document.xml'))
 
-            # Step 5: Generate HTML
-            print("\n[5] Generating HTML...")
-            full_html = self._generate_html(html_content, input_path.stem)
+                # Step 5: Generate HTML
+                print("\n[5] Generating HTML...")
+                self._report("html")
+                full_html = self._generate_html(html_content, input_path.stem)
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(full_html)
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(full_html)
 
-            # Generate body-only file for SharePoint pasting
-            body_output_path = output_dir / f"{input_path.stem}_body.txt"
-            body_html = self._generate_body_html(html_content)
-            with open(body_output_path, 'w', encoding='utf-8') as f:
-                f.write(body_html)
+                # Generate body-only file for SharePoint pasting
+                body_html = self._generate_body_html(html_content)
+                with open(body_output_path, 'w', encoding='utf-8') as f:
+                    f.write(body_html)
 
             print(f"\n{'='*70}")
             print("CONVERSION COMPLETE!")
@@ -438,6 +550,7 @@ class FullWordToHTMLConverter:
                 'success': True,
                 'output_path': str(output_path),
                 'body_output_path': str(body_output_path),
+                'equation_cache': eq_converter.flush_equation_cache(),
             }
 
         except Exception as e:
@@ -446,52 +559,49 @@ class FullWordToHTMLConverter:
             traceback.print_exc()
             return {'success': False, 'error': str(e)}
 
-        finally:
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir)
-
-    def _convert_mathml_mode(self, input_path, output_path, output_dir):
+    def _convert_mathml_mode(self, input_path, output_path, output_dir, package):
         """Direct DOCX to HTML with MathML - no intermediate Word file"""
 
-        temp_dir = Path(f"temp_mathml_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-
         try:
-            # Step 1: Extract ORIGINAL DOCX directly (no pre-processing)
-            print("\n[1] Extracting original document (MathML mode)...")
-            extract_dir = temp_dir / "extracted"
-            temp_dir.mkdir(exist_ok=True)
-            with zipfile.ZipFile(input_path, 'r') as z:
-                z.extractall(extract_dir)
+            # Step 1: Read ORIGINAL DOCX directly (no pre-processing)
+            print("\n[1] Reading original document (MathML mode)...")
+            self._report("extract")
 
             # Step 2: Load resources
             print("\n[2] Loading resources...")
             self.output_dir = output_dir
-            self._load_relationships(extract_dir)
-            self._load_styles(extract_dir)
-            self._load_numbering(extract_dir)
-            self._load_footnotes_wordhtml(extract_dir)
-            self._extract_images(extract_dir, output_dir)
+            self.equation_converter.memo.clear()  # Memoised equations are per document
+            self._load_relationships(package)
+            self._load_styles(package)
+            self._load_numbering(package)
+            self._load_footnotes_wordhtml(package)
+            self._extract_images(package, output_dir)
 
-            # Step 3: Convert document (OMML equations converted inline to MathML)
-            print("\n[3] Converting document with inline MathML...")
-            doc_xml = extract_dir / "word" / "document.xml"
-            with open(doc_xml, 'rb') as f:
-                doc_root = etree.fromstring(f.read())
-
-            html_content = self._convert_body(doc_root)
+            body_output_path = output_dir / f"{input_path.stem}_body.txt"
+            if self.config.stream_body:
+                # Steps 3 + 4: Convert and write block by block
+                print("\n[3] Converting document with inline MathML (streaming)...")
+                self._report("body")
+                blocks = self._iter_body_blocks(self._iter_streamed_body(package))
+                self._write_streamed(blocks, self._wordhtml_page(input_path.stem), output_path, body_output_path)
+            else:
+                # Step 3: Convert document (OMML equations converted inline to MathML)
+                print("\n[3] Converting document with inline MathML...")
+                self._report("body")
+                html_content = self._convert_body(package.xml('word/document.xml'))
 
-            # Step 4: Generate clean HTML (no MathJax, wordhtml.com format)
-            print("\n[4] Generating HTML (wordhtml.com format, no JavaScript)...")
-            full_html = self._generate_html_wordhtml(html_content, input_path.stem)
+                # Step 4: Generate clean HTML (no MathJax, wordhtml.com format)
+                print("\n[4] Generating HTML (wordhtml.com format, no JavaScript)...")
+                self._report("html")
+                full_html = self._generate_html_wordhtml(html_content, input_path.stem)
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(full_html)
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(full_html)
 
-            # Generate body-only file for SharePoint pasting
-            body_output_path = output_dir / f"{input_path.stem}_body.txt"
-            body_html = self._generate_body_html(html_content)
-            with open(body_output_path, 'w', encoding='utf-8') as f:
-                f.write(body_html)
+                # Generate body-only file for SharePoint pasting
+                body_html = self._generate_body_html(html_content)
+                with open(body_output_path, 'w', encoding='utf-8') as f:
+                    f.write(body_html)
 
             print(f"\n{'='*70}")
             print("CONVERSION COMPLETE (MathML mode)!")
@@ -502,7 +612,8 @@ class FullWordToHTMLConverter:
             return {
                 'success': True,
                 'output_path': str(output_path),
-                'body_output_path': str(body_output_path)
+                'body_output_path': str(body_output_path),
+                'equation_cache': self._flush_equation_cache(),
             }
 
         except Exception as e:
@@ -511,83 +622,65 @@ class FullWordToHTMLConverter:
             traceback.print_exc()
             return {'success': False, 'error': str(e)}
 
-        finally:
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir)
+    def _flush_equation_cache(self):
+        """Save new MathML equations to the persistent cache; returns the memo hits/misses"""
+        self.equation_converter.memo.flush()
+        return self.equation_converter.memo.summary()
 
-    def _load_relationships(self, extract_dir):
-        rels_dir = extract_dir / "word" / "_rels"
+    def _load_relationships(self, package):
         # Load relationships from both document.xml.rels and footnotes.xml.rels
-        for rels_file in ['document.xml.rels', 'footnotes.xml.rels']:
-            rels_path = rels_dir / rels_file
-            if not rels_path.exists():
-                continue
-            with open(rels_path, 'rb') as f:
-                root = etree.fromstring(f.read())
-            ns = {'r': 'http://schemas.openxmlformats.org/package/2006/relationships'}
-            for rel in root.xpath('//r:Relationship', namespaces=ns):
-                self.relationships[rel.get('Id')] = {
-                    'target': rel.get('Target'),
-                    'type': rel.get('Type', '').split('/')[-1]
-                }
-
-    def _load_styles(self, extract_dir):
-        styles_path = extract_dir / "word" / "styles.xml"
-        if not styles_path.exists():
+        for part in ['word/document.xml', 'word/footnotes.xml']:
+            self.relationships.update(package.rels(part))
+
+    def _load_styles(self, package):
+        root = package.xml("word/styles.xml")
+        if root is None:
             return
-        with open(styles_path, 'rb') as f:
-            root = etree.fromstring(f.read())
-        ns = {'w': self.namespaces['w']}
-        for style in root.xpath('//w:style', namespaces=ns):
+        ns = self.namespaces
+        for style in ooxml.FIND_STYLES(root):
             style_id = style.get(f'{{{ns["w"]}}}styleId')
-            name = style.xpath('w:name/@w:val', namespaces=ns)
+            name = ooxml.FIND_STYLE_NAME(style)
             if name:
                 self.styles[style_id] = name[0]
 
-    def _load_numbering(self, extract_dir):
-        num_path = extract_dir / "word" / "numbering.xml"
-        if not num_path.exists():
+    def _load_numbering(self, package):
+        root = package.xml("word/numbering.xml")
+        if root is None:
             return
-        with open(num_path, 'rb') as f:
-            root = etree.fromstring(f.read())
-        ns = {'w': self.namespaces['w']}
+        ns = self.namespaces
 
         abstract_nums = {}
-        for abstract in root.xpath('//w:abstractNum', namespaces=ns):
+        for abstract in ooxml.FIND_ABSTRACT_NUMS(root):
             abs_id = abstract.get(f'{{{ns["w"]}}}abstractNumId')
             levels = {}
-            for lvl in abstract.xpath('.//w:lvl', namespaces=ns):
+            for lvl in ooxml.FIND_LEVELS(abstract):
                 lvl_id = lvl.get(f'{{{ns["w"]}}}ilvl')
-                fmt = lvl.xpath('.//w:numFmt/@w:val', namespaces=ns)
+                fmt = ooxml.FIND_NUM_FORMAT(lvl)
                 levels[lvl_id] = fmt[0] if fmt else 'bullet'
             abstract_nums[abs_id] = levels
 
-        for num in root.xpath('//w:num', namespaces=ns):
+        for num in ooxml.FIND_NUMS(root):
             num_id = num.get(f'{{{ns["w"]}}}numId')
-            abs_ref = num.xpath('.//w:abstractNumId/@w:val', namespaces=ns)
+            abs_ref = ooxml.FIND_ABSTRACT_NUM_ID(num)
             if abs_ref and abs_ref[0] in abstract_nums:
                 self.numbering[num_id] = abstract_nums[abs_ref[0]]
 
-    def _load_footnotes(self, extract_dir):
-        fn_path = extract_dir / "word" / "footnotes.xml"
-        if fn_path.exists():
-            with open(fn_path, 'rb') as f:
-                root = etree.fromstring(f.read())
-            ns = {'w': self.namespaces['w']}
-            for fn in root.xpath('//w:footnote', namespaces=ns):
+    def _load_footnotes(self, package):
+        root = package.xml("word/footnotes.xml")
+        if root is not None:
+            ns = self.namespaces
+            for fn in ooxml.FIND_FOOTNOTES(root):
                 fn_id = fn.get(f'{{{ns["w"]}}}id')
                 if fn_id and fn_id not in ['0', '-1']:
                     self.footnotes[fn_id] = self._convert_footnote_content(fn, fn_id)
 
-    def _load_footnotes_wordhtml(self, extract_dir):
+    def _load_footnotes_wordhtml(self, package):
         """Load footnotes with full formatting for wordhtml.com style output"""
-        fn_path = extract_dir / "word" / "footnotes.xml"
-        if not fn_path.exists():
+        root = package.xml("word/footnotes.xml")
+        if root is None:
             return
-        with open(fn_path, 'rb') as f:
-            root = etree.fromstring(f.read())
-        ns = {'w': self.namespaces['w']}
-        for fn in root.xpath('//w:footnote', namespaces=ns):
+        ns = self.namespaces
+        for fn in ooxml.FIND_FOOTNOTES(root):
             fn_id = fn.get(f'{{{ns["w"]}}}id')
             if fn_id and fn_id not in ['0', '-1']:
                 self.footnotes[fn_id] = self._convert_footnote_content(fn, fn_id)
@@ -596,13 +689,13 @@ class FullWordToHTMLConverter:
         """Convert footnote content with formatting preserved"""
         ns = self.namespaces
         parts = []
-        for p in fn_elem.xpath('.//w:p', namespaces=ns):
+        for p in ooxml.FIND_PARAGRAPHS(fn_elem):
             p_parts = []
             for child in p:
                 tag = child.tag.split('}')[-1]
                 if tag == 'r':
                     # Skip footnote reference marker inside footnote itself
-                    if child.xpath('.//w:footnoteRef', namespaces=ns):
+                    if ooxml.FIND_FOOTNOTE_REF(child):
                         continue
                     p_parts.append(self._convert_run(child))
                 elif tag == 'hyperlink':
@@ -622,42 +715,46 @@ class FullWordToHTMLConverter:
             result = re.sub(rf'^{re.escape(fn_id)}\s*', '', result)
         return result
 
-    def _extract_images(self, extract_dir, output_dir):
-        media_dir = extract_dir / "word" / "media"
-        if not media_dir.exists():
+    def _extract_images(self, package, output_dir):
+        media = package.media()
+        if not media:
             return
         images_dir = output_dir / "images"
         images_dir.mkdir(exist_ok=True)
-        for img in media_dir.iterdir():
-            shutil.copy2(img, images_dir / img.name)
-            self.images[img.name] = f"images/{img.name}"
+        for member in media:
+            name = Path(member).name
+            package.copy_member(member, images_dir / name)
+            self.images[name] = f"images/{name}"
 
     def _extract_text(self, elem):
-        return ''.join(t.text or '' for t in elem.xpath('.//w:t', namespaces=self.namespaces))
+        return ''.join(t.text or '' for t in ooxml.FIND_TEXT_ELEMENTS(elem))
 
     def _convert_body(self, doc_root):
+        body = ooxml.FIND_BODY(doc_root)[0]
+        return '\n'.join(filter(None, self._iter_body_blocks(body)))
+
+    def _iter_body_blocks(self, children):
+        """HTML of the top-level body elements, one block at a time (a list is yielded when it ends)"""
         ns = self.namespaces
-        body = doc_root.xpath('//w:body', namespaces=ns)[0]
         is_mathml = self.config.output_format == "mathml_html"
 
-        parts = []
         list_items = []
         current_list = None
         current_num_id = None  # Track numId to continue lists after interruptions
         list_counters = {}  # Track count for each numId to use <ol start="N">
 
-        for child in body:
+        for child in children:
             tag = child.tag.split('}')[-1]
 
             if tag == 'p':
                 # Check for section break inside paragraph
                 sect_pr = child.find('.//w:pPr/w:sectPr', namespaces=ns) if is_mathml else None
 
-                num_pr = child.xpath('.//w:numPr', namespaces=ns)
+                num_pr = ooxml.FIND_NUM_PR(child)
                 if num_pr:
-                    num_id = child.xpath('.//w:numId/@w:val', namespaces=ns)
+                    num_id = ooxml.FIND_NUM_ID(child)
                     num_id_val = num_id[0] if num_id else None
-                    ilvl = child.xpath('.//w:ilvl/@w:val', namespaces=ns)
+                    ilvl = ooxml.FIND_ILVL(child)
 
                     list_type = 'ul'
                     if num_id_val and num_id_val in self.numbering:
@@ -669,7 +766,7 @@ class FullWordToHTMLConverter:
                     # Check if we're continuing a different list or starting fresh
                     if current_list != list_type or current_num_id != num_id_val:
                         if list_items:
-                            parts.append(self._wrap_list(list_items, current_list, current_num_id, list_counters))
+                            yield self._wrap_list(list_items, current_list, current_num_id, list_counters)
                             list_items = []
                         current_list = list_type
                         current_num_id = num_id_val
@@ -682,22 +779,22 @@ class FullWordToHTMLConverter:
                             list_counters[num_id_val] = list_counters.get(num_id_val, 0) + 1
                 else:
                     if list_items:
-                        parts.append(self._wrap_list(list_items, current_list, current_num_id, list_counters))
+                        yield self._wrap_list(list_items, current_list, current_num_id, list_counters)
                         list_items = []
                         current_list = None
                         # Don't reset current_num_id - we might continue the list later
-                    parts.append(self._convert_paragraph(child))
+                    yield self._convert_paragraph(child)
 
                 # Add section break separator if present
                 if sect_pr is not None:
-                    parts.append('<hr>')
+                    yield '<hr>'
 
             elif tag == 'tbl':
                 if list_items:
-                    parts.append(self._wrap_list(list_items, current_list, current_num_id, list_counters))
+                    yield self._wrap_list(list_items, current_list, current_num_id, list_counters)
                     list_items = []
                     current_list = None
-                parts.append(self._convert_table(child))
+                yield self._convert_table(child)
 
             elif tag == 'sectPr':
                 # Final section properties - safe to skip
@@ -707,12 +804,31 @@ class FullWordToHTMLConverter:
                 # Process any other element type to avoid content loss
                 text = self._extract_text(child)
                 if text.strip():
-                    parts.append(f'<p>{self._escape(text)}</p>')
+                    yield f'<p>{self._escape(text)}</p>'
 
         if list_items:
-            parts.append(self._wrap_list(list_items, current_list, current_num_id, list_counters))
+            yield self._wrap_list(list_items, current_list, current_num_id, list_counters)
+
+    def _iter_streamed_body(self, package, eq_converter=None):
+        """
+        Top-level w:body elements of document.xml, parsed incrementally
 
-        return '\n'.join(filter(None, parts))
+        Each element is complete when yielded and is cleared, with the
+        elements before it, once the next one is requested, so only one body
+        element is in memory at a time. In LaTeX mode eq_converter replaces
+        its equations first.
+        """
+        body_tag = f"{{{self.namespaces['w']}}}body"
+        for _, elem in package.iterparse('word/document.xml', events=('end',)):
+            parent = elem.getparent()
+            if parent is None or parent.tag != body_tag:
+                continue
+            if eq_converter is not None:
+                eq_converter.convert_element(elem)
+            yield elem
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
 
     def _wrap_list(self, items, list_type, num_id=None, counters=None):
         """Wrap list items in <ol> or <ul> with proper numbering continuation.
@@ -741,7 +857,7 @@ class FullWordToHTMLConverter:
 
     def _convert_paragraph_content(self, p_elem):
         ns = self.namespaces
-        parts = []
+        inline = InlineBuilder()
 
         # Detect equation-context formatting leak: Word's equation editor sometimes
         # leaves italic/bold on the paragraph default rPr (pPr/rPr) even though
@@ -754,9 +870,11 @@ class FullWordToHTMLConverter:
         #   AFTER the first equation, never before it.
         has_eq_italic_leak = False
         has_eq_bold_leak = False
-        has_equations = bool(p_elem.xpath('.//m:oMath | .//m:oMathPara', namespaces=ns))
-        ppr_italic = bool(p_elem.xpath('./w:pPr/w:rPr/w:i[not(@w:val="false")]', namespaces=ns))
-        ppr_bold = bool(p_elem.xpath('./w:pPr/w:rPr/w:b[not(@w:val="false")]', namespaces=ns))
+        has_equations = bool(ooxml.FIND_EQUATIONS_OR_PARAS(p_elem))
+        ppr = p_elem.find('w:pPr', namespaces=ns)
+        ppr_format = self._run_format(ppr) if ppr is not None else PLAIN_RUN
+        ppr_italic = ppr_format.italic
+        ppr_bold = ppr_format.bold
         if ppr_italic:
             # Pattern 1: paragraph default has italic = equation context leak
             has_eq_italic_leak = True
@@ -776,10 +894,11 @@ class FullWordToHTMLConverter:
                 if ctag in ['oMath', 'oMathPara']:
                     seen_eq = True
                 elif ctag == 'r':
-                    rt = ''.join(t.text or '' for t in child.xpath('.//w:t', namespaces=ns))
+                    rt = ''.join(t.text or '' for t in ooxml.FIND_TEXT_ELEMENTS(child))
                     if rt.strip():
-                        ri = bool(child.xpath('.//w:i[not(@w:val="false")]', namespaces=ns))
-                        rb = bool(child.xpath('.//w:b[not(@w:val="false")]', namespaces=ns))
+                        run_format = self._run_format(child)
+                        ri = run_format.italic
+                        rb = run_format.bold
                         if ri:
                             if seen_eq:
                                 italic_after = True
@@ -799,48 +918,34 @@ class FullWordToHTMLConverter:
             tag = child.tag.split('}')[-1]
 
             if tag == 'r':
-                parts.append(self._convert_run(child, skip_italic=has_eq_italic_leak, skip_bold=has_eq_bold_leak))
+                elements, run_html = self._run_segment(child, skip_italic=has_eq_italic_leak, skip_bold=has_eq_bold_leak)
+                inline.add(run_html, elements)
             elif tag == 'hyperlink':
-                parts.append(self._convert_hyperlink(child, skip_italic=has_eq_italic_leak, skip_bold=has_eq_bold_leak))
+                inline.add(self._convert_hyperlink(child, skip_italic=has_eq_italic_leak, skip_bold=has_eq_bold_leak))
             elif tag == 'drawing':
-                parts.append(self._convert_drawing(child))
+                inline.add(self._convert_drawing(child))
             elif tag == 'oMath' and self.equation_converter:
                 # MathML mode: convert equation inline
-                parts.append(self.equation_converter.convert(child, is_display=False))
+                inline.add(self.equation_converter.convert(child, is_display=False))
             elif tag == 'oMathPara' and self.equation_converter:
                 # MathML mode: convert display equation
                 omath = child.find('m:oMath', namespaces=ns)
                 if omath is not None:
-                    parts.append(self.equation_converter.convert(omath, is_display=True))
+                    inline.add(self.equation_converter.convert(omath, is_display=True))
                 else:
-                    parts.append(self.equation_converter.convert(child, is_display=True))
+                    inline.add(self.equation_converter.convert(child, is_display=True))
             elif tag in ['pPr', 'bookmarkStart', 'bookmarkEnd']:
                 continue
             else:
                 text = self._extract_text(child)
                 if text:
-                    parts.append(self._escape(text))
-
-        result = ''.join(parts)
-
-        # Post-process: consolidate adjacent identical formatting tags
-        # Word splits runs at special chars (e.g. ڤ in Arabic), producing
-        # <b>X</b><b>Y</b> instead of <b>XY</b>
-        for tag in ['b', 'i', 's', 'sub', 'sup']:
-            # Merge adjacent: </b><b> → nothing
-            result = re.sub(rf'</{tag}><{tag}>', '', result)
-        # Remove empty tags: <b></b>, <i></i>, etc.
-        for tag in ['b', 'i', 's', 'sub', 'sup']:
-            result = re.sub(rf'<{tag}>\s*</{tag}>', '', result)
-        # Strip zero-width spaces (U+200B) that Word inserts for bidi
-        result = result.replace('\u200b', '')
+                    inline.add(self._escape(text))
 
-        return result
+        # Strip zero-width spaces (U+200B) that Word inserts for bidi
+        return inline.getvalue().replace('\u200b', '')
 
     def _convert_paragraph(self, p_elem):
-        ns = self.namespaces
-
-        style_id = p_elem.xpath('.//w:pStyle/@w:val', namespaces=ns)
+        style_id = ooxml.FIND_PARAGRAPH_STYLE(p_elem)
         style_name = self.styles.get(style_id[0], '') if style_id else ''
 
         # Also get the style ID itself (e.g., "Heading1")
@@ -865,19 +970,34 @@ class FullWordToHTMLConverter:
             return f'<h{heading_level}>{content}</h{heading_level}>'
         return f'<p>{content}</p>'
 
+    def _run_format(self, elem):
+        """RunFormat of the w:rPr directly under elem (a w:r or w:pPr), memoised by its properties"""
+        rpr = elem.find(W_RPR)
+        if rpr is None:
+            return PLAIN_RUN
+        # Tags and attributes of the properties: all decoding looks at, and
+        # cheaper than etree.tostring(rpr), which also writes every in-scope namespace
+        key = tuple((prop.tag, tuple(prop.attrib.items())) for prop in rpr)
+        fmt = self.run_formats.get(key)
+        if fmt is None:
+            fmt = self.run_formats[key] = decode_run_properties(rpr)
+        return fmt
+
     def _convert_run(self, r_elem, skip_italic=False, skip_bold=False):
+        elements, content = self._run_segment(r_elem, skip_italic, skip_bold)
+        for name, start in reversed(elements):
+            content = f'{start}{content}</{name}>'
+        return content
+
+    def _run_segment(self, r_elem, skip_italic=False, skip_bold=False):
+        """(inline elements, content HTML) of a run, for InlineBuilder.add()"""
         ns = self.namespaces
         parts = []
 
-        bold = bool(r_elem.xpath('.//w:b[not(@w:val="false")]', namespaces=ns)) and not skip_bold
-        italic = bool(r_elem.xpath('.//w:i[not(@w:val="false")]', namespaces=ns)) and not skip_italic
-        strike = bool(r_elem.xpath('.//w:strike[not(@w:val="false")]', namespaces=ns))
-        dstrike = bool(r_elem.xpath('.//w:dstrike[not(@w:val="false")]', namespaces=ns))
-        superscript = bool(r_elem.xpath('.//w:vertAlign[@w:val="superscript"]', namespaces=ns))
-        subscript_text = bool(r_elem.xpath('.//w:vertAlign[@w:val="subscript"]', namespaces=ns))
+        elements = inline_elements(self._run_format(r_elem), skip_italic, skip_bold)
 
         # If run contains footnoteReference, skip text (it's just the visual number)
-        has_footnote_ref = bool(r_elem.xpath('.//w:footnoteReference', namespaces=ns))
+        has_footnote_ref = r_elem.find(W_FOOTNOTE_REFERENCE) is not None
 
         for child in r_elem:
             tag = child.tag.split('}')[-1]
@@ -894,13 +1014,13 @@ class FullWordToHTMLConverter:
                 # Handle mc:AlternateContent - shapes, equations in textboxes
                 # In MathML mode, also look for equations inside textboxes
                 if self.equation_converter:
-                    omath_elems = child.xpath('.//m:oMath', namespaces=ns)
+                    omath_elems = ooxml.FIND_NESTED_EQUATIONS(child)
                     if omath_elems:
                         for omath in omath_elems:
                             parts.append(self.equation_converter.convert(omath, is_display=False))
                         continue
-                drawing = child.xpath('.//w:drawing', namespaces=ns)
-                pict = child.xpath('.//w:pict', namespaces=ns)
+                drawing = ooxml.FIND_DRAWINGS(child)
+                pict = ooxml.FIND_PICTS(child)
                 if drawing:
                     parts.append(self._convert_drawing(drawing[0]))
                 elif pict:
@@ -917,28 +1037,17 @@ class FullWordToHTMLConverter:
             elif tag == 'br':
                 parts.append('<br>')
 
-        content = ''.join(parts)
-        if italic:
-            content = f'<i>{content}</i>'
-        if bold:
-            content = f'<b>{content}</b>'
-        if dstrike:
-            content = f'<s style="text-decoration-style:double">{content}</s>'
-        elif strike:
-            content = f'<s>{content}</s>'
-        if superscript:
-            content = f'<sup>{content}</sup>'
-        if subscript_text:
-            content = f'<sub>{content}</sub>'
-
-        return content
+        return elements, ''.join(parts)
 
     def _convert_hyperlink(self, h_elem, skip_italic=False, skip_bold=False):
         ns = self.namespaces
         r_id = h_elem.get(f'{{{ns["r"]}}}id')
         href = self.relationships.get(r_id, {}).get('target', '#')
-        content = ''.join(self._convert_run(r, skip_italic=skip_italic, skip_bold=skip_bold) for r in h_elem.xpath('.//w:r', namespaces=ns))
-        return f'<a href="{href}">{content}</a>'
+        content = InlineBuilder()
+        for r in ooxml.FIND_RUNS(h_elem):
+            elements, run_html = self._run_segment(r, skip_italic, skip_bold)
+            content.add(run_html, elements)
+        return f'<a href="{href}">{content.getvalue()}</a>'
 
     def _convert_table(self, tbl_elem):
         """Convert table to wordhtml.com format with tbody, width, and colspan."""
@@ -955,9 +1064,9 @@ class FullWordToHTMLConverter:
                 w_val = bidi_visual.get(f'{{{ns["w"]}}}val')
                 is_bidi = (w_val != '0')  # val="0" explicitly disables
 
-        for tr in tbl_elem.xpath('./w:tr', namespaces=ns):
+        for tr in ooxml.FIND_ROWS(tbl_elem):
             cells = []
-            for tc in tr.xpath('./w:tc', namespaces=ns):
+            for tc in ooxml.FIND_CELLS(tr):
                 # Get cell properties for wordhtml.com format (both modes)
                 width_attr = ''
                 colspan_attr = ''
@@ -982,7 +1091,7 @@ class FullWordToHTMLConverter:
 
                 # Convert cell content
                 content = []
-                for p in tc.xpath('./w:p', namespaces=ns):
+                for p in ooxml.FIND_CELL_PARAGRAPHS(tc):
                     p_content = self._convert_paragraph_content(p)
                     if p_content.strip():
                         content.append(p_content)
@@ -1005,10 +1114,8 @@ class FullWordToHTMLConverter:
         return '\n'.join(html)
 
     def _convert_drawing(self, drawing_elem):
-        ns = self.namespaces
-
         # Check for image
-        blip = drawing_elem.xpath('.//a:blip/@r:embed', namespaces=ns)
+        blip = ooxml.FIND_IMAGE_EMBED(drawing_elem)
         if blip:
             r_id = blip[0]
             if r_id in self.relationships:
@@ -1022,8 +1129,8 @@ class FullWordToHTMLConverter:
                         return ''  # Skip image but file is still extracted
 
         # Check for shapes (wsp = single shape, wpg = group of shapes)
-        wsp = drawing_elem.xpath('.//wps:wsp', namespaces=ns)
-        wpg = drawing_elem.xpath('.//wpg:wgp', namespaces=ns)
+        wsp = ooxml.FIND_SHAPES(drawing_elem)
+        wpg = ooxml.FIND_SHAPE_GROUPS(drawing_elem)
 
         if wsp or wpg:
             # This is a Word shape (not an image)
@@ -1056,12 +1163,10 @@ class FullWordToHTMLConverter:
 
     def _convert_pict(self, pict_elem):
         """Convert VML pict elements"""
-        ns = self.namespaces
-
         if self.config.convert_shapes_to_svg:
             # Check for shapes
-            ovals = pict_elem.xpath('.//v:oval', namespaces=ns)
-            rects = pict_elem.xpath('.//v:rect', namespaces=ns)
+            ovals = ooxml.FIND_VML_OVALS(pict_elem)
+            rects = ooxml.FIND_VML_RECTS(pict_elem)
 
             if ovals or rects:
                 svg = self.svg_converter.convert_vml_to_svg(pict_elem)
@@ -1071,7 +1176,7 @@ class FullWordToHTMLConverter:
 
         # Fallback: extract text
         texts = []
-        for t in pict_elem.xpath('.//w:t/text()', namespaces=ns):
+        for t in ooxml.FIND_TEXT(pict_elem):
             if t.strip():
                 texts.append(t.strip())
 
@@ -1128,16 +1233,57 @@ class FullWordToHTMLConverter:
         """Insert footnotes before the المراجع heading if present, else append at end."""
         if not footnotes_html:
             return content
-        import re
-        # Match <h2>المراجع</h2> (possibly with attributes)
-        pattern = r'(<h2[^>]*>المراجع</h2>)'
-        match = re.search(pattern, content)
+        match = REFERENCES_HEADING.search(content)
         if match:
             insert_pos = match.start()
             return content[:insert_pos] + footnotes_html + '\n' + content[insert_pos:]
         # No references heading found — append at end
         return content + '\n' + footnotes_html
 
+    def _write_streamed(self, blocks, page, output_path, body_output_path):
+        """
+        Write the page and the body-only file while the blocks are converted
+
+        Gives the same files as _generate_html*/_generate_body_html on the
+        joined blocks: every block gets the same transforms and the footnotes
+        go before the first المراجع heading, or at the end. Both files are
+        flushed after every block so they can be read while being written
+        (/api/convert sends them as they grow).
+        """
+        footnotes_html = self._build_footnotes_html()
+        page_head, page_tail = page
+        body_head, body_tail = self._body_page()
+
+        with open(output_path, 'w', encoding='utf-8') as page_file, \
+                open(body_output_path, 'w', encoding='utf-8') as body_file:
+            page_file.write(page_head)
+            body_file.write(body_head)
+            page_file.flush()
+            body_file.flush()
+
+            separator = ''
+            for block in blocks:
+                if not block:
+                    continue
+                block = self._prepare_content(block)
+                if footnotes_html:
+                    match = REFERENCES_HEADING.search(block)
+                    if match:
+                        block = block[:match.start()] + footnotes_html + '\n' + block[match.start():]
+                        footnotes_html = ''
+                page_file.write(separator + block)
+                body_file.write(separator + block)
+                page_file.flush()
+                body_file.flush()
+                separator = '\n'
+
+            if footnotes_html:
+                page_file.write('\n' + footnotes_html)
+                body_file.write('\n' + footnotes_html)
+
+            page_file.write(page_tail)
+            body_file.write(body_tail)
+
     def _generate_body_html(self, content):
         """Generate body-only HTML for SharePoint pasting.
 
@@ -1148,50 +1294,48 @@ class FullWordToHTMLConverter:
           inline  -> <span class="inline-math">\\(...\\)</span>
           display -> <span class="display-math">\\[...\\]</span>
         """
-        import re
-        # Remove image tags - SharePoint team inserts images manually
-        body = re.sub(r'<img\s[^>]*>', '', content)
-
-        # Strip any remaining equation markers (legacy)
-        for marker in [self.config.inline_prefix, self.config.inline_suffix,
-                       self.config.display_prefix, self.config.display_suffix]:
-            if marker:
-                body = body.replace(marker, '')
-
-        # Collapse double spaces in equations (prevents invisible Unicode in MathML)
-        body = re.sub(r'  +', ' ', body)
-
-        # Wrap equations with semantic HTML classes
-        body = re.sub(r'(\\\(.+?\\\))', r'<span class="inline-math">\1</span>', body)
-        body = re.sub(r'(\\\[.+?\\\])', r'<span class="display-math">\1</span>', body, flags=re.DOTALL)
+        body = self._prepare_content(content)
 
         footnotes_html = self._build_footnotes_html()
         body = self._insert_footnotes_before_references(body, footnotes_html)
 
-        return f'''<div id="mathjax-content">
-{body}
-</div>'''
-
-    def _generate_html_wordhtml(self, content, title):
-        """Generate HTML in wordhtml.com format - clean, no JavaScript"""
-        import re
+        head, tail = self._body_page()
+        return head + body + tail
 
-        config = self.config
+    @staticmethod
+    def _body_page():
+        """Text before and after the content in the body-only file"""
+        return '<div id="mathjax-content">\n', '\n</div>'
 
+    @staticmethod
+    def _prepare_content(content):
+        """Transforms every output applies to the converted content"""
         # Remove image tags - images are not included in output
         content = re.sub(r'<img\s[^>]*>', '', content)
 
-        # Strip any remaining equation markers (legacy)
-        for marker in [config.inline_prefix, config.inline_suffix, config.display_prefix, config.display_suffix]:
-            if marker:
-                content = content.replace(marker, '')
-
         # Collapse double spaces in equations (prevents invisible Unicode in MathML)
         content = re.sub(r'  +', ' ', content)
 
         # Wrap equations with semantic HTML classes
+        # inline  \(...\) -> <span class="inline-math">\(...\)</span>
+        # display \[...\] -> <span class="display-math">\[...\]</span>
         content = re.sub(r'(\\\(.+?\\\))', r'<span class="inline-math">\1</span>', content)
         content = re.sub(r'(\\\[.+?\\\])', r'<span class="display-math">\1</span>', content, flags=re.DOTALL)
+        return content
+
+    def _generate_html_wordhtml(self, content, title):
+        """Generate HTML in wordhtml.com format - clean, no JavaScript"""
+        content = self._prepare_content(content)
+
+        footnotes_html = self._build_footnotes_html()
+        content = self._insert_footnotes_before_references(content, footnotes_html)
+
+        head, tail = self._wordhtml_page(title)
+        return head + content + tail
+
+    def _wordhtml_page(self, title):
+        """Text before and after the content in the wordhtml.com format page"""
+        config = self.config
 
         direction = 'rtl' if config.rtl_direction else 'ltr'
 
@@ -1221,10 +1365,7 @@ class FullWordToHTMLConverter:
         }
     </style>'''
 
-        footnotes_html = self._build_footnotes_html()
-        content = self._insert_footnotes_before_references(content, footnotes_html)
-
-        return f'''<!DOCTYPE html>
+        head = f'''<!DOCTYPE html>
 <html dir="{direction}">
 <head>
 <meta charset="UTF-8">
@@ -1232,33 +1373,26 @@ class FullWordToHTMLConverter:
 </head>
 <body>
 <div id="mathjax-content">
-{content}
+'''
+        tail = '''
 </div>
 </body>
 </html>'''
+        return head, tail
 
     def _generate_html(self, content, title):
         """Generate clean HTML output - NO config panel (settings applied during conversion)"""
-        import re
+        content = self._prepare_content(content)
 
-        config = self.config
-
-        # Remove image tags - images are not included in output
-        content = re.sub(r'<img\s[^>]*>', '', content)
-
-        # Strip any remaining equation markers (legacy)
-        for marker in [config.inline_prefix, config.inline_suffix, config.display_prefix, config.display_suffix]:
-            if marker:
-                content = content.replace(marker, '')
+        footnotes_html = self._build_footnotes_html()
+        content = self._insert_footnotes_before_references(content, footnotes_html)
 
-        # Collapse double spaces in equations (prevents invisible Unicode in MathML)
-        content = re.sub(r'  +', ' ', content)
+        head, tail = self._html_page(title)
+        return head + content + tail
 
-        # Wrap equations with semantic HTML classes
-        # inline  \(...\) -> <span class="inline-math">\(...\)</span>
-        # display \[...\] -> <span class="display-math">\[...\]</span>
-        content = re.sub(r'(\\\(.+?\\\))', r'<span class="inline-math">\1</span>', content)
-        content = re.sub(r'(\\\[.+?\\\])', r'<span class="display-math">\1</span>', content, flags=re.DOTALL)
+    def _html_page(self, title):
+        """Text before and after the content in the LaTeX + MathJax page"""
+        config = self.config
 
         # MathJax script
         mathjax = ''
@@ -1458,9 +1592,6 @@ class FullWordToHTMLConverter:
     </style>
 ''' if config.include_styles else ''
 
-        footnotes_html = self._build_footnotes_html()
-        content = self._insert_footnotes_before_references(content, footnotes_html)
-
         # Equation copy menu script (inline) - read from external JS file
         copy_menu_script = ''
         if config.include_mathjax:
@@ -1471,7 +1602,7 @@ class FullWordToHTMLConverter:
             except FileNotFoundError:
                 print(f"    Warning: {copy_menu_js} not found, skipping copy menu")
 
-        return f'''<!DOCTYPE html>
+        head = f'''<!DOCTYPE html>
 <html lang="ar" dir="{direction}">
 <head>
     <meta charset="UTF-8">
@@ -1482,11 +1613,13 @@ class FullWordToHTMLConverter:
 </head>
 <body>
 <div id="mathjax-content">
-{content}
+'''
+        tail = f'''
 </div>
 {copy_menu_script}
 </body>
 </html>'''
+        return head, tail
 
 
 def test_full_converter():
@@ -0,0 +1,416 @@
+"""
+Worker pool for CPU-bound document conversions
+===============================================
+
+FullWordToHTMLConverter, ZipEquationReplacer and the scan/verify analysis are
+synchronous lxml/Python code. Calling them from the async job handler blocks
+the uvicorn event loop, so status polls, uploads and downloads all wait until
+the current document is finished.
+
+ConversionPool runs each file conversion in a process pool instead. Workers
+import lxml and the converter modules once when they start (pre-warmed), are
+recycled after a configurable number of tasks, and every task is bounded by
+a timeout.
+
+At most one task per worker is handed to the executor at a time; the
+others wait in run() and their timeout starts only once a worker is free,
+so time spent queued behind other files does not count against it.
+
+Workers report conversion stages (extract, equations, body, html) through a
+multiprocessing queue; a listener thread in the API process hands them to
+the pool's on_progress callback so they can be pushed to clients.
+
+Settings (core.config.Config / environment):
+- WORKER_POOL_SIZE: number of worker processes (0 = run in a thread instead)
+- WORKER_MAX_TASKS_PER_CHILD: recycle a worker after N files (0 = never)
+- WORKER_TASK_TIMEOUT: seconds allowed per file
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from core.config import Config
+from core.result_cache import ResultCache, link_or_copy
+
+logger = logging.getLogger(__name__)
+
+# Processors that run FullWordToHTMLConverter (and can use the result cache)
+HTML_PROCESSORS = ("word_to_html", "word_complete")
+
+# Stage progress queue of the current process (set by the pool initializer)
+_progress_queue = None
+
+
+def build_conversion_config(config_dict=None):
+    """Create a ConversionConfig from the upload form settings (defaults: shapes OFF, MathML mode)"""
+    from word_to_html_full import ConversionConfig
+
+    config_dict = config_dict or {}
+    return ConversionConfig(
+        convert_shapes_to_svg=config_dict.get('convert_shapes_to_svg', False),
+        include_images=config_dict.get('include_images', True),
+        inline_prefix=config_dict.get('inline_prefix', ''),
+        inline_suffix=config_dict.get('inline_suffix', ''),
+        display_prefix=config_dict.get('display_prefix', ''),
+        display_suffix=config_dict.get('display_suffix', ''),
+        include_mathjax=config_dict.get('include_mathjax', True),
+        rtl_direction=config_dict.get('rtl_direction', True),
+        output_format=config_dict.get('output_format', 'mathml_html')
+    )
+
+
+def scan_and_verify(input_file: Path, output_dir: Path) -> Path:
+    """Simple document analysis"""
+    from docx import Document
+    import pandas as pd
+
+    logger.info(f"Scanning document: {input_file.name}")
+
+    doc = Document(input_file)
+
+    # Basic analysis
+    analysis = {
+        "Filename": input_file.name,
+        "Paragraphs": len(doc.paragraphs),
+        "Tables": len(doc.tables),
+        "Word Count": sum(len(p.text.split()) for p in doc.paragraphs if p.text)
+    }
+
+    # Save to Excel
+    output_file = output_dir / f"{input_file.stem}_analysis.xlsx"
+    df = pd.DataFrame([analysis])
+    df.to_excel(output_file, index=False)
+
+    logger.info(f"Analysis saved to: {output_file}")
+    return output_file
+
+
+def report_stage(progress_key, stage):
+    """Send a (job_id, file_index, stage) progress event to the API process"""
+    if _progress_queue is None or progress_key is None:
+        return
+    try:
+        _progress_queue.put_nowait((*progress_key, stage))
+    except Exception as e:
+        logger.debug(f"Dropped progress event {stage}: {e}")
+
+
+def _open_package(file_path):
+    """DocxPackage shared by the processing steps of one file, or None if it is not a valid .docx"""
+    from doc_processor.docx_package import DocxPackage
+
+    try:
+        return DocxPackage(file_path)
+    except (zipfile.BadZipFile, OSError):
+        return None  # The processors report the error themselves
+
+
+def _convert_html(file_path, output_dir, config_dict, progress_key, cache_key, package=None):
+    """
+    Run FullWordToHTMLConverter; with a cache_key the result is also stored in the result cache
+
+    With 'stream_body' in config_dict (set by /api/convert) the body is
+    converted as a stream and written straight into output_dir, so the API
+    can send the output files while they are being written.
+
+    Returns (output path, body output path, equation memo stats)
+    """
+    from word_to_html_full import FullWordToHTMLConverter
+
+    config_dict = config_dict or {}
+    config = build_conversion_config(config_dict)
+    # Very large bodies are parsed and written incrementally (same output, bounded memory)
+    live = bool(config_dict.get('stream_body'))
+    if live or (package is not None and package.size('word/document.xml') >= Config.STREAM_BODY_MIN_BYTES):
+        config.stream_body = True
+
+    converter = FullWordToHTMLConverter(
+        config,
+        progress_callback=lambda stage: report_stage(progress_key, stage)
+    )
+    if not cache_key or live:
+        result = converter.convert(file_path, output_dir=output_dir, package=package)
+        if not result.get('success'):
+            raise Exception(result.get('error', 'Conversion failed'))
+        if cache_key:
+            _store_output(cache_key, output_dir, result)
+        return result['output_path'], result.get('body_output_path'), result.get('equation_cache')
+
+    # Convert into a private staging dir, link the files into the job output, then keep them as the cache entry
+    cache = ResultCache()
+    staging = cache.staging_dir()
+    try:
+        result = converter.convert(file_path, output_dir=staging, package=package)
+        if not result.get('success'):
+            raise Exception(result.get('error', 'Conversion failed'))
+
+        for staged in staging.rglob("*"):
+            if staged.is_file():
+                link_or_copy(staged, output_dir / staged.relative_to(staging))
+
+        body = result.get('body_output_path')
+        cache.store(cache_key, staging, result['output_path'], body)
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+
+    return (output_dir / Path(result['output_path']).name, output_dir / Path(body).name if body else None,
+            result.get('equation_cache'))
+
+
+def _store_output(cache_key, output_dir, result):
+    """Keep a conversion written straight into output_dir (single-file job) as a result cache entry"""
+    cache = ResultCache()
+    staging = cache.staging_dir()
+    try:
+        for produced in output_dir.rglob("*"):
+            if produced.is_file():
+                link_or_copy(produced, staging / produced.relative_to(output_dir))
+        cache.store(cache_key, staging, result['output_path'], result.get('body_output_path'))
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def convert_file(processor_type, file_path, output_dir, config_dict=None, use_zip=True,
+                 progress_key=None, cache_key=None):
+    """
+    Convert a single uploaded file (runs inside a pool worker)
+
+    progress_key is a (job_id, file_index) tuple used to tag stage events.
+    cache_key (HTML processors only) stores the output in the result cache.
+    The .docx is opened once as a DocxPackage that every step of the
+    processor shares.
+
+    Returns:
+        dict with 'output_path', optional 'body_output_path', the
+        package's read/parse counters as 'package_stats', the equation memo
+        hits/misses as 'equation_cache' and, for latex_equations, per-stage
+        seconds as 'stage_timings'
+
+    Raises:
+        Exception if the conversion fails
+    """
+    file_path = Path(file_path)
+    output_dir = Path(output_dir)
+    body_output_path = None
+    package = None
+    stage_timings = None
+    equation_cache = None
+
+    try:
+        if processor_type in HTML_PROCESSORS:
+            package = _open_package(file_path)
+            output_file, body_output_path, equation_cache = _convert_html(file_path, output_dir, config_dict,
+                                                                          progress_key, cache_key, package)
+
+        elif processor_type == "latex_equations":
+            output_path = os.path.join(output_dir, f"{file_path.stem}_latex_equations.docx")
+            report_stage(progress_key, "equations")
+
+            if use_zip:
+                from doc_processor.zip_equation_replacer import ZipEquationReplacer
+                package = _open_package(file_path)
+                replacer = ZipEquationReplacer()
+                stream = package is not None and package.size('word/document.xml') >= Config.STREAM_BODY_MIN_BYTES
+                output_file = replacer.process_document(file_path, output_path, package=package, stream=stream)
+                stage_timings = replacer.timings
+                equation_cache = replacer.omml_parser.memo.summary()
+            else:
+                from doc_processor.main_word_com_equation_replacer import WordCOMEquationReplacer
+                result = WordCOMEquationReplacer().process_document(file_path, output_path)
+
+                # For latex_equations, we want WORD ONLY
+                output_file = result.get('word_path') if isinstance(result, dict) else result
+
+            if not output_file:
+                raise Exception("Equation replacement produced no output")
+
+        else:  # scan_verify (python-docx reads the file itself)
+            report_stage(progress_key, "analysis")
+            output_file = scan_and_verify(file_path, output_dir)
+
+    finally:
+        if package is not None:
+            package.close()
+
+    return {
+        'output_path': str(output_file),
+        'body_output_path': str(body_output_path) if body_output_path else None,
+        'package_stats': dict(package.stats) if package is not None else None,
+        'stage_timings': stage_timings,
+        'equation_cache': equation_cache
+    }
+
+
+def _warm_worker(progress_queue=None):
+    """Pool initializer: import heavy modules once per worker process"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    try:
+        import lxml.etree  # noqa: F401
+        import word_to_html_full  # noqa: F401
+        import enhanced_zip_converter  # noqa: F401
+        import doc_processor.omml_2_latex  # noqa: F401
+        import doc_processor.omml_to_mathml  # noqa: F401
+        import doc_processor.zip_equation_replacer  # noqa: F401
+        import doc_processor.docx_package  # noqa: F401
+    except Exception as e:
+        logger.warning(f"Worker {os.getpid()} warm-up import failed: {e}")
+
+
+def _ping():
+    return os.getpid()
+
+
+class ConversionPool:
+    """Process pool that runs conversions off the event loop"""
+
+    def __init__(self, size=None, max_tasks_per_child=None, task_timeout=None, on_progress=None):
+        self.size = Config.WORKER_POOL_SIZE if size is None else size
+        self.max_tasks_per_child = (Config.WORKER_MAX_TASKS_PER_CHILD
+                                    if max_tasks_per_child is None else max_tasks_per_child)
+        self.task_timeout = Config.WORKER_TASK_TIMEOUT if task_timeout is None else task_timeout
+        self.on_progress = on_progress  # Called as on_progress(job_id, file_index, stage) from a thread
+        self._executor = None
+        self._slots = None  # asyncio.Semaphore, one slot per worker (created on the running loop)
+        self._progress_queue = None
+        self._listener = None
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "restarts": 0}
+
+    def start(self):
+        """Create the executor and pre-warm one worker per slot"""
+        if self._executor is not None:
+            return self._executor
+
+        if self.size <= 0:
+            logger.info("Worker pool disabled - conversions run in a background thread")
+            if self._progress_queue is None:
+                self._start_listener(queue.Queue())
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="conversion",
+                initializer=_warm_worker, initargs=(self._progress_queue,)
+            )
+            return self._executor
+
+        mp_context = multiprocessing.get_context(Config.WORKER_START_METHOD)
+        if self._progress_queue is None:
+            self._start_listener(mp_context.Queue())
+
+        kwargs = {
+            "max_workers": self.size,
+            "mp_context": mp_context,
+            "initializer": _warm_worker,
+            "initargs": (self._progress_queue,),
+        }
+        if self.max_tasks_per_child > 0:
+            kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+        self._executor = ProcessPoolExecutor(**kwargs)
+
+        # Workers are spawned on demand; one ping per slot starts them all now
+        for _ in range(self.size):
+            self._executor.submit(_ping)
+
+        logger.info(f"Worker pool started: {self.size} processes, "
+                    f"max_tasks_per_child={self.max_tasks_per_child}, timeout={self.task_timeout}s")
+        return self._executor
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+        if self._listener is not None:
+            self._progress_queue.put(None)
+            self._listener.join(timeout=5)
+            self._listener = None
+            self._progress_queue = None
+
+    def _restart(self, broken):
+        """Replace the broken executor (once: the other tasks that saw it break find it already replaced)"""
+        if broken is not self._executor:
+            return
+        logger.warning("Worker pool broken (worker crashed) - restarting")
+        self.stats["restarts"] += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.start()
+
+    def _start_listener(self, progress_queue):
+        """Forward stage events from the workers to on_progress"""
+        self._progress_queue = progress_queue
+
+        def listen():
+            while True:
+                item = progress_queue.get()
+                if item is None:
+                    break
+                if self.on_progress is not None:
+                    try:
+                        self.on_progress(*item)
+                    except Exception as e:
+                        logger.warning(f"Progress callback failed: {e}")
+
+        self._listener = threading.Thread(target=listen, name="conversion-progress", daemon=True)
+        self._listener.start()
+
+    async def run(self, func, *args):
+        """
+        Run func(*args) in the pool and await the result
+
+        The task waits for a free worker first; task_timeout only starts once
+        it is submitted. A task that exceeds it raises TimeoutError. The
+        worker is not interrupted; it finishes in the background and is then
+        reused (its slot is released only then).
+
+        A crashed worker breaks the executor, which fails every task in
+        flight in it at that moment; the executor is then restarted once.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(self.size, 1))
+        loop = asyncio.get_running_loop()
+        self.stats["submitted"] += 1
+
+        await self._slots.acquire()
+        executor = self.start()
+        try:
+            future = loop.run_in_executor(executor, func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.task_timeout or None)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self.stats["failed"] += 1
+            raise TimeoutError(f"Conversion exceeded {self.task_timeout}s timeout")
+        except BrokenProcessPool:
+            self.stats["failed"] += 1
+            self._restart(executor)
+            raise Exception("Conversion worker crashed (out of memory?)")
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+
+        self.stats["completed"] += 1
+        return result
+
+    def info(self):
+        """Pool summary for the health endpoint"""
+        return {
+            "mode": "process" if self.size > 0 else "thread",
+            "size": self.size,
+            "max_tasks_per_child": self.max_tasks_per_child,
+            "task_timeout": self.task_timeout,
+            **self.stats
+        }